@@ -4,17 +4,33 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
+from app.core.cache import TTLCache
+from app.core.config import settings
 from app.core.database import get_db
 from app.core.security import decode_access_token
 from app.models.user import Utilisateur
+from app.schemas.user import CurrentUser
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
 
+user_cache = TTLCache(
+    max_size=settings.USER_CACHE_MAX_SIZE,
+    ttl_seconds=settings.USER_CACHE_TTL_SECONDS
+)
+
+
+def invalidate_user(user_id: int) -> None:
+    """
+    Retire un utilisateur du cache (changement de mot de passe, désactivation...).
+    """
+    user_cache.invalidate(user_id)
+
+
 async def get_current_user(
     db: AsyncSession = Depends(get_db),
     token: str = Depends(oauth2_scheme)
-) -> Utilisateur:
+) -> CurrentUser:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Token invalide ou expiré",
@@ -29,13 +45,18 @@ async def get_current_user(
     if user_id is None:
         raise credentials_exception
     
-    result = await db.execute(
-        select(Utilisateur).where(Utilisateur.id_utilisateur == int(user_id))
-    )
-    user = result.scalar_one_or_none()
-    
+    user = user_cache.get(int(user_id))
     if user is None:
-        raise credentials_exception
+        result = await db.execute(
+            select(Utilisateur).where(Utilisateur.id_utilisateur == int(user_id))
+        )
+        db_user = result.scalar_one_or_none()
+        
+        if db_user is None:
+            raise credentials_exception
+        
+        user = CurrentUser.model_validate(db_user)
+        user_cache.set(user.id_utilisateur, user)
     
     if not user.actif:
         raise HTTPException(
@@ -46,9 +67,32 @@ async def get_current_user(
     return user
 
 
-async def get_current_active_admin(
-    current_user: Utilisateur = Depends(get_current_user)
+async def get_current_user_db(
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
 ) -> Utilisateur:
+    """
+    Variante de get_current_user qui renvoie l'instance ORM attachée à la session,
+    pour les endpoints qui modifient l'utilisateur connecté.
+    """
+    result = await db.execute(
+        select(Utilisateur).where(Utilisateur.id_utilisateur == current_user.id_utilisateur)
+    )
+    user = result.scalar_one_or_none()
+    
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token invalide ou expiré",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    return user
+
+
+async def get_current_active_admin(
+    current_user: CurrentUser = Depends(get_current_user)
+) -> CurrentUser:
     if current_user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -57,12 +101,12 @@ async def get_current_active_admin(
     return current_user
 
 
-def is_admin(user: Utilisateur) -> bool:
+def is_admin(user: CurrentUser) -> bool:
     """Vérifie si l'utilisateur est admin"""
     return user.role == "admin"
 
 
-def get_user_bo_filter(user: Utilisateur) -> Optional[str]:
+def get_user_bo_filter(user: CurrentUser) -> Optional[str]:
     """
     Retourne la BO à filtrer selon le rôle de l'utilisateur.
     - Admin: None (pas de filtre, accès à tout)
@@ -73,7 +117,7 @@ def get_user_bo_filter(user: Utilisateur) -> Optional[str]:
     return user.base_affectee
 
 
-def check_bo_access(user: Utilisateur, bo_name: str) -> bool:
+def check_bo_access(user: CurrentUser, bo_name: str) -> bool:
     """
     Vérifie si l'utilisateur a accès à une BO spécifique.
     - Admin: accès à toutes les BOs
@@ -84,7 +128,7 @@ def check_bo_access(user: Utilisateur, bo_name: str) -> bool:
     return user.base_affectee == bo_name
 
 
-def require_bo_access(user: Utilisateur, bo_name: str) -> None:
+def require_bo_access(user: CurrentUser, bo_name: str) -> None:
     """
     Lève une exception si l'utilisateur n'a pas accès à la BO.
     """
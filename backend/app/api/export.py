@@ -0,0 +1,102 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from typing import AsyncIterator, List, Sequence
+
+from fastapi.responses import StreamingResponse
+
+from app.core.database import AsyncSessionLocal
+
+# Lignes lues par aller-retour du curseur serveur
+EXPORT_YIELD_PER = 1000
+
+# Taille approximative des blocs envoyés au client
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+def _format_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+async def _export_rows(query, columns: Sequence[str]) -> AsyncIterator[dict]:
+    """
+    Parcourt la requête avec un curseur côté serveur (stream_scalars + yield_per) :
+    seules EXPORT_YIELD_PER lignes sont en mémoire à la fois.
+    La session est propre à l'export car la réponse est envoyée après
+    la fermeture des dépendances de l'endpoint.
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.stream_scalars(
+            query.execution_options(yield_per=EXPORT_YIELD_PER)
+        )
+        async for obj in result:
+            yield {column: _format_value(getattr(obj, column)) for column in columns}
+
+
+async def _encode_csv(rows: AsyncIterator[dict], columns: Sequence[str]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, delimiter=";")
+    # BOM : ouverture correcte des accents dans Excel
+    buffer.write("\ufeff")
+    writer.writeheader()
+    async for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+async def _encode_ndjson(rows: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    lines: List[str] = []
+    size = 0
+    async for row in rows:
+        line = json.dumps(row, ensure_ascii=False, default=str)
+        lines.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines, size = [], 0
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+async def _gzip(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 : en-tête gzip
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_export(
+    query,
+    columns: Sequence[str],
+    format: str,
+    filename: str,
+    gzip: bool = False
+) -> StreamingResponse:
+    """
+    Réponse d'export en flux (csv ou ndjson), éventuellement compressée gzip.
+    La mémoire utilisée ne dépend pas du nombre de lignes exportées.
+    """
+    rows = _export_rows(query, columns)
+    if format == "ndjson":
+        body = _encode_ndjson(rows)
+        media_type = "application/x-ndjson"
+    else:
+        body = _encode_csv(rows, columns)
+        media_type = "text/csv; charset=utf-8"
+
+    headers = {"Content-Disposition": f'attachment; filename="{filename}.{format}"'}
+    if gzip:
+        body = _gzip(body)
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(body, media_type=media_type, headers=headers)
@@ -0,0 +1,119 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def encode_cursor(date_value: Optional[datetime], id_value: Any) -> str:
+    """
+    Encode la position (date, identifiant) de la dernière ligne d'une page
+    en un jeton opaque pour la pagination par curseur.
+    """
+    payload = [date_value.isoformat() if date_value else None, id_value]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, id_type: Optional[type] = None) -> Tuple[Optional[datetime], Any]:
+    """
+    Décode un jeton produit par encode_cursor.
+    `id_type` : type attendu de l'identifiant (int, str...).
+    Lève une 400 si le jeton est invalide.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        date_value, id_value = json.loads(raw)
+        if id_type is not None and (not isinstance(id_value, id_type) or isinstance(id_value, bool)):
+            raise TypeError("identifiant de curseur invalide")
+        return (datetime.fromisoformat(date_value) if date_value else None), id_value
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Curseur de pagination invalide"
+        )
+
+
+def keyset_condition(date_column, id_column, cursor: str, descending: bool = True):
+    """
+    Condition "après le curseur" pour un tri (date, id) DESC, ou ASC si
+    descending=False, sous forme de comparaison de ligne (date, id) < (d, i) :
+    borne de parcours de l'index (date, id), sans filtre ni tri.
+    Ne couvre pas les dates NULL (fin de liste) : voir fetch_keyset_page.
+    """
+    last_date, last_id = decode_cursor(cursor, id_column.type.python_type)
+    if last_date is None:
+        return and_(date_column.is_(None), id_column < last_id if descending else id_column > last_id)
+    position = tuple_(date_column, id_column)
+    return position < tuple_(last_date, last_id) if descending else position > tuple_(last_date, last_id)
+
+
+async def fetch_keyset_page(
+    db: AsyncSession,
+    query,
+    date_column,
+    id_column,
+    cursor: Optional[str],
+    limit: int,
+    descending: bool = True
+) -> list:
+    """
+    Lignes suivant le curseur (au plus limit + 1, limit + 1 signalant une page suivante),
+    triées par keyset_order_by. Chaque requête est une plage de l'index (date, id) ;
+    pour une colonne date nullable, les lignes à date NULL (fin de liste) sont lues
+    par une seconde requête, seulement si la première ne remplit pas la page.
+    """
+    order_by = keyset_order_by(date_column, id_column, descending)
+    nullable = getattr(date_column, "nullable", True)
+    after_null = cursor is not None and decode_cursor(cursor)[0] is None
+    
+    rows = []
+    if not after_null:
+        page = query
+        if cursor:
+            page = page.where(keyset_condition(date_column, id_column, cursor, descending))
+        elif nullable:
+            page = page.where(date_column.isnot(None))
+        result = await db.execute(page.order_by(*order_by).limit(limit + 1))
+        rows = result.all()
+    
+    if nullable and len(rows) <= limit:
+        if after_null:
+            tail = query.where(keyset_condition(date_column, id_column, cursor, descending))
+        else:
+            tail = query.where(date_column.is_(None))
+        result = await db.execute(tail.order_by(*order_by).limit(limit + 1 - len(rows)))
+        rows += result.all()
+    return rows
+
+
+def keyset_order_by(date_column, id_column, descending: bool = True):
+    if descending:
+        return date_column.desc().nullslast(), id_column.desc()
+    return date_column.asc().nullslast(), id_column.asc()
+
+
+async def approximate_count(db: AsyncSession, table_name: str) -> Optional[int]:
+    """
+    Nombre approximatif de lignes d'une table (pg_class.reltuples),
+    sans parcourir la table. None si la table n'a jamais été analysée.
+    Pour une table partitionnée : somme des estimations des partitions.
+    """
+    result = await db.execute(
+        text("""
+            SELECT CASE WHEN t.relkind = 'p' THEN (
+                       SELECT sum(greatest(c.reltuples, 0))::bigint
+                       FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                       WHERE i.inhparent = t.oid
+                   ) ELSE t.reltuples::bigint END
+            FROM pg_class t WHERE t.relname = :table_name
+        """),
+        {"table_name": table_name}
+    )
+    estimate = result.scalar()
+    if estimate is None or estimate < 0:
+        return None
+    return estimate
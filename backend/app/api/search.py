@@ -0,0 +1,69 @@
+from sqlalchemy import func, or_
+
+from app.models.concentrateur import Concentrateur
+
+# En dessous de 3 caractères, pg_trgm ne produit pas de trigramme exploitable
+MIN_TRIGRAM_LENGTH = 3
+
+SEARCH_COLUMNS = (
+    Concentrateur.numero_serie,
+    Concentrateur.modele,
+    Concentrateur.numero_carton,
+    Concentrateur.operateur,
+)
+
+PREFIX_COLUMNS = (
+    Concentrateur.numero_serie,
+    Concentrateur.numero_carton,
+)
+
+
+def escape_like(term: str) -> str:
+    # Le caractère d'échappement par défaut de LIKE dans PostgreSQL est "\"
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def resolve_search_mode(search: str, search_mode: str = "auto") -> str:
+    """
+    Choisit le mode de recherche :
+    - prefix: début de numéro de série ou de carton (index btree text_pattern_ops)
+    - fuzzy: sous-chaîne ou faute de frappe sur les 4 colonnes (index GIN pg_trgm)
+    - contains: sous-chaîne (ILIKE) sur les 4 colonnes, sans index
+    En mode auto, les termes trop courts pour les trigrammes (ex. "4G")
+    gardent la recherche par sous-chaîne sur les 4 colonnes.
+    """
+    if search_mode != "auto":
+        return search_mode
+    return "contains" if len(search) < MIN_TRIGRAM_LENGTH else "fuzzy"
+
+
+def search_condition(search: str, search_mode: str = "auto"):
+    """
+    Condition WHERE de la recherche de concentrateurs.
+    Voir scripts/migrations/002_trigram_search.sql pour les index associés.
+    """
+    mode = resolve_search_mode(search, search_mode)
+    if mode == "prefix":
+        pattern = f"{escape_like(search.upper())}%"
+        return or_(*[
+            func.upper(column).like(pattern)
+            for column in PREFIX_COLUMNS
+        ])
+
+    pattern = f"%{escape_like(search)}%"
+    if mode == "contains":
+        return or_(*[column.ilike(pattern) for column in SEARCH_COLUMNS])
+    return or_(*[
+        or_(column.ilike(pattern), column.op("%")(search))
+        for column in SEARCH_COLUMNS
+    ])
+
+
+def search_rank(search: str):
+    """
+    Score de similarité (0 à 1) pour trier les résultats, meilleur en premier.
+    """
+    return func.greatest(*[
+        func.coalesce(func.similarity(column, search), 0)
+        for column in SEARCH_COLUMNS
+    ])
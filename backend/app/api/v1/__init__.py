@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.v1 import auth, concentrateurs, stats, actions, magasin, labo, transferts, bo, postes
+from app.api.v1 import auth, concentrateurs, stats, actions, magasin, labo, transferts, bo, postes, admin, events, notifications, rapports, sync
 
 api_router = APIRouter()
 api_router.include_router(auth.router, prefix="/auth", tags=["Authentication"])
@@ -12,3 +12,8 @@ api_router.include_router(labo.router, prefix="/labo", tags=["Labo"])
 api_router.include_router(transferts.router, prefix="/transferts", tags=["Transferts"])
 api_router.include_router(bo.router)
 api_router.include_router(postes.router)
+api_router.include_router(admin.router, prefix="/admin", tags=["Administration"])
+api_router.include_router(events.router, prefix="/events", tags=["Événements"])
+api_router.include_router(notifications.router, prefix="/notifications", tags=["Notifications"])
+api_router.include_router(rapports.router, prefix="/rapports", tags=["Rapports"])
+api_router.include_router(sync.router, prefix="/sync", tags=["Synchronisation"])
@@ -2,14 +2,20 @@ from typing import Optional, List
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
+from sqlalchemy.orm import joinedload
 from datetime import datetime
 from pydantic import BaseModel
 
 from app.core.database import get_db
 from app.api.deps import get_current_user
-from app.models.user import Utilisateur
+from app.api.export import stream_export
+from app.api.pagination import encode_cursor, decode_cursor, fetch_keyset_page, keyset_order_by, approximate_count
+from app.schemas.user import CurrentUser
 from app.models.concentrateur import Concentrateur
 from app.models.action import HistoriqueAction
+from app.core.events import emit_event, etat_change_event
+from app.services.stock_summary import stock_key, record_stock_change
+from app.services.archives import actions_archivees
 
 router = APIRouter()
 
@@ -48,23 +54,48 @@ class ActionResponse(BaseModel):
     user_id: int
     concentrateur_id: Optional[str] = None
     concentrateur: Optional[ConcentrateurInfo] = None
-
+    
     class Config:
         from_attributes = True
 
 
+EXPORT_COLUMNS = (
+    "id_action", "date_action", "type_action", "concentrateur_id",
+    "ancien_etat", "nouvel_etat", "ancienne_affectation", "nouvelle_affectation",
+    "user_id", "poste_id", "carton_id", "scan_qr", "commentaire",
+)
+
+
+def action_conditions(
+    concentrateur_id: Optional[str] = None,
+    user_id: Optional[int] = None,
+    type_action: Optional[str] = None
+) -> list:
+    """Filtres de la liste des actions (partagés avec l'export)."""
+    conditions = []
+    if concentrateur_id:
+        conditions.append(HistoriqueAction.concentrateur_id == concentrateur_id)
+    if user_id:
+        conditions.append(HistoriqueAction.user_id == user_id)
+    if type_action:
+        conditions.append(HistoriqueAction.type_action == type_action)
+    return conditions
+
+
 @router.post("", response_model=ActionResponse, status_code=status.HTTP_201_CREATED)
 async def create_action(
     data: ActionCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Créer une nouvelle action sur un concentrateur.
     """
     # Vérifier que le concentrateur existe
     result = await db.execute(
-        select(Concentrateur).where(Concentrateur.numero_serie == data.concentrateur_id)
+        select(Concentrateur)
+        .where(Concentrateur.numero_serie == data.concentrateur_id)
+        .with_for_update()
     )
     concentrateur = result.scalar_one_or_none()
     
@@ -77,6 +108,7 @@ async def create_action(
     # Sauvegarder les anciennes valeurs
     ancien_etat = concentrateur.etat
     ancienne_affectation = concentrateur.affectation
+    ancien_stock = stock_key(concentrateur)
     
     # Déterminer le nouvel état et affectation selon le type d'action
     nouvel_etat = data.nouvel_etat
@@ -125,6 +157,8 @@ async def create_action(
     )
     
     db.add(action)
+    await record_stock_change(db, ancien_stock, stock_key(concentrateur))
+    emit_event(db, etat_change_event(action))
     await db.commit()
     await db.refresh(action)
     
@@ -136,7 +170,7 @@ async def get_my_actions(
     page: int = Query(1, ge=1),
     limit: int = Query(50, ge=1, le=100),
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Liste des actions de l'utilisateur connecté avec infos concentrateur.
@@ -148,47 +182,20 @@ async def get_my_actions(
     result = await db.execute(count_query)
     total = result.scalar()
     
-    # Récupérer les actions
+    # Récupérer les actions avec le concentrateur (LEFT JOIN, une seule requête)
     offset = (page - 1) * limit
-    query = select(HistoriqueAction).where(
+    query = select(HistoriqueAction).options(
+        joinedload(HistoriqueAction.concentrateur).load_only(
+            Concentrateur.numero_serie, Concentrateur.modele, Concentrateur.operateur
+        )
+    ).where(
         HistoriqueAction.user_id == current_user.id_utilisateur
     ).order_by(HistoriqueAction.date_action.desc()).offset(offset).limit(limit)
     
     result = await db.execute(query)
     actions = result.scalars().all()
     
-    # Enrichir avec les infos concentrateur
-    actions_with_concentrateur = []
-    for action in actions:
-        action_dict = {
-            "id_action": action.id_action,
-            "type_action": action.type_action,
-            "date_action": action.date_action,
-            "ancien_etat": action.ancien_etat,
-            "nouvel_etat": action.nouvel_etat,
-            "ancienne_affectation": action.ancienne_affectation,
-            "nouvelle_affectation": action.nouvelle_affectation,
-            "commentaire": action.commentaire,
-            "scan_qr": action.scan_qr,
-            "photo": action.photo,
-            "user_id": action.user_id,
-            "concentrateur_id": action.concentrateur_id,
-            "concentrateur": None
-        }
-        
-        if action.concentrateur_id:
-            conc_result = await db.execute(
-                select(Concentrateur).where(Concentrateur.numero_serie == action.concentrateur_id)
-            )
-            concentrateur = conc_result.scalar_one_or_none()
-            if concentrateur:
-                action_dict["concentrateur"] = {
-                    "numero_serie": concentrateur.numero_serie,
-                    "modele": concentrateur.modele,
-                    "operateur": concentrateur.operateur
-                }
-        
-        actions_with_concentrateur.append(action_dict)
+    actions_with_concentrateur = [ActionResponse.model_validate(action) for action in actions]
     
     total_pages = (total + limit - 1) // limit if total > 0 else 1
     
@@ -200,6 +207,32 @@ async def get_my_actions(
     }
 
 
+def _cle_action(action) -> tuple:
+    """(date_action, id_action) d'une action en base ou archivée (dict)."""
+    if isinstance(action, dict):
+        return action["date_action"], action["id_action"]
+    return action.date_action, action.id_action
+
+
+def _cle_tri(action) -> tuple:
+    """Clé de tri comparable même sans date (dates NULL en fin de liste décroissante)."""
+    date_action, id_action = _cle_action(action)
+    return date_action is not None, date_action or datetime.min, id_action
+
+
+def _fusionner(actions: list, archives: List[dict]) -> list:
+    """
+    Actions en base et archivées, par date puis identifiant décroissants,
+    dates NULL en dernier (même ordre que keyset_order_by).
+    """
+    en_base = {action.id_action for action in actions}
+    return sorted(
+        list(actions) + [action for action in archives if action["id_action"] not in en_base],
+        key=_cle_tri,
+        reverse=True
+    )
+
+
 @router.get("")
 async def get_actions(
     page: int = Query(1, ge=1),
@@ -207,35 +240,90 @@ async def get_actions(
     concentrateur_id: Optional[str] = None,
     user_id: Optional[int] = None,
     type_action: Optional[str] = None,
+    pagination: str = Query("page", pattern="^(page|cursor)$"),
+    cursor: Optional[str] = None,
+    exact_total: bool = False,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Liste des actions avec filtres.
+    - pagination=cursor: pagination par curseur (date_action, id_action),
+      le total n'est calculé que si exact_total=true (sinon estimation sans filtre)
+    - concentrateur_id: inclut les actions archivées (fichiers Parquet, archive=true)
     """
+    archives = []
+    if concentrateur_id:
+        try:
+            archives = await actions_archivees(concentrateur_id, user_id, type_action)
+        except RuntimeError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Archives indisponibles : {exc}"
+            )
+    
     query = select(HistoriqueAction)
     count_query = select(func.count()).select_from(HistoriqueAction)
     
-    conditions = []
-    if concentrateur_id:
-        conditions.append(HistoriqueAction.concentrateur_id == concentrateur_id)
-    if user_id:
-        conditions.append(HistoriqueAction.user_id == user_id)
-    if type_action:
-        conditions.append(HistoriqueAction.type_action == type_action)
+    conditions = action_conditions(concentrateur_id, user_id, type_action)
     
     for condition in conditions:
         query = query.where(condition)
         count_query = count_query.where(condition)
     
+    if pagination == "cursor":
+        rows = await fetch_keyset_page(
+            db, query, HistoriqueAction.date_action, HistoriqueAction.id_action, cursor, limit
+        )
+        actions = [row[0] for row in rows]
+        
+        if archives:
+            if cursor:
+                # Dates NULL en fin de liste : aucune archive après une telle position
+                position = decode_cursor(cursor, int)
+                suivantes = [
+                    action for action in archives
+                    if position[0] is not None and _cle_action(action) < position
+                ]
+            else:
+                suivantes = archives
+            actions = _fusionner(actions, suivantes)[:limit + 1]
+        
+        next_cursor = None
+        if len(actions) > limit:
+            actions = actions[:limit]
+            next_cursor = encode_cursor(*_cle_action(actions[-1]))
+        
+        if exact_total:
+            result = await db.execute(count_query)
+            total = result.scalar() + len(archives)
+        elif not conditions:
+            total = await approximate_count(db, HistoriqueAction.__tablename__)
+        else:
+            total = None
+        
+        return {
+            "data": actions,
+            "total": total,
+            "next_cursor": next_cursor
+        }
+    
     result = await db.execute(count_query)
-    total = result.scalar()
+    total = result.scalar() + len(archives)
     
     offset = (page - 1) * limit
-    query = query.order_by(HistoriqueAction.date_action.desc()).offset(offset).limit(limit)
     
-    result = await db.execute(query)
-    actions = result.scalars().all()
+    if archives:
+        # Historique d'un seul concentrateur : fusion en mémoire des deux sources
+        result = await db.execute(
+            query.order_by(*keyset_order_by(HistoriqueAction.date_action, HistoriqueAction.id_action))
+            .limit(offset + limit)
+        )
+        actions = _fusionner(result.scalars().all(), archives)[offset:offset + limit]
+    else:
+        query = query.order_by(HistoriqueAction.date_action.desc())
+        result = await db.execute(query.offset(offset).limit(limit))
+        actions = result.scalars().all()
     
     total_pages = (total + limit - 1) // limit if total > 0 else 1
     
@@ -245,3 +333,25 @@ async def get_actions(
         "page": page,
         "total_pages": total_pages
     }
+
+
+@router.get("/export")
+async def export_actions(
+    concentrateur_id: Optional[str] = None,
+    user_id: Optional[int] = None,
+    type_action: Optional[str] = None,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    Export de l'historique des actions en flux (csv ou ndjson), mêmes filtres que GET /actions.
+    - gzip=true: réponse compressée (Content-Encoding: gzip)
+    """
+    query = (
+        select(HistoriqueAction)
+        .where(*action_conditions(concentrateur_id, user_id, type_action))
+        .order_by(*keyset_order_by(HistoriqueAction.date_action, HistoriqueAction.id_action))
+    )
+    filename = f"actions_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+    return stream_export(query, EXPORT_COLUMNS, format, filename, gzip=gzip)
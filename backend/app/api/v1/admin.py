@@ -0,0 +1,108 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import get_current_active_admin, user_cache
+from app.core.database import get_db, pool_metrics
+from app.core.security import password_pool_stats
+from app.core.events import broadcaster
+from app.services.notifications import dispatcher
+from app.services.rapports import report_runner
+from app.services.labo_stats import labo_stats_refresher
+from app.services.partitions import (
+    PARENT, est_partitionnee, lister_partitions, detacher_partition, partition_maintainer
+)
+from app.services.archives import archive_dir, lire_index
+from app.api.v1.stats import stats_cache
+from app.schemas.user import CurrentUser
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def get_metrics(
+    current_user: CurrentUser = Depends(get_current_active_admin)
+):
+    """
+    Métriques internes du processus (pools, caches).
+    Réservé aux administrateurs.
+    """
+    return {
+        "database_pool": pool_metrics(),
+        "password_hash": dict(password_pool_stats),
+        "user_cache": {
+            "size": len(user_cache),
+            "max_size": user_cache.max_size,
+            "hits": user_cache.hits,
+            "misses": user_cache.misses,
+        },
+        "stats_cache": stats_cache.stats(),
+        "events": broadcaster.stats(),
+        "notifications": dispatcher.stats(),
+        "rapports": report_runner.stats(),
+        "labo_stats": labo_stats_refresher.stats(),
+        "partitions": partition_maintainer.stats(),
+    }
+
+
+@router.get("/partitions")
+async def get_partitions(
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_active_admin)
+):
+    """
+    Partitions mensuelles de historique_action : nombre, lignes estimées, taille.
+    Réservé aux administrateurs.
+    """
+    if not await est_partitionnee(db):
+        return {"table": PARENT, "partitionnee": False, "partitions": []}
+    
+    partitions = await lister_partitions(db)
+    return {
+        "table": PARENT,
+        "partitionnee": True,
+        "nombre": len(partitions),
+        "lignes_estimees": sum(partition["lignes_estimees"] for partition in partitions),
+        "taille_octets": sum(partition["taille_octets"] for partition in partitions),
+        "partitions": partitions,
+        "maintenance": partition_maintainer.stats(),
+    }
+
+
+@router.get("/archives")
+async def get_archives(current_user: CurrentUser = Depends(get_current_active_admin)):
+    """
+    Fichiers Parquet de l'historique archivé (scripts/archive_historique_action.py).
+    Réservé aux administrateurs.
+    """
+    fichiers = lire_index()
+    return {
+        "dossier": archive_dir(),
+        "nombre": len(fichiers),
+        "lignes": sum(entree["lignes"] for entree in fichiers),
+        "taille_octets": sum(entree["taille_octets"] for entree in fichiers),
+        "fichiers": fichiers,
+    }
+
+
+@router.post("/partitions/{nom}/detacher")
+async def detacher_partition_historique(
+    nom: str,
+    archiver: bool = False,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_active_admin)
+):
+    """
+    Détacher la partition d'un mois révolu (archiver=true : déplacée dans le schéma archive).
+    Les actions de ce mois ne sont plus visibles dans l'historique.
+    Réservé aux administrateurs.
+    """
+    try:
+        table = await detacher_partition(db, nom, archiver=archiver)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    await db.commit()
+    
+    return {"message": "Partition détachée", "table": table}
@@ -5,11 +5,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from app.core.database import get_db
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, get_current_user_db, get_current_active_admin, invalidate_user
 from app.core.config import settings
-from app.core.security import verify_password, create_access_token, get_password_hash
+from app.core.security import verify_password_async, create_access_token, get_password_hash_async
 from app.models.user import Utilisateur
-from app.schemas.user import UserResponse
+from app.schemas.user import CurrentUser, UserResponse
 
 router = APIRouter()
 
@@ -38,7 +38,7 @@ async def login(
     # Pour le hackathon: si pas de password_hash, on accepte n'importe quel mot de passe
     # En production, décommenter la vérification ci-dessous
     if user.password_hash:
-        if not verify_password(form_data.password, user.password_hash):
+        if not await verify_password_async(form_data.password, user.password_hash):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Email ou mot de passe incorrect",
@@ -74,7 +74,7 @@ async def login(
 
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Retourne les informations de l'utilisateur connecté.
@@ -85,12 +85,42 @@ async def get_current_user_info(
 @router.post("/set-password")
 async def set_password(
     password: str,
-    current_user: Utilisateur = Depends(get_current_user),
+    current_user: Utilisateur = Depends(get_current_user_db),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Permet à l'utilisateur de définir/modifier son mot de passe.
     """
-    current_user.password_hash = get_password_hash(password)
+    current_user.password_hash = await get_password_hash_async(password)
     await db.commit()
+    invalidate_user(current_user.id_utilisateur)
     return {"message": "Mot de passe mis à jour avec succès"}
+
+
+@router.patch("/users/{user_id}/actif", response_model=UserResponse)
+async def set_user_actif(
+    user_id: int,
+    actif: bool,
+    current_user: CurrentUser = Depends(get_current_active_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Active ou désactive un compte utilisateur.
+    Réservé aux administrateurs.
+    """
+    result = await db.execute(
+        select(Utilisateur).where(Utilisateur.id_utilisateur == user_id)
+    )
+    user = result.scalar_one_or_none()
+    
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Utilisateur non trouvé"
+        )
+    
+    user.actif = actif
+    await db.commit()
+    await db.refresh(user)
+    invalidate_user(user_id)
+    return user
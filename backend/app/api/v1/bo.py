@@ -1,13 +1,17 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, func
-from datetime import datetime
+from sqlalchemy import select, update, func, case, tuple_
+from datetime import datetime, timedelta
 from pydantic import BaseModel
 
 from app.core.database import get_db
 from app.models import Utilisateur, Concentrateur, HistoriqueAction, CommandeBo
+from app.schemas.user import CurrentUser
+from app.core.events import emit_event, etat_change_event
+from app.services.stock_summary import stock_key, record_stock_change
 from app.api.deps import get_current_user
+from app.api.pagination import encode_cursor, decode_cursor
 
 router = APIRouter(prefix="/bo", tags=["Base Opérationnelle"])
 
@@ -32,7 +36,7 @@ class DemandeTransfertRequest(BaseModel):
 @router.get("/liste")
 async def get_liste_bo(
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Récupérer la liste des bases opérationnelles disponibles.
@@ -76,61 +80,58 @@ async def get_liste_bo(
 # ENDPOINT STATS BO (pour admin - stats d'une BO specifique)
 # ============================================
 
+def _count_etat(etat: str):
+    return func.coalesce(func.sum(case((Concentrateur.etat == etat, 1), else_=0)), 0)
+
+
+def select_bo_counters(bo_name: str):
+    """
+    Compteurs d'une BO (total, par état, demandes en attente)
+    calculés en un seul passage sur concentrateur.
+    """
+    demandes_en_cours = (
+        select(func.count())
+        .select_from(CommandeBo)
+        .where(
+            CommandeBo.bo_demandeur == bo_name,
+            CommandeBo.statut_commande == 'en_attente'
+        )
+        .scalar_subquery()
+    )
+    return (
+        select(
+            func.count().label('total'),
+            _count_etat('en_stock').label('en_stock'),
+            _count_etat('pose').label('poses'),
+            _count_etat('a_tester').label('a_tester'),
+            _count_etat('en_livraison').label('en_livraison'),
+            demandes_en_cours.label('demandes_en_cours'),
+        )
+        .select_from(Concentrateur)
+        .where(Concentrateur.affectation == bo_name)
+    )
+
+
 @router.get("/stats/{bo_name}")
 async def get_bo_stats(
     bo_name: str,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Récupérer les statistiques d'une BO spécifique.
     Accessible aux admins pour n'importe quelle BO.
     """
-    # Compter par état
-    result_total = await db.execute(
-        select(func.count()).select_from(Concentrateur).where(Concentrateur.affectation == bo_name)
-    )
-    total = result_total.scalar() or 0
-    
-    result_en_stock = await db.execute(
-        select(func.count()).select_from(Concentrateur).where(
-            Concentrateur.affectation == bo_name,
-            Concentrateur.etat == 'en_stock'
-        )
-    )
-    en_stock = result_en_stock.scalar() or 0
-    
-    result_poses = await db.execute(
-        select(func.count()).select_from(Concentrateur).where(
-            Concentrateur.affectation == bo_name,
-            Concentrateur.etat == 'pose'
-        )
-    )
-    poses = result_poses.scalar() or 0
-    
-    result_a_tester = await db.execute(
-        select(func.count()).select_from(Concentrateur).where(
-            Concentrateur.affectation == bo_name,
-            Concentrateur.etat == 'a_tester'
-        )
-    )
-    a_tester = result_a_tester.scalar() or 0
-    
-    result_en_livraison = await db.execute(
-        select(func.count()).select_from(Concentrateur).where(
-            Concentrateur.affectation == bo_name,
-            Concentrateur.etat == 'en_livraison'
-        )
-    )
-    en_livraison = result_en_livraison.scalar() or 0
+    result = await db.execute(select_bo_counters(bo_name))
+    counters = result.one()
     
     return {
         "bo_name": bo_name,
-        "total": total,
-        "en_stock": en_stock,
-        "poses": poses,
-        "a_tester": a_tester,
-        "en_livraison": en_livraison
+        "total": counters.total,
+        "en_stock": counters.en_stock,
+        "poses": counters.poses,
+        "a_tester": counters.a_tester,
+        "en_livraison": counters.en_livraison
     }
 
 
@@ -141,7 +142,7 @@ async def get_bo_stats(
 @router.get("/info")
 async def get_bo_info(
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Récupérer les informations de la BO de l'utilisateur connecté.
@@ -154,66 +155,20 @@ async def get_bo_info(
     
     bo_name = current_user.base_affectee
     
-    # Statistiques des concentrateurs de cette BO
-    result = await db.execute(
-        select(
-            func.count(Concentrateur.numero_serie).label('total'),
-            func.sum(func.cast(Concentrateur.etat == 'en_stock', Integer)).label('en_stock'),
-            func.sum(func.cast(Concentrateur.etat == 'pose', Integer)).label('poses'),
-            func.sum(func.cast(Concentrateur.etat == 'a_tester', Integer)).label('a_tester'),
-        ).where(Concentrateur.affectation == bo_name)
-    )
-    stats = result.first()
-    
-    # Compter par état manuellement pour éviter les problèmes de cast
-    result_total = await db.execute(
-        select(func.count()).where(Concentrateur.affectation == bo_name)
-    )
-    total = result_total.scalar() or 0
-    
-    result_en_stock = await db.execute(
-        select(func.count()).where(
-            Concentrateur.affectation == bo_name,
-            Concentrateur.etat == 'en_stock'
-        )
-    )
-    en_stock = result_en_stock.scalar() or 0
-    
-    result_poses = await db.execute(
-        select(func.count()).where(
-            Concentrateur.affectation == bo_name,
-            Concentrateur.etat == 'pose'
-        )
-    )
-    poses = result_poses.scalar() or 0
-    
-    result_a_tester = await db.execute(
-        select(func.count()).where(
-            Concentrateur.affectation == bo_name,
-            Concentrateur.etat == 'a_tester'
-        )
-    )
-    a_tester = result_a_tester.scalar() or 0
-    
-    # Demandes en cours
-    result_demandes = await db.execute(
-        select(func.count()).where(
-            CommandeBo.bo_demandeur == bo_name,
-            CommandeBo.statut_commande == 'en_attente'
-        )
-    )
-    demandes_en_cours = result_demandes.scalar() or 0
+    # Statistiques des concentrateurs et demandes en cours en une seule requête
+    result = await db.execute(select_bo_counters(bo_name))
+    counters = result.one()
     
     return {
         "nom_bo": bo_name,
         "utilisateur": f"{current_user.prenom} {current_user.nom}",
         "role": current_user.role,
         "stats": {
-            "total": total,
-            "en_stock": en_stock,
-            "poses": poses,
-            "a_tester": a_tester,
-            "demandes_en_cours": demandes_en_cours
+            "total": counters.total,
+            "en_stock": counters.en_stock,
+            "poses": counters.poses,
+            "a_tester": counters.a_tester,
+            "demandes_en_cours": counters.demandes_en_cours
         }
     }
 
@@ -226,7 +181,7 @@ async def get_bo_info(
 async def poser_concentrateur(
     data: ActionConcentrateurRequest,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Poser un concentrateur (en_stock → pose).
@@ -240,7 +195,9 @@ async def poser_concentrateur(
     
     # Récupérer le concentrateur
     result = await db.execute(
-        select(Concentrateur).where(Concentrateur.numero_serie == data.numero_serie)
+        select(Concentrateur)
+        .where(Concentrateur.numero_serie == data.numero_serie)
+        .with_for_update()
     )
     concentrateur = result.scalar_one_or_none()
     
@@ -264,6 +221,7 @@ async def poser_concentrateur(
     
     # Mettre à jour l'état
     ancien_etat = concentrateur.etat
+    ancien_stock = stock_key(concentrateur)
     concentrateur.etat = 'pose'
     concentrateur.date_pose = datetime.utcnow()
     concentrateur.date_dernier_etat = datetime.utcnow()
@@ -282,6 +240,8 @@ async def poser_concentrateur(
         concentrateur_id=data.numero_serie,
     )
     db.add(action)
+    await record_stock_change(db, ancien_stock, stock_key(concentrateur))
+    emit_event(db, etat_change_event(action))
     
     await db.commit()
     
@@ -302,7 +262,7 @@ async def poser_concentrateur(
 async def deposer_concentrateur(
     data: ActionConcentrateurRequest,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Déposer un concentrateur (pose → a_tester).
@@ -319,7 +279,9 @@ async def deposer_concentrateur(
     
     # Récupérer le concentrateur
     result = await db.execute(
-        select(Concentrateur).where(Concentrateur.numero_serie == data.numero_serie)
+        select(Concentrateur)
+        .where(Concentrateur.numero_serie == data.numero_serie)
+        .with_for_update()
     )
     concentrateur = result.scalar_one_or_none()
     
@@ -344,6 +306,7 @@ async def deposer_concentrateur(
     
     # Mettre à jour l'état
     ancien_etat = concentrateur.etat
+    ancien_stock = stock_key(concentrateur)
     concentrateur.etat = 'a_tester'
     concentrateur.date_dernier_etat = datetime.utcnow()
     concentrateur.updated_at = datetime.utcnow()
@@ -362,6 +325,8 @@ async def deposer_concentrateur(
         concentrateur_id=data.numero_serie,
     )
     db.add(action)
+    await record_stock_change(db, ancien_stock, stock_key(concentrateur))
+    emit_event(db, etat_change_event(action))
     
     await db.commit()
     
@@ -381,7 +346,7 @@ async def deposer_concentrateur(
 async def reception_bo(
     data: ActionConcentrateurRequest,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Réceptionner un concentrateur à la BO (en_livraison → en_stock).
@@ -395,7 +360,9 @@ async def reception_bo(
     
     # Récupérer le concentrateur
     result = await db.execute(
-        select(Concentrateur).where(Concentrateur.numero_serie == data.numero_serie)
+        select(Concentrateur)
+        .where(Concentrateur.numero_serie == data.numero_serie)
+        .with_for_update()
     )
     concentrateur = result.scalar_one_or_none()
     
@@ -414,6 +381,7 @@ async def reception_bo(
     # Mettre à jour l'état et l'affectation
     ancien_etat = concentrateur.etat
     ancienne_affectation = concentrateur.affectation
+    ancien_stock = stock_key(concentrateur)
     
     concentrateur.etat = 'en_stock'
     concentrateur.affectation = current_user.base_affectee
@@ -434,6 +402,8 @@ async def reception_bo(
         concentrateur_id=data.numero_serie,
     )
     db.add(action)
+    await record_stock_change(db, ancien_stock, stock_key(concentrateur))
+    emit_event(db, etat_change_event(action))
     
     await db.commit()
     
@@ -455,7 +425,7 @@ async def reception_bo(
 async def creer_demande_transfert(
     data: DemandeTransfertRequest,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Créer une demande de transfert de concentrateurs vers cette BO.
@@ -503,7 +473,7 @@ async def creer_demande_transfert(
 @router.get("/demandes")
 async def get_demandes_bo(
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Récupérer les demandes de transfert de la BO de l'utilisateur.
@@ -543,7 +513,7 @@ async def get_demandes_bo(
 async def get_concentrateurs_bo(
     etat: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Récupérer les concentrateurs de la BO de l'utilisateur.
@@ -578,3 +548,108 @@ async def get_concentrateurs_bo(
         }
         for c in concentrateurs
     ]
+
+
+# ============================================
+# ENDPOINT SYNCHRONISATION INCRÉMENTALE (PWA)
+# ============================================
+
+# Recouvrement du watermark final : une transaction encore ouverte au moment
+# de la lecture (updated_at déjà attribué) sera relue au prochain appel
+DELTA_SYNC_MARGE_SECONDES = 30
+
+
+@router.get("/concentrateurs/changes")
+async def get_concentrateurs_bo_changes(
+    since: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=2000),
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    Mise à jour incrémentale du miroir local (IndexedDB) du stock de la BO.
+    - changes : concentrateurs de la BO modifiés après le watermark `since`
+      (sans `since` : stock complet)
+    - tombstones : concentrateurs sortis de la BO depuis le watermark
+    - Rappeler avec since=watermark tant que has_more est vrai, puis périodiquement.
+      Une ligne peut être renvoyée deux fois : l'appliquer par numero_serie.
+    """
+    if not current_user.base_affectee:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Aucune base opérationnelle affectée"
+        )
+    bo = current_user.base_affectee
+    
+    conditions = [Concentrateur.affectation == bo]
+    since_date = None
+    if since:
+        since_date, since_id = decode_cursor(since, str)
+        if since_date is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Watermark invalide"
+            )
+        # Comparaison de ligne : parcours de ix_concentrateur_affectation_updated_at
+        conditions.append(
+            tuple_(Concentrateur.updated_at, Concentrateur.numero_serie) > tuple_(since_date, since_id or "")
+        )
+    
+    result = await db.execute(
+        select(Concentrateur)
+        .where(*conditions)
+        .order_by(Concentrateur.updated_at.asc(), Concentrateur.numero_serie.asc())
+        .limit(limit + 1)
+    )
+    concentrateurs = result.scalars().all()
+    
+    has_more = len(concentrateurs) > limit
+    if has_more:
+        concentrateurs = concentrateurs[:limit]
+        watermark = encode_cursor(concentrateurs[-1].updated_at, concentrateurs[-1].numero_serie)
+    else:
+        marge = datetime.utcnow() - timedelta(seconds=DELTA_SYNC_MARGE_SECONDES)
+        dernier = concentrateurs[-1].updated_at if concentrateurs else since_date
+        watermark = encode_cursor(min(marge, dernier) if dernier else marge, "")
+    
+    # Sorties de la BO depuis le watermark (hors concentrateurs revenus depuis)
+    tombstones = []
+    if since_date is not None:
+        result = await db.execute(
+            select(
+                HistoriqueAction.concentrateur_id,
+                func.max(HistoriqueAction.date_action).label("date_sortie")
+            )
+            .join(Concentrateur, Concentrateur.numero_serie == HistoriqueAction.concentrateur_id)
+            .where(
+                HistoriqueAction.ancienne_affectation == bo,
+                HistoriqueAction.nouvelle_affectation.is_distinct_from(bo),
+                HistoriqueAction.date_action >= since_date,
+                Concentrateur.affectation.is_distinct_from(bo)
+            )
+            .group_by(HistoriqueAction.concentrateur_id)
+        )
+        tombstones = [
+            {"numero_serie": row.concentrateur_id, "date_sortie": row.date_sortie}
+            for row in result
+        ]
+    
+    return {
+        "changes": [
+            {
+                "numero_serie": c.numero_serie,
+                "modele": c.modele,
+                "operateur": c.operateur,
+                "etat": c.etat,
+                "date_affectation": c.date_affectation,
+                "date_pose": c.date_pose,
+                "date_dernier_etat": c.date_dernier_etat,
+                "updated_at": c.updated_at
+            }
+            for c in concentrateurs
+        ],
+        "tombstones": tombstones,
+        "watermark": watermark,
+        "has_more": has_more,
+        "complet": since is None
+    }
@@ -1,14 +1,19 @@
 from typing import Optional, List
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, or_
+from sqlalchemy import select, func
 from datetime import datetime
 
 from app.core.database import get_db
 from app.api.deps import get_current_user, get_user_bo_filter, is_admin, require_bo_access
-from app.models.user import Utilisateur
+from app.api.pagination import encode_cursor, fetch_keyset_page, approximate_count
+from app.api.search import search_condition, search_rank, resolve_search_mode
+from app.schemas.user import CurrentUser
 from app.models.concentrateur import Concentrateur
 from app.models.action import HistoriqueAction
+from app.models.stock_summary import StockSummary
+from app.core.events import emit_event, etat_change_event
+from app.services.stock_summary import stock_key, record_stock_change, stock_counts_by
 from app.schemas.concentrateur import (
     ConcentrateurResponse,
     ConcentrateurCreate,
@@ -21,27 +26,18 @@ from app.schemas.concentrateur import (
 router = APIRouter()
 
 
-@router.get("", response_model=ConcentrateurListResponse)
-async def get_concentrateurs(
-    page: int = Query(1, ge=1),
-    limit: int = Query(50, ge=1, le=100),
+def concentrateur_conditions(
+    current_user: CurrentUser,
     search: Optional[str] = None,
+    search_mode: str = "auto",
     etat: Optional[str] = None,
     affectation: Optional[str] = None,
-    operateur: Optional[str] = None,
-    db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
-):
+    operateur: Optional[str] = None
+) -> list:
     """
-    Liste des concentrateurs avec pagination et filtres.
-    - Admin: accès à tous les concentrateurs
-    - Autres rôles: accès uniquement aux concentrateurs de leur BO
+    Filtres de la liste des concentrateurs (partagés avec l'export magasin).
+    Restreint à la BO de l'utilisateur s'il n'est pas admin.
     """
-    # Base query
-    query = select(Concentrateur)
-    count_query = select(func.count()).select_from(Concentrateur)
-    
-    # Filtres
     conditions = []
     
     # Filtre par BO selon le rôle de l'utilisateur
@@ -50,15 +46,7 @@ async def get_concentrateurs(
         conditions.append(Concentrateur.affectation == bo_filter)
     
     if search:
-        search_pattern = f"%{search}%"
-        conditions.append(
-            or_(
-                Concentrateur.numero_serie.ilike(search_pattern),
-                Concentrateur.modele.ilike(search_pattern),
-                Concentrateur.numero_carton.ilike(search_pattern),
-                Concentrateur.operateur.ilike(search_pattern)
-            )
-        )
+        conditions.append(search_condition(search, search_mode))
     
     if etat:
         conditions.append(Concentrateur.etat == etat)
@@ -69,18 +57,83 @@ async def get_concentrateurs(
     if operateur:
         conditions.append(Concentrateur.operateur == operateur)
     
+    return conditions
+
+
+@router.get("", response_model=ConcentrateurListResponse)
+async def get_concentrateurs(
+    page: int = Query(1, ge=1),
+    limit: int = Query(50, ge=1, le=100),
+    search: Optional[str] = None,
+    etat: Optional[str] = None,
+    affectation: Optional[str] = None,
+    operateur: Optional[str] = None,
+    search_mode: str = Query("auto", pattern="^(auto|prefix|fuzzy)$"),
+    pagination: str = Query("page", pattern="^(page|cursor)$"),
+    cursor: Optional[str] = None,
+    exact_total: bool = False,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    Liste des concentrateurs avec pagination et filtres.
+    - Admin: accès à tous les concentrateurs
+    - Autres rôles: accès uniquement aux concentrateurs de leur BO
+    - search: recherche par préfixe ou approchée (pg_trgm), triée par similarité
+      en mode page
+    - pagination=cursor: pagination par curseur (date_dernier_etat, numero_serie),
+      le total n'est calculé que si exact_total=true (sinon estimation sans filtre)
+    """
+    # Base query
+    query = select(Concentrateur)
+    count_query = select(func.count()).select_from(Concentrateur)
+    
+    # Filtres
+    conditions = concentrateur_conditions(
+        current_user, search, search_mode, etat, affectation, operateur
+    )
+    
     # Appliquer les conditions
     if conditions:
         for condition in conditions:
             query = query.where(condition)
             count_query = count_query.where(condition)
     
+    if pagination == "cursor":
+        rows = await fetch_keyset_page(
+            db, query, Concentrateur.date_dernier_etat, Concentrateur.numero_serie, cursor, limit
+        )
+        concentrateurs = [row[0] for row in rows]
+        
+        next_cursor = None
+        if len(concentrateurs) > limit:
+            concentrateurs = concentrateurs[:limit]
+            last = concentrateurs[-1]
+            next_cursor = encode_cursor(last.date_dernier_etat, last.numero_serie)
+        
+        if exact_total:
+            result = await db.execute(count_query)
+            total = result.scalar()
+        elif not conditions:
+            total = await approximate_count(db, Concentrateur.__tablename__)
+        else:
+            total = None
+        
+        return {
+            "data": concentrateurs,
+            "total": total,
+            "limit": limit,
+            "next_cursor": next_cursor
+        }
+    
     # Compter le total
     result = await db.execute(count_query)
     total = result.scalar()
     
     # Pagination
     offset = (page - 1) * limit
+    if search and resolve_search_mode(search, search_mode) == "fuzzy":
+        query = query.order_by(search_rank(search).desc())
     query = query.offset(offset).limit(limit).order_by(Concentrateur.date_dernier_etat.desc())
     
     # Exécuter
@@ -102,7 +155,7 @@ async def get_concentrateurs(
 async def verify_concentrateur(
     numero_serie: str,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Vérifie si un concentrateur existe (pour scan QR rapide).
@@ -122,7 +175,7 @@ async def verify_concentrateur(
 async def get_concentrateur(
     numero_serie: str,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Détail d'un concentrateur avec son historique d'actions.
@@ -163,7 +216,7 @@ async def get_concentrateur(
 async def create_concentrateur(
     data: ConcentrateurCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Créer un nouveau concentrateur.
@@ -216,6 +269,8 @@ async def create_concentrateur(
     )
     
     db.add(action)
+    await record_stock_change(db, None, stock_key(concentrateur))
+    emit_event(db, etat_change_event(action))
     await db.commit()
     await db.refresh(concentrateur)
     
@@ -227,14 +282,16 @@ async def update_concentrateur(
     numero_serie: str,
     data: ConcentrateurUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Mettre à jour un concentrateur.
     """
     # Récupérer le concentrateur
     result = await db.execute(
-        select(Concentrateur).where(Concentrateur.numero_serie == numero_serie)
+        select(Concentrateur)
+        .where(Concentrateur.numero_serie == numero_serie)
+        .with_for_update()
     )
     concentrateur = result.scalar_one_or_none()
     
@@ -247,6 +304,7 @@ async def update_concentrateur(
     # Sauvegarder les anciennes valeurs pour l'historique
     ancien_etat = concentrateur.etat
     ancienne_affectation = concentrateur.affectation
+    ancien_stock = stock_key(concentrateur)
     
     # Mettre à jour les champs
     update_data = data.model_dump(exclude_unset=True)
@@ -269,7 +327,9 @@ async def update_concentrateur(
             concentrateur_id=numero_serie
         )
         db.add(action)
+        emit_event(db, etat_change_event(action))
     
+    await record_stock_change(db, ancien_stock, stock_key(concentrateur))
     await db.commit()
     await db.refresh(concentrateur)
     
@@ -279,7 +339,7 @@ async def update_concentrateur(
 @router.get("/stats/overview")
 async def get_concentrateurs_stats(
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Statistiques des concentrateurs.
@@ -288,37 +348,19 @@ async def get_concentrateurs_stats(
     """
     # Filtre par BO selon le rôle
     bo_filter = get_user_bo_filter(current_user)
+    conditions = [StockSummary.affectation == bo_filter] if bo_filter else []
     
-    # Total
-    count_query = select(func.count()).select_from(Concentrateur)
-    if bo_filter:
-        count_query = count_query.where(Concentrateur.affectation == bo_filter)
-    result = await db.execute(count_query)
-    total = result.scalar()
-    
-    # Par état
-    etat_query = select(Concentrateur.etat, func.count()).group_by(Concentrateur.etat)
-    if bo_filter:
-        etat_query = etat_query.where(Concentrateur.affectation == bo_filter)
-    result = await db.execute(etat_query)
-    par_etat = {row[0]: row[1] for row in result}
-    
-    # Par opérateur
-    operateur_query = select(Concentrateur.operateur, func.count()).group_by(Concentrateur.operateur)
-    if bo_filter:
-        operateur_query = operateur_query.where(Concentrateur.affectation == bo_filter)
-    result = await db.execute(operateur_query)
-    par_operateur = {row[0]: row[1] for row in result}
+    # Compteurs lus dans stock_summary (une ligne par groupe)
+    par_etat = await stock_counts_by(db, StockSummary.etat, *conditions)
+    par_operateur = await stock_counts_by(db, StockSummary.operateur, *conditions)
+    total = sum(par_etat.values())
     
     # Par affectation (seulement pour admin)
     par_affectation = {}
     if is_admin(current_user):
-        result = await db.execute(
-            select(Concentrateur.affectation, func.count())
-            .where(Concentrateur.affectation.isnot(None))
-            .group_by(Concentrateur.affectation)
+        par_affectation = await stock_counts_by(
+            db, StockSummary.affectation, StockSummary.affectation.isnot(None)
         )
-        par_affectation = {row[0]: row[1] for row in result}
     else:
         par_affectation = {bo_filter: total} if bo_filter else {}
     
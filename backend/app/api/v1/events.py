@@ -0,0 +1,75 @@
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.events import broadcaster
+from app.api.deps import get_current_user
+from app.schemas.user import CurrentUser
+
+router = APIRouter()
+
+
+async def get_stream_user(
+    request: Request,
+    token: Optional[str] = Query(None, description="Jeton JWT (EventSource ne permet pas d'en-tête Authorization)"),
+    db: AsyncSession = Depends(get_db)
+) -> CurrentUser:
+    """
+    Authentification du flux SSE : en-tête Authorization ou paramètre token.
+    """
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token invalide ou expiré",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return await get_current_user(db=db, token=token)
+
+
+@router.get("")
+async def stream_events(
+    request: Request,
+    current_user: CurrentUser = Depends(get_stream_user)
+):
+    """
+    Flux Server-Sent Events des événements métier :
+    - concentrateur.etat : changement d'état ou d'affectation
+    - transfert.valide : transfert vers une BO
+    - labo.test : résultat de test labo
+    - commande.nouvelle : nouvelle demande de transfert
+    - notification : nouvelles notifications de l'utilisateur connecté
+    Filtré selon le rôle et la base_affectee de l'utilisateur (tout pour un admin).
+    """
+    subscription = broadcaster.subscribe(
+        current_user.id_utilisateur, current_user.role, current_user.base_affectee
+    )
+    
+    async def event_generator():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    domain_event = await asyncio.wait_for(
+                        subscription.queue.get(),
+                        timeout=settings.EVENTS_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    # Commentaire SSE : garde la connexion ouverte derrière les proxys
+                    yield ": ping\n\n"
+                    continue
+                yield domain_event.to_sse()
+        finally:
+            broadcaster.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
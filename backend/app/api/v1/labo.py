@@ -1,15 +1,25 @@
-from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from datetime import datetime
+from sqlalchemy import select, update, insert, func, true, literal_column, any_, bindparam, String, Text
+from sqlalchemy.dialects.postgresql import ARRAY
+from datetime import date, datetime, timedelta
 from pydantic import BaseModel
 
 from app.core.database import get_db
 from app.api.deps import get_current_user, is_admin
-from app.models.user import Utilisateur
+from app.api.pagination import encode_cursor, fetch_keyset_page
+from app.schemas.user import CurrentUser
 from app.models.concentrateur import Concentrateur
 from app.models.action import HistoriqueAction
+from app.models.user import Utilisateur
+from app.models.poste import PosteElectrique
+from app.models.labo_stats import LaboStatsJour
+from app.core.events import DomainEvent, emit_event, etat_change_event
+from app.services.notifications import PendingNotification, notify
+from app.services.rapports import enqueue_test_labo, report_runner
+from app.services.labo_stats import labo_totaux, labo_stats_par, labo_stats_watermark
+from app.services.stock_summary import stock_key, record_stock_change, StockDelta, apply_stock_delta
 
 router = APIRouter()
 
@@ -20,11 +30,225 @@ class TestRequest(BaseModel):
     commentaire: Optional[str] = None
 
 
+class BatchTestRequest(BaseModel):
+    tests: List[TestRequest]
+
+
+class QueueItem(BaseModel):
+    numero_serie: str
+    modele: Optional[str] = None
+    operateur: Optional[str] = None
+    etat: str
+    date_arrivee: Optional[datetime] = None
+    jours_attente: Optional[int] = None
+    priorite: str
+    date_depose: Optional[datetime] = None
+    bo_origine: Optional[str] = None
+    poste_id: Optional[int] = None
+    poste_code: Optional[str] = None
+    poste_nom: Optional[str] = None
+    technicien_id: Optional[int] = None
+    technicien_nom: Optional[str] = None
+    technicien_prenom: Optional[str] = None
+    commentaire_depose: Optional[str] = None
+
+
+class QueueResponse(BaseModel):
+    data: List[QueueItem]
+    total: int
+    next_cursor: Optional[str] = None
+
+
+# Au-delà de ce délai d'attente au labo, le test est prioritaire
+PRIORITE_HAUTE_JOURS = 7
+
+# Valeurs écrites en littéral dans le SQL (et non en paramètre) : le planificateur
+# ne peut choisir un index partiel que s'il voit la valeur de son prédicat
+EN_LABO = Concentrateur.affectation == literal_column("'Labo'")
+EST_DEPOSE = HistoriqueAction.type_action == literal_column("'depose'")
+
+# Résultat de test -> (nouvel état, nouvelle affectation, type d'action)
+RESULTATS_TEST = {
+    'reparable': ('en_stock', 'Magasin', 'test_labo'),
+    'hs': ('hs', 'Rebut', 'mise_au_rebut'),
+}
+
+# Nombre maximal de tests par soumission groupée
+TESTS_BATCH_MAX = 500
+
+
+@router.get("/queue", response_model=QueueResponse)
+async def get_labo_queue(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    etat: Optional[str] = None,
+    bo_origine: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    File d'attente des tests : concentrateurs au Labo, les plus anciens en premier
+    (priorité haute au-delà de PRIORITE_HAUTE_JOURS jours d'attente).
+    Chaque ligne porte la dernière dépose : BO et poste d'origine, technicien, commentaire.
+    - Pagination par curseur (next_cursor), index partiel ix_concentrateur_labo_queue
+    - Réservé aux rôles admin et labo
+    """
+    if current_user.role not in ['admin', 'labo']:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès réservé au personnel labo"
+        )
+    
+    # Dernière dépose du concentrateur (index partiel ix_historique_action_depose)
+    depose = (
+        select(
+            HistoriqueAction.date_action,
+            HistoriqueAction.ancienne_affectation,
+            HistoriqueAction.poste_id,
+            HistoriqueAction.user_id,
+            HistoriqueAction.commentaire
+        )
+        .where(
+            HistoriqueAction.concentrateur_id == Concentrateur.numero_serie,
+            EST_DEPOSE
+        )
+        .order_by(HistoriqueAction.date_action.desc())
+        .limit(1)
+        .lateral("depose")
+    )
+    poste_id = func.coalesce(depose.c.poste_id, Concentrateur.poste_id)
+    
+    conditions = [EN_LABO]
+    if etat:
+        conditions.append(Concentrateur.etat == etat)
+    if bo_origine:
+        conditions.append(depose.c.ancienne_affectation == bo_origine)
+    
+    query = (
+        select(
+            Concentrateur.numero_serie,
+            Concentrateur.modele,
+            Concentrateur.operateur,
+            Concentrateur.etat,
+            Concentrateur.date_dernier_etat,
+            depose.c.date_action,
+            depose.c.ancienne_affectation,
+            depose.c.user_id,
+            depose.c.commentaire,
+            poste_id.label("poste_id"),
+            PosteElectrique.code_poste,
+            PosteElectrique.nom_poste,
+            Utilisateur.nom,
+            Utilisateur.prenom
+        )
+        .select_from(Concentrateur)
+        .outerjoin(depose, true())
+        .outerjoin(PosteElectrique, PosteElectrique.id_poste == poste_id)
+        .outerjoin(Utilisateur, Utilisateur.id_utilisateur == depose.c.user_id)
+        .where(*conditions)
+    )
+    rows = await fetch_keyset_page(
+        db, query, Concentrateur.date_dernier_etat, Concentrateur.numero_serie, cursor, limit,
+        descending=False
+    )
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].date_dernier_etat, rows[-1].numero_serie)
+    
+    # Taille de la file (parcours de l'index partiel uniquement)
+    count_query = select(func.count()).select_from(Concentrateur).where(*conditions)
+    if bo_origine:
+        count_query = count_query.outerjoin(depose, true())
+    result = await db.execute(count_query)
+    total = result.scalar() or 0
+    
+    now = datetime.utcnow()
+    data = []
+    for row in rows:
+        jours = (now - row.date_dernier_etat).days if row.date_dernier_etat else None
+        data.append(QueueItem(
+            numero_serie=row.numero_serie,
+            modele=row.modele,
+            operateur=row.operateur,
+            etat=row.etat,
+            date_arrivee=row.date_dernier_etat,
+            jours_attente=jours,
+            priorite="haute" if jours is not None and jours >= PRIORITE_HAUTE_JOURS else "normale",
+            date_depose=row.date_action,
+            bo_origine=row.ancienne_affectation,
+            poste_id=row.poste_id,
+            poste_code=row.code_poste,
+            poste_nom=row.nom_poste,
+            technicien_id=row.user_id,
+            technicien_nom=row.nom,
+            technicien_prenom=row.prenom,
+            commentaire_depose=row.commentaire
+        ))
+    
+    return {"data": data, "total": total, "next_cursor": next_cursor}
+
+
+@router.get("/stats")
+async def get_labo_stats(
+    jours: int = Query(30, ge=1, le=3660),
+    date_debut: Optional[date] = None,
+    date_fin: Optional[date] = None,
+    modele: Optional[str] = None,
+    operateur: Optional[str] = None,
+    bo_origine: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    Performances du labo : taux de réparation, causes principales de panne,
+    indicateurs par modèle, opérateur, BO d'origine et par jour.
+    - Période : date_debut / date_fin (incluses), sinon les `jours` derniers jours
+    - Lit l'agrégat labo_stats_jour (rafraîchi en tâche de fond)
+    - Réservé aux rôles admin et labo
+    """
+    if current_user.role not in ['admin', 'labo']:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès réservé au personnel labo"
+        )
+    
+    fin = date_fin or datetime.utcnow().date()
+    debut = date_debut or fin - timedelta(days=jours - 1)
+    if debut > fin:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="date_debut doit précéder date_fin"
+        )
+    
+    conditions = [LaboStatsJour.jour >= debut, LaboStatsJour.jour <= fin]
+    if modele:
+        conditions.append(LaboStatsJour.modele == modele)
+    if operateur:
+        conditions.append(LaboStatsJour.operateur == operateur)
+    if bo_origine:
+        conditions.append(LaboStatsJour.bo_origine == bo_origine)
+    
+    return {
+        "periode": {"debut": debut, "fin": fin},
+        "mis_a_jour": await labo_stats_watermark(db),
+        "total": await labo_totaux(db, *conditions),
+        "par_modele": await labo_stats_par(db, LaboStatsJour.modele, *conditions),
+        "par_operateur": await labo_stats_par(db, LaboStatsJour.operateur, *conditions),
+        "par_bo_origine": await labo_stats_par(db, LaboStatsJour.bo_origine, *conditions),
+        "causes_principales": await labo_stats_par(
+            db, LaboStatsJour.cause, LaboStatsJour.cause.isnot(None), *conditions, limit=10
+        ),
+        "par_jour": await labo_stats_par(db, LaboStatsJour.jour, *conditions),
+    }
+
+
 @router.post("/test")
 async def enregistrer_test(
     data: TestRequest,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Enregistrer le résultat d'un test de concentrateur.
@@ -41,7 +265,9 @@ async def enregistrer_test(
     
     # Récupérer le concentrateur
     result = await db.execute(
-        select(Concentrateur).where(Concentrateur.numero_serie == data.numero_serie)
+        select(Concentrateur)
+        .where(Concentrateur.numero_serie == data.numero_serie)
+        .with_for_update()
     )
     concentrateur = result.scalar_one_or_none()
     
@@ -60,20 +286,14 @@ async def enregistrer_test(
     # Déterminer le nouvel état et affectation selon le résultat
     ancien_etat = concentrateur.etat
     ancienne_affectation = concentrateur.affectation
+    ancien_stock = stock_key(concentrateur)
     
-    if data.resultat == 'reparable':
-        nouvel_etat = 'en_stock'
-        nouvelle_affectation = 'Magasin'
-        type_action = 'test_labo'
-    elif data.resultat == 'hs':
-        nouvel_etat = 'hs'
-        nouvelle_affectation = 'Rebut'
-        type_action = 'mise_au_rebut'
-    else:
+    if data.resultat not in RESULTATS_TEST:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Résultat invalide. Utilisez 'reparable' ou 'hs'"
         )
+    nouvel_etat, nouvelle_affectation, type_action = RESULTATS_TEST[data.resultat]
     
     # Mettre à jour le concentrateur
     concentrateur.etat = nouvel_etat
@@ -96,13 +316,218 @@ async def enregistrer_test(
         concentrateur_id=data.numero_serie,
     )
     db.add(action)
+    await record_stock_change(db, ancien_stock, stock_key(concentrateur))
+    emit_event(db, etat_change_event(action))
+    emit_event(db, DomainEvent(
+        type="labo.test",
+        data={
+            "numero_serie": data.numero_serie,
+            "resultat": data.resultat,
+            "nouvel_etat": nouvel_etat,
+            "nouvelle_affectation": nouvelle_affectation,
+        },
+        bos=[ancienne_affectation] if ancienne_affectation else [],
+        roles=["labo", "magasin"]
+    ))
+    notify(db, PendingNotification(
+        message=f"Test labo {data.numero_serie} : {data.resultat.upper()} → {nouvelle_affectation}",
+        type_notification="test_labo",
+        priorite="haute" if data.resultat == 'hs' else "normale",
+        roles=["magasin"]
+    ))
+    
+    # Rapport de test généré en tâche de fond (regroupé avec les tests encore en attente)
+    rapport = await enqueue_test_labo(db, current_user.id_utilisateur, [data.numero_serie])
     
     await db.commit()
+    if rapport is not None:
+        report_runner.wake()
     
     return {
         "message": "Test enregistré",
         "numero_serie": data.numero_serie,
         "resultat": data.resultat,
         "nouvel_etat": nouvel_etat,
-        "nouvelle_affectation": nouvelle_affectation
+        "nouvelle_affectation": nouvelle_affectation,
+        "rapport_id": rapport.id_rapport if rapport is not None else None
+    }
+
+
+@router.post("/tests/batch")
+async def enregistrer_tests_batch(
+    data: BatchTestRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    Enregistrer les résultats d'un lot de tests (rack complet) en une transaction.
+    - Une seule lecture pour valider tout le lot
+    - Un UPDATE par résultat (reparable / hs) et un seul INSERT d'historique
+    - Résultat (ok / erreur) retourné pour chaque numéro de série
+    - Réservé aux rôles admin et labo
+    """
+    if current_user.role not in ['admin', 'labo']:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Seuls les administrateurs et le personnel labo peuvent enregistrer des tests"
+        )
+    
+    if not data.tests:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Aucun test à enregistrer"
+        )
+    
+    if len(data.tests) > TESTS_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Maximum {TESTS_BATCH_MAX} tests par envoi"
+        )
+    
+    # Contrôles sans accès à la base : résultat connu, numéro non répété
+    erreurs = {}
+    valides = {}
+    for test in data.tests:
+        if test.numero_serie in valides or test.numero_serie in erreurs:
+            erreurs[test.numero_serie] = "Numéro de série en double dans le lot"
+            valides.pop(test.numero_serie, None)
+        elif test.resultat not in RESULTATS_TEST:
+            erreurs[test.numero_serie] = "Résultat invalide. Utilisez 'reparable' ou 'hs'"
+        else:
+            valides[test.numero_serie] = test
+    
+    # Valider tout le lot en une requête (lignes verrouillées jusqu'au commit)
+    concentrateurs = {}
+    if valides:
+        result = await db.execute(
+            select(
+                Concentrateur.numero_serie, Concentrateur.affectation,
+                Concentrateur.etat, Concentrateur.operateur, Concentrateur.hs
+            )
+            .where(Concentrateur.numero_serie == any_(
+                bindparam("serials", list(valides), type_=ARRAY(String))
+            ))
+            .with_for_update()
+        )
+        concentrateurs = {row.numero_serie: row for row in result}
+    
+    groupes = {resultat: [] for resultat in RESULTATS_TEST}
+    for numero_serie, test in valides.items():
+        concentrateur = concentrateurs.get(numero_serie)
+        if concentrateur is None:
+            erreurs[numero_serie] = f"Concentrateur {numero_serie} non trouvé"
+        elif concentrateur.affectation != 'Labo':
+            erreurs[numero_serie] = (
+                f"Ce concentrateur n'est pas au Labo (affectation: {concentrateur.affectation})"
+            )
+        else:
+            groupes[test.resultat].append(test)
+    
+    # Un UPDATE par résultat ; le commentaire propre à chaque test vient de unnest()
+    now = datetime.utcnow()
+    delta = StockDelta()
+    historique = []
+    for resultat, tests in groupes.items():
+        if not tests:
+            continue
+        nouvel_etat, nouvelle_affectation, type_action = RESULTATS_TEST[resultat]
+        valeurs = func.unnest(
+            bindparam("serials", [test.numero_serie for test in tests], type_=ARRAY(String)),
+            bindparam("commentaires", [test.commentaire for test in tests], type_=ARRAY(Text))
+        ).table_valued("numero_serie", "commentaire").render_derived(name="valeurs")
+        await db.execute(
+            update(Concentrateur)
+            .where(
+                Concentrateur.numero_serie == valeurs.c.numero_serie,
+                Concentrateur.affectation == 'Labo'
+            )
+            .values(
+                etat=nouvel_etat,
+                affectation=nouvelle_affectation,
+                date_dernier_etat=now,
+                date_affectation=now,
+                hs=(resultat == 'hs'),
+                commentaire=valeurs.c.commentaire
+            )
+            .execution_options(synchronize_session=False)
+        )
+        for test in tests:
+            ancien = concentrateurs[test.numero_serie]
+            delta.move(
+                stock_key(ancien),
+                (nouvelle_affectation, ancien.operateur, nouvel_etat, resultat == 'hs')
+            )
+            historique.append({
+                "type_action": type_action,
+                "date_action": now,
+                "ancien_etat": ancien.etat,
+                "nouvel_etat": nouvel_etat,
+                "ancienne_affectation": ancien.affectation,
+                "nouvelle_affectation": nouvelle_affectation,
+                "commentaire": f"Test Labo: {resultat.upper()}. {test.commentaire or ''}".strip(),
+                "scan_qr": False,
+                "user_id": current_user.id_utilisateur,
+                "concentrateur_id": test.numero_serie,
+            })
+    
+    rapport = None
+    if historique:
+        await apply_stock_delta(db, delta)
+        await db.execute(insert(HistoriqueAction), historique)
+        
+        nb_hs = len(groupes['hs'])
+        nb_reparables = len(groupes['reparable'])
+        emit_event(db, DomainEvent(
+            type="labo.tests",
+            data={
+                "reparables": nb_reparables,
+                "hs": nb_hs,
+                "numeros_serie": [action["concentrateur_id"] for action in historique],
+            },
+            bos=['Labo'],
+            roles=["labo", "magasin"]
+        ))
+        notify(db, PendingNotification(
+            message=f"Tests labo : {nb_reparables} réparable(s) → Magasin, {nb_hs} HS → Rebut",
+            type_notification="test_labo",
+            priorite="haute" if nb_hs else "normale",
+            roles=["magasin"]
+        ))
+        
+        # Un seul rapport pour tout le lot
+        rapport = await enqueue_test_labo(
+            db,
+            current_user.id_utilisateur,
+            [action["concentrateur_id"] for action in historique],
+            periode_debut=now
+        )
+    
+    await db.commit()
+    if rapport is not None:
+        report_runner.wake()
+    
+    resultats = []
+    for test in data.tests:
+        if test.numero_serie in erreurs:
+            resultats.append({
+                "numero_serie": test.numero_serie,
+                "statut": "erreur",
+                "erreur": erreurs[test.numero_serie],
+            })
+        else:
+            nouvel_etat, nouvelle_affectation, _ = RESULTATS_TEST[test.resultat]
+            resultats.append({
+                "numero_serie": test.numero_serie,
+                "statut": "ok",
+                "resultat": test.resultat,
+                "nouvel_etat": nouvel_etat,
+                "nouvelle_affectation": nouvelle_affectation,
+            })
+    
+    return {
+        "message": f"{len(historique)} test(s) enregistré(s)",
+        "enregistres": len(historique),
+        "erreurs": len(data.tests) - len(historique),
+        "resultats": resultats,
+        "rapport_id": rapport.id_rapport if rapport is not None else None
     }
@@ -1,17 +1,25 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, func
+from sqlalchemy import select, update, func, insert, any_, bindparam, String
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
 from datetime import datetime
 from pydantic import BaseModel
 import uuid
 
 from app.core.database import get_db
 from app.api.deps import get_current_user, is_admin
-from app.models.user import Utilisateur
+from app.api.export import stream_export
+from app.api.pagination import keyset_order_by
+from app.api.v1.concentrateurs import concentrateur_conditions
+from app.schemas.user import CurrentUser
 from app.models.concentrateur import Concentrateur
 from app.models.carton import Carton
 from app.models.action import HistoriqueAction
+from app.models.stock_summary import StockSummary
+from app.core.events import DomainEvent, emit_event
+from app.services.notifications import PendingNotification, notify
+from app.services.stock_summary import StockDelta, apply_stock_delta, summary_count
 
 router = APIRouter()
 
@@ -51,33 +59,24 @@ class TransfertRequest(BaseModel):
 @router.get("/stats")
 async def get_magasin_stats(
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Récupérer les statistiques du magasin.
     """
-    # Total concentrateurs au Magasin
-    result_total = await db.execute(
-        select(func.count()).select_from(Concentrateur).where(Concentrateur.affectation == 'Magasin')
-    )
-    total = result_total.scalar() or 0
-    
-    # En stock
-    result_en_stock = await db.execute(
-        select(func.count()).select_from(Concentrateur).where(
-            Concentrateur.affectation == 'Magasin',
-            Concentrateur.etat == 'en_stock'
-        )
-    )
-    en_stock = result_en_stock.scalar() or 0
-    
-    # En livraison (vers les BO)
-    result_en_livraison = await db.execute(
-        select(func.count()).select_from(Concentrateur).where(
-            Concentrateur.etat == 'en_livraison'
+    # Compteurs lus dans stock_summary (une ligne par groupe)
+    result = await db.execute(
+        select(
+            summary_count(StockSummary.affectation == 'Magasin').label('total'),
+            summary_count(
+                StockSummary.affectation == 'Magasin',
+                StockSummary.etat == 'en_stock'
+            ).label('en_stock'),
+            # En livraison (vers les BO)
+            summary_count(StockSummary.etat == 'en_livraison').label('en_livraison')
         )
     )
-    en_livraison = result_en_livraison.scalar() or 0
+    stock = result.one()
     
     # Nombre de cartons
     result_cartons = await db.execute(
@@ -86,13 +85,57 @@ async def get_magasin_stats(
     nb_cartons = result_cartons.scalar() or 0
     
     return {
-        "total": total,
-        "en_stock": en_stock,
-        "en_livraison": en_livraison,
+        "total": stock.total,
+        "en_stock": stock.en_stock,
+        "en_livraison": stock.en_livraison,
         "nb_cartons": nb_cartons
     }
 
 
+# ============================================
+# EXPORT
+# ============================================
+
+EXPORT_COLUMNS = (
+    "numero_serie", "modele", "operateur", "etat", "affectation", "hs",
+    "numero_carton", "date_fabrication", "date_affectation", "date_pose", "date_dernier_etat",
+)
+
+
+@router.get("/export")
+async def export_stock(
+    search: Optional[str] = None,
+    etat: Optional[str] = None,
+    affectation: Optional[str] = None,
+    operateur: Optional[str] = None,
+    search_mode: str = Query("auto", pattern="^(auto|prefix|fuzzy)$"),
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    Export de la liste des concentrateurs en flux (csv ou ndjson),
+    mêmes filtres que GET /concentrateurs.
+    - gzip=true: réponse compressée (Content-Encoding: gzip)
+    """
+    if current_user.role not in ['admin', 'magasin']:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès réservé au personnel magasin"
+        )
+    
+    conditions = concentrateur_conditions(
+        current_user, search, search_mode, etat, affectation, operateur
+    )
+    query = (
+        select(Concentrateur)
+        .where(*conditions)
+        .order_by(*keyset_order_by(Concentrateur.date_dernier_etat, Concentrateur.numero_serie))
+    )
+    filename = f"stock_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+    return stream_export(query, EXPORT_COLUMNS, format, filename, gzip=gzip)
+
+
 # ============================================
 # ENDPOINTS CARTONS
 # ============================================
@@ -101,7 +144,7 @@ async def get_magasin_stats(
 async def get_carton(
     numero_carton: str,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Récupérer les informations d'un carton par son numéro.
@@ -145,7 +188,7 @@ async def get_carton(
 async def create_or_update_carton(
     data: CartonCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Créer ou mettre à jour un carton.
@@ -196,7 +239,7 @@ async def create_or_update_carton(
 async def get_concentrateur(
     numero_serie: str,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Vérifier si un concentrateur existe déjà.
@@ -230,7 +273,7 @@ async def get_concentrateur(
 
 @router.get("/operateurs")
 async def get_operateurs(
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Liste des opérateurs disponibles.
@@ -246,7 +289,7 @@ async def get_operateurs(
 
 @router.get("/bases-operationnelles")
 async def get_bases_operationnelles(
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Liste des bases opérationnelles disponibles.
@@ -265,11 +308,107 @@ async def get_bases_operationnelles(
 # ENDPOINT RECEPTION COMPLETE
 # ============================================
 
+async def receptionner_concentrateurs(
+    db: AsyncSession,
+    numero_carton: str,
+    concentrateurs: List[ConcentrateurCreate],
+    user_id: int
+) -> Tuple[List[str], List[str]]:
+    """
+    Insère en masse les concentrateurs d'un carton et leurs actions historiques.
+    - Un seul SELECT ... = ANY(:serials) pour détecter les numéros existants
+    - Un INSERT multi-lignes ON CONFLICT DO NOTHING RETURNING numero_serie
+    - Un INSERT groupé pour l'historique
+    Ne commit pas : la transaction reste à la charge de l'appelant.
+    Retourne (numéros créés, erreurs).
+    """
+    errors = []
+    
+    # Dédoublonner les scans en conservant l'ordre
+    a_creer = {}
+    for conc_data in concentrateurs:
+        if conc_data.numero_serie in a_creer:
+            errors.append(f"{conc_data.numero_serie}: scanné plusieurs fois")
+            continue
+        a_creer[conc_data.numero_serie] = conc_data
+    
+    # Vérifier en une requête les concentrateurs déjà existants
+    result = await db.execute(
+        select(Concentrateur.numero_serie).where(
+            Concentrateur.numero_serie == any_(
+                bindparam("serials", list(a_creer), type_=ARRAY(String))
+            )
+        )
+    )
+    existants = set(result.scalars().all())
+    
+    now = datetime.utcnow()
+    rows = [
+        {
+            "numero_serie": conc_data.numero_serie,
+            "modele": conc_data.modele,
+            "operateur": conc_data.operateur,
+            "etat": 'en_stock',
+            "affectation": 'Magasin',
+            "hs": False,
+            "numero_carton": numero_carton,
+            "date_affectation": now,
+            "date_dernier_etat": now,
+        }
+        for numero_serie, conc_data in a_creer.items()
+        if numero_serie not in existants
+    ]
+    
+    inseres = set()
+    if rows:
+        # ON CONFLICT protège contre une réception concurrente du même numéro
+        result = await db.execute(
+            pg_insert(Concentrateur)
+            .on_conflict_do_nothing(index_elements=[Concentrateur.numero_serie])
+            .returning(Concentrateur.numero_serie),
+            rows
+        )
+        inseres = set(result.scalars().all())
+    
+    created_concentrateurs = []
+    delta = StockDelta()
+    for numero_serie in a_creer:
+        if numero_serie in inseres:
+            created_concentrateurs.append(numero_serie)
+            delta.add(('Magasin', a_creer[numero_serie].operateur, 'en_stock', False))
+        else:
+            errors.append(f"{numero_serie}: déjà existant")
+    await apply_stock_delta(db, delta)
+    
+    # Créer les actions historiques en un seul INSERT
+    if created_concentrateurs:
+        await db.execute(
+            insert(HistoriqueAction),
+            [
+                {
+                    "type_action": 'reception_magasin',
+                    "ancien_etat": 'en_livraison',
+                    "nouvel_etat": 'en_stock',
+                    "ancienne_affectation": None,
+                    "nouvelle_affectation": 'Magasin',
+                    "commentaire": f"Réception carton {numero_carton}",
+                    "scan_qr": True,
+                    "user_id": user_id,
+                    "concentrateur_id": numero_serie,
+                    "carton_id": numero_carton,
+                }
+                for numero_serie in created_concentrateurs
+            ]
+        )
+    
+    return created_concentrateurs, errors
+
+
 @router.post("/reception")
 async def reception_carton(
     data: ReceptionRequest,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Réception complète d'un carton avec ses concentrateurs.
@@ -317,51 +456,15 @@ async def reception_carton(
         # Flush pour s'assurer que le carton existe avant les concentrateurs (FK)
         await db.flush()
         
-        created_concentrateurs = []
-        errors = []
-        
-        for conc_data in data.concentrateurs:
-            # Vérifier si le concentrateur existe déjà
-            result = await db.execute(
-                select(Concentrateur).where(Concentrateur.numero_serie == conc_data.numero_serie)
-            )
-            existing = result.scalar_one_or_none()
-            
-            if existing:
-                errors.append(f"{conc_data.numero_serie}: déjà existant")
-                continue
-            
-            concentrateur = Concentrateur(
-                numero_serie=conc_data.numero_serie,
-                modele=conc_data.modele,
-                operateur=conc_data.operateur,
-                etat='en_stock',
-                affectation='Magasin',
-                numero_carton=data.numero_carton,
-                date_affectation=datetime.utcnow(),
-                date_dernier_etat=datetime.utcnow(),
-            )
-            db.add(concentrateur)
-            created_concentrateurs.append(conc_data.numero_serie)
-        
-        # Flush pour créer les concentrateurs avant les actions historiques (FK)
-        await db.flush()
-        
-        # Créer les actions historiques après les concentrateurs
-        for numero_serie in created_concentrateurs:
-            action = HistoriqueAction(
-                type_action='reception_magasin',
-                ancien_etat='en_livraison',
-                nouvel_etat='en_stock',
-                ancienne_affectation=None,
-                nouvelle_affectation='Magasin',
-                commentaire=f"Réception carton {data.numero_carton}",
-                scan_qr=True,
-                user_id=current_user.id_utilisateur,
-                concentrateur_id=numero_serie,
-                carton_id=data.numero_carton,
-            )
-            db.add(action)
+        created_concentrateurs, errors = await receptionner_concentrateurs(
+            db, data.numero_carton, data.concentrateurs, current_user.id_utilisateur
+        )
+        if created_concentrateurs:
+            notify(db, PendingNotification(
+                message=f"Carton {data.numero_carton} réceptionné : {len(created_concentrateurs)} concentrateur(s) {data.operateur}",
+                type_notification="reception_magasin",
+                roles=["admin"]
+            ))
         
         await db.commit()
         
@@ -388,7 +491,7 @@ async def reception_carton(
 async def transfert_bo(
     data: TransfertRequest,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Transfert de concentrateurs du Magasin vers une BO.
@@ -407,43 +510,85 @@ async def transfert_bo(
             detail="Aucun concentrateur sélectionné"
         )
     
-    transferred = []
-    errors = []
+    serials = list(dict.fromkeys(data.concentrateurs))
+    
+    # Transférer en une requête tous les concentrateurs présents au Magasin
+    result = await db.execute(
+        update(Concentrateur)
+        .where(
+            Concentrateur.numero_serie == any_(bindparam("serials", serials, type_=ARRAY(String))),
+            Concentrateur.affectation == 'Magasin'
+        )
+        .values(
+            affectation=data.bo_destination,
+            date_affectation=datetime.utcnow()
+        )
+        .returning(
+            Concentrateur.numero_serie, Concentrateur.etat,
+            Concentrateur.operateur, Concentrateur.hs
+        )
+        .execution_options(synchronize_session=False)
+    )
+    etats = {}
+    delta = StockDelta()
+    for row in result:
+        etats[row.numero_serie] = row.etat
+        delta.move(
+            ('Magasin', row.operateur, row.etat, row.hs),
+            (data.bo_destination, row.operateur, row.etat, row.hs)
+        )
+    await apply_stock_delta(db, delta)
+    transferred = [numero_serie for numero_serie in serials if numero_serie in etats]
     
-    for numero_serie in data.concentrateurs:
-        # Récupérer le concentrateur
+    # Distinguer les numéros introuvables de ceux qui ne sont pas au Magasin
+    errors = []
+    restants = [numero_serie for numero_serie in serials if numero_serie not in etats]
+    if restants:
         result = await db.execute(
-            select(Concentrateur).where(Concentrateur.numero_serie == numero_serie)
+            select(Concentrateur.numero_serie).where(
+                Concentrateur.numero_serie == any_(bindparam("serials", restants, type_=ARRAY(String)))
+            )
         )
-        concentrateur = result.scalar_one_or_none()
-        
-        if not concentrateur:
-            errors.append(f"{numero_serie}: introuvable")
-            continue
-        
-        if concentrateur.affectation != 'Magasin':
-            errors.append(f"{numero_serie}: pas au Magasin")
-            continue
-        
-        # Mettre à jour le concentrateur
-        ancien_affectation = concentrateur.affectation
-        concentrateur.affectation = data.bo_destination
-        concentrateur.date_affectation = datetime.utcnow()
-        
-        # Créer l'action historique
-        action = HistoriqueAction(
-            type_action='transfert_bo',
-            ancien_etat=concentrateur.etat,
-            nouvel_etat=concentrateur.etat,
-            ancienne_affectation=ancien_affectation,
-            nouvelle_affectation=data.bo_destination,
-            commentaire=f"Transfert vers {data.bo_destination}",
-            scan_qr=False,
-            user_id=current_user.id_utilisateur,
-            concentrateur_id=numero_serie,
+        existants = set(result.scalars().all())
+        for numero_serie in restants:
+            if numero_serie in existants:
+                errors.append(f"{numero_serie}: pas au Magasin")
+            else:
+                errors.append(f"{numero_serie}: introuvable")
+    
+    # Créer les actions historiques en un seul INSERT
+    if transferred:
+        await db.execute(
+            insert(HistoriqueAction),
+            [
+                {
+                    "type_action": 'transfert_bo',
+                    "ancien_etat": etats[numero_serie],
+                    "nouvel_etat": etats[numero_serie],
+                    "ancienne_affectation": 'Magasin',
+                    "nouvelle_affectation": data.bo_destination,
+                    "commentaire": f"Transfert vers {data.bo_destination}",
+                    "scan_qr": False,
+                    "user_id": current_user.id_utilisateur,
+                    "concentrateur_id": numero_serie,
+                }
+                for numero_serie in transferred
+            ]
         )
-        db.add(action)
-        transferred.append(numero_serie)
+        emit_event(db, DomainEvent(
+            type="transfert.valide",
+            data={
+                "bo_destination": data.bo_destination,
+                "concentrateurs_transferes": len(transferred),
+            },
+            bos=[data.bo_destination],
+            roles=["magasin"]
+        ))
+        notify(db, PendingNotification(
+            message=f"{len(transferred)} concentrateur(s) expédié(s) du Magasin vers {data.bo_destination}",
+            type_notification="transfert_bo",
+            bos=[data.bo_destination]
+        ))
     
     await db.commit()
     
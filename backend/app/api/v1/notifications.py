@@ -0,0 +1,111 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, func
+from datetime import datetime
+from pydantic import BaseModel
+
+from app.core.database import get_db
+from app.api.deps import get_current_user
+from app.api.pagination import encode_cursor, fetch_keyset_page
+from app.schemas.user import CurrentUser
+from app.models.notification import Notification
+
+router = APIRouter()
+
+
+class NotificationResponse(BaseModel):
+    id_notification: int
+    message: str
+    type_notification: Optional[str] = None
+    date_envoi: Optional[datetime] = None
+    lu: bool
+    priorite: Optional[str] = None
+    
+    class Config:
+        from_attributes = True
+
+
+class NotificationListResponse(BaseModel):
+    data: List[NotificationResponse]
+    next_cursor: Optional[str] = None
+
+
+class MarkReadRequest(BaseModel):
+    ids: Optional[List[int]] = None
+    tout: bool = False
+
+
+@router.get("", response_model=NotificationListResponse)
+async def get_notifications(
+    non_lues: bool = False,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    Notifications de l'utilisateur connecté, les plus récentes en premier.
+    Pagination par curseur (next_cursor).
+    """
+    query = select(Notification).where(Notification.user_id == current_user.id_utilisateur)
+    if non_lues:
+        query = query.where(Notification.lu == False)
+    rows = await fetch_keyset_page(
+        db, query, Notification.date_envoi, Notification.id_notification, cursor, limit
+    )
+    notifications = [row[0] for row in rows]
+    
+    next_cursor = None
+    if len(notifications) > limit:
+        notifications = notifications[:limit]
+        dernier = notifications[-1]
+        next_cursor = encode_cursor(dernier.date_envoi, dernier.id_notification)
+    
+    return {"data": notifications, "next_cursor": next_cursor}
+
+
+@router.get("/non-lues/count")
+async def get_unread_count(
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    Nombre de notifications non lues (badge).
+    Servi par l'index partiel ix_notification_non_lues (lu = false).
+    """
+    result = await db.execute(
+        select(func.count()).select_from(Notification).where(
+            Notification.user_id == current_user.id_utilisateur,
+            Notification.lu == False
+        )
+    )
+    return {"non_lues": result.scalar() or 0}
+
+
+@router.post("/marquer-lues")
+async def mark_notifications_read(
+    data: MarkReadRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    Marquer comme lues les notifications `ids`, ou toutes avec `tout: true`.
+    Les notifications des autres utilisateurs ne sont jamais modifiées.
+    """
+    if not data.tout and not data.ids:
+        return {"updated": 0}
+    
+    query = update(Notification).where(
+        Notification.user_id == current_user.id_utilisateur,
+        Notification.lu == False
+    )
+    if not data.tout:
+        query = query.where(Notification.id_notification.in_(data.ids))
+    
+    result = await db.execute(
+        query.values(lu=True).execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    
+    return {"updated": result.rowcount}
@@ -0,0 +1,167 @@
+import os
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from datetime import datetime
+from pydantic import BaseModel
+
+from app.core.database import get_db
+from app.api.deps import get_current_user, get_user_bo_filter, is_admin
+from app.schemas.user import CurrentUser
+from app.models.rapport import Rapport
+from app.services.rapports import REPORT_TYPES, FORMATS, create_rapport, report_path, report_runner
+
+router = APIRouter()
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "pdf": "application/pdf",
+}
+
+
+class RapportCreate(BaseModel):
+    type_rapport: str
+    format: str = "csv"
+    periode_debut: Optional[datetime] = None
+    periode_fin: Optional[datetime] = None
+    parametres: Optional[dict] = None
+
+
+class RapportResponse(BaseModel):
+    id_rapport: int
+    user_id: int
+    type_rapport: str
+    format: Optional[str] = None
+    statut: str
+    periode_debut: Optional[datetime] = None
+    periode_fin: Optional[datetime] = None
+    parametres: Optional[dict] = None
+    nb_lignes: Optional[int] = None
+    erreur: Optional[str] = None
+    tentatives: int = 0
+    created_at: Optional[datetime] = None
+    date_debut: Optional[datetime] = None
+    date_fin: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+
+async def get_rapport_or_404(db: AsyncSession, id_rapport: int, current_user: CurrentUser) -> Rapport:
+    rapport = await db.get(Rapport, id_rapport)
+    if not rapport or (not is_admin(current_user) and rapport.user_id != current_user.id_utilisateur):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Rapport {id_rapport} non trouvé"
+        )
+    return rapport
+
+
+@router.post("", response_model=RapportResponse, status_code=status.HTTP_202_ACCEPTED)
+async def enqueue_rapport(
+    data: RapportCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    Demander la génération d'un rapport (stock, inventaire, actions, test_labo)
+    au format csv, xlsx ou pdf. La génération est faite en tâche de fond :
+    suivre le statut avec GET /rapports/{id}.
+    - Autres rôles qu'admin: rapport limité à leur BO
+    """
+    if data.type_rapport not in REPORT_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Type de rapport invalide. Valeurs possibles : {', '.join(REPORT_TYPES)}"
+        )
+    if data.format not in FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Format invalide. Valeurs possibles : {', '.join(FORMATS)}"
+        )
+    
+    parametres = dict(data.parametres or {})
+    bo_filter = get_user_bo_filter(current_user)
+    if bo_filter and current_user.role not in ['magasin', 'labo']:
+        parametres["bo"] = bo_filter
+    
+    rapport = create_rapport(
+        db,
+        user_id=current_user.id_utilisateur,
+        type_rapport=data.type_rapport,
+        format=data.format,
+        periode_debut=data.periode_debut,
+        periode_fin=data.periode_fin,
+        parametres=parametres
+    )
+    await db.commit()
+    await db.refresh(rapport)
+    report_runner.wake()
+    
+    return rapport
+
+
+@router.get("", response_model=List[RapportResponse])
+async def get_rapports(
+    limit: int = Query(20, ge=1, le=100),
+    statut: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    Rapports demandés par l'utilisateur (tous pour un admin), les plus récents en premier.
+    """
+    query = select(Rapport).order_by(Rapport.id_rapport.desc()).limit(limit)
+    if not is_admin(current_user):
+        query = query.where(Rapport.user_id == current_user.id_utilisateur)
+    if statut:
+        query = query.where(Rapport.statut == statut)
+    
+    result = await db.execute(query)
+    return result.scalars().all()
+
+
+@router.get("/{id_rapport}", response_model=RapportResponse)
+async def get_rapport(
+    id_rapport: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    Statut d'un rapport : en_attente, en_cours, termine ou erreur.
+    """
+    return await get_rapport_or_404(db, id_rapport, current_user)
+
+
+@router.get("/{id_rapport}/download")
+async def download_rapport(
+    id_rapport: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    Télécharger le fichier d'un rapport terminé.
+    """
+    rapport = await get_rapport_or_404(db, id_rapport, current_user)
+    
+    if rapport.statut != "termine" or not rapport.fichier:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Rapport non disponible (statut : {rapport.statut})"
+        )
+    
+    path = report_path(rapport.fichier)
+    if not os.path.isfile(path):
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Fichier du rapport introuvable sur le serveur"
+        )
+    
+    return FileResponse(
+        path,
+        media_type=MEDIA_TYPES.get(rapport.format, "application/octet-stream"),
+        filename=rapport.fichier
+    )
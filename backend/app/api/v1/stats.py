@@ -1,64 +1,98 @@
-from typing import List
-from fastapi import APIRouter, Depends
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, case, and_
+from sqlalchemy import select, func
 from datetime import datetime, timedelta
+from pydantic import BaseModel
 
 from app.core.database import get_db
-from app.api.deps import get_current_user
+from app.core.config import settings
+from app.core.response_cache import create_response_cache, invalidate_on_write
+from app.api.deps import get_current_user, get_user_bo_filter
 from app.models.user import Utilisateur
-from app.models.concentrateur import Concentrateur
+from app.schemas.user import CurrentUser
+from app.models.stock_summary import StockSummary
 from app.models.action import HistoriqueAction
 from app.models.poste import PosteElectrique
 from app.models.carton import Carton
+from app.services.stock_summary import summary_count
 
 router = APIRouter()
 
+# Réponses mises en cache par endpoint, paramètres et périmètre BO ;
+# invalidées à chaque écriture dans l'historique des actions ou dans les
+# compteurs de stock (modification d'un concentrateur sans action, réconciliation)
+stats_cache = create_response_cache(
+    ttl_seconds=settings.STATS_CACHE_TTL_SECONDS,
+    max_size=settings.STATS_CACHE_MAX_SIZE,
+    prefix="stats_cache"
+)
+invalidate_on_write(stats_cache, HistoriqueAction.__table__)
+invalidate_on_write(stats_cache, StockSummary.__table__)
+
+
+class ActionUserInfo(BaseModel):
+    id: Optional[int] = None
+    nom: str = "Inconnu"
+    prenom: str = ""
+    role: Optional[str] = None
+
+
+class ActionRecenteResponse(BaseModel):
+    id_action: int
+    type_action: str
+    date_action: datetime
+    ancien_etat: Optional[str] = None
+    nouvel_etat: Optional[str] = None
+    ancienne_affectation: Optional[str] = None
+    nouvelle_affectation: Optional[str] = None
+    commentaire: Optional[str] = None
+    concentrateur_id: Optional[str] = None
+    user: Optional[ActionUserInfo] = None
+
 
 @router.get("/overview")
+@stats_cache.cached(scope_of=get_user_bo_filter)
 async def get_stats_overview(
+    request: Request,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Statistiques globales pour le dashboard.
     """
-    # Total concentrateurs
-    result = await db.execute(select(func.count()).select_from(Concentrateur))
-    total = result.scalar() or 0
-    
-    # Par état
+    # Compteurs de concentrateurs lus dans stock_summary (une ligne par groupe)
     result = await db.execute(
-        select(Concentrateur.etat, func.count())
-        .group_by(Concentrateur.etat)
-    )
-    etats = {row[0]: row[1] for row in result}
-    
-    # En stock par affectation (Magasin vs BO)
-    result = await db.execute(
-        select(func.count())
-        .where(and_(
-            Concentrateur.etat == 'en_stock',
-            Concentrateur.affectation == 'Magasin'
-        ))
-    )
-    en_stock_magasin = result.scalar() or 0
-    
-    result = await db.execute(
-        select(func.count())
-        .where(and_(
-            Concentrateur.etat == 'en_stock',
-            Concentrateur.affectation.in_(['BO Nord', 'BO Sud', 'BO Centre'])
-        ))
+        select(
+            summary_count().label('total'),
+            summary_count(StockSummary.etat == 'en_livraison').label('en_livraison'),
+            summary_count(StockSummary.etat == 'en_stock').label('en_stock'),
+            summary_count(
+                StockSummary.etat == 'en_stock',
+                StockSummary.affectation == 'Magasin'
+            ).label('en_stock_magasin'),
+            summary_count(
+                StockSummary.etat == 'en_stock',
+                StockSummary.affectation.in_(['BO Nord', 'BO Sud', 'BO Centre'])
+            ).label('en_stock_bo'),
+            summary_count(StockSummary.etat == 'pose').label('pose'),
+            summary_count(StockSummary.etat == 'a_tester').label('a_tester'),
+            summary_count(StockSummary.etat == 'hs').label('hs')
+        )
     )
-    en_stock_bo = result.scalar() or 0
+    stock = result.one()
     
     # Actions aujourd'hui
-    today = datetime.utcnow().date()
+    # Intervalle sur date_action (et non date(date_action)) : index utilisable,
+    # une seule partition lue
+    today = datetime.combine(datetime.utcnow().date(), datetime.min.time())
     result = await db.execute(
         select(func.count())
         .select_from(HistoriqueAction)
-        .where(func.date(HistoriqueAction.date_action) == today)
+        .where(
+            HistoriqueAction.date_action >= today,
+            HistoriqueAction.date_action < today + timedelta(days=1)
+        )
     )
     actions_today = result.scalar() or 0
     
@@ -73,14 +107,14 @@ async def get_stats_overview(
     total_utilisateurs = result.scalar() or 0
     
     return {
-        "total_concentrateurs": total,
-        "en_livraison": etats.get('en_livraison', 0),
-        "en_stock": etats.get('en_stock', 0),
-        "en_stock_magasin": en_stock_magasin,
-        "en_stock_bo": en_stock_bo,
-        "pose": etats.get('pose', 0),
-        "a_tester": etats.get('a_tester', 0),
-        "hs": etats.get('hs', 0),
+        "total_concentrateurs": stock.total,
+        "en_livraison": stock.en_livraison,
+        "en_stock": stock.en_stock,
+        "en_stock_magasin": stock.en_stock_magasin,
+        "en_stock_bo": stock.en_stock_bo,
+        "pose": stock.pose,
+        "a_tester": stock.a_tester,
+        "hs": stock.hs,
         "actions_today": actions_today,
         "total_postes": total_postes,
         "total_cartons": total_cartons,
@@ -89,31 +123,34 @@ async def get_stats_overview(
 
 
 @router.get("/stocks-par-base")
+@stats_cache.cached(scope_of=get_user_bo_filter)
 async def get_stocks_par_base(
+    request: Request,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Répartition des stocks par base opérationnelle.
     """
     # Total global pour calculer les pourcentages
-    result = await db.execute(select(func.count()).select_from(Concentrateur))
+    result = await db.execute(select(summary_count()))
     total_global = result.scalar() or 1  # Éviter division par zéro
     
     # Stats par affectation
     result = await db.execute(
         select(
-            Concentrateur.affectation,
-            func.count().label('total'),
-            func.sum(case((Concentrateur.etat == 'en_livraison', 1), else_=0)).label('en_livraison'),
-            func.sum(case((Concentrateur.etat == 'en_stock', 1), else_=0)).label('en_stock'),
-            func.sum(case((Concentrateur.etat == 'pose', 1), else_=0)).label('pose'),
-            func.sum(case((Concentrateur.etat == 'a_tester', 1), else_=0)).label('a_tester'),
-            func.sum(case((Concentrateur.etat == 'hs', 1), else_=0)).label('hs')
+            StockSummary.affectation,
+            summary_count().label('total'),
+            summary_count(StockSummary.etat == 'en_livraison').label('en_livraison'),
+            summary_count(StockSummary.etat == 'en_stock').label('en_stock'),
+            summary_count(StockSummary.etat == 'pose').label('pose'),
+            summary_count(StockSummary.etat == 'a_tester').label('a_tester'),
+            summary_count(StockSummary.etat == 'hs').label('hs')
         )
-        .where(Concentrateur.affectation.isnot(None))
-        .group_by(Concentrateur.affectation)
-        .order_by(func.count().desc())
+        .where(StockSummary.affectation.isnot(None))
+        .group_by(StockSummary.affectation)
+        .having(func.sum(StockSummary.count) > 0)
+        .order_by(func.sum(StockSummary.count).desc())
     )
     
     stocks = []
@@ -133,70 +170,68 @@ async def get_stocks_par_base(
     return stocks
 
 
-@router.get("/actions-recentes")
+@router.get("/actions-recentes", response_model=List[ActionRecenteResponse])
+@stats_cache.cached(scope_of=get_user_bo_filter)
 async def get_actions_recentes(
+    request: Request,
     limit: int = 10,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Dernières actions effectuées.
     """
+    # Jointure sur l'utilisateur pour éviter une requête par action
     result = await db.execute(
-        select(HistoriqueAction)
+        select(HistoriqueAction, Utilisateur)
+        .outerjoin(Utilisateur, Utilisateur.id_utilisateur == HistoriqueAction.user_id)
         .order_by(HistoriqueAction.date_action.desc())
         .limit(limit)
     )
-    actions = result.scalars().all()
     
-    # Enrichir avec les infos utilisateur
-    actions_enrichies = []
-    for action in actions:
-        # Récupérer l'utilisateur
-        user_result = await db.execute(
-            select(Utilisateur).where(Utilisateur.id_utilisateur == action.user_id)
+    return [
+        ActionRecenteResponse(
+            id_action=action.id_action,
+            type_action=action.type_action,
+            date_action=action.date_action,
+            ancien_etat=action.ancien_etat,
+            nouvel_etat=action.nouvel_etat,
+            ancienne_affectation=action.ancienne_affectation,
+            nouvelle_affectation=action.nouvelle_affectation,
+            commentaire=action.commentaire,
+            concentrateur_id=action.concentrateur_id,
+            user=ActionUserInfo(
+                id=user.id_utilisateur,
+                nom=user.nom,
+                prenom=user.prenom,
+                role=user.role
+            ) if user else None
         )
-        user = user_result.scalar_one_or_none()
-        
-        actions_enrichies.append({
-            "id_action": action.id_action,
-            "type_action": action.type_action,
-            "date_action": action.date_action,
-            "ancien_etat": action.ancien_etat,
-            "nouvel_etat": action.nouvel_etat,
-            "ancienne_affectation": action.ancienne_affectation,
-            "nouvelle_affectation": action.nouvelle_affectation,
-            "commentaire": action.commentaire,
-            "concentrateur_id": action.concentrateur_id,
-            "user": {
-                "id": user.id_utilisateur if user else None,
-                "nom": user.nom if user else "Inconnu",
-                "prenom": user.prenom if user else "",
-                "role": user.role if user else None
-            } if user else None
-        })
-    
-    return actions_enrichies
+        for action, user in result
+    ]
 
 
 @router.get("/par-operateur")
+@stats_cache.cached(scope_of=get_user_bo_filter)
 async def get_stats_par_operateur(
+    request: Request,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Répartition des concentrateurs par opérateur.
     """
     result = await db.execute(
         select(
-            Concentrateur.operateur,
-            func.count().label('total'),
-            func.sum(case((Concentrateur.etat == 'en_stock', 1), else_=0)).label('en_stock'),
-            func.sum(case((Concentrateur.etat == 'pose', 1), else_=0)).label('pose'),
-            func.sum(case((Concentrateur.hs == True, 1), else_=0)).label('hs')
+            StockSummary.operateur,
+            summary_count().label('total'),
+            summary_count(StockSummary.etat == 'en_stock').label('en_stock'),
+            summary_count(StockSummary.etat == 'pose').label('pose'),
+            summary_count(StockSummary.hs == True).label('hs')
         )
-        .group_by(Concentrateur.operateur)
-        .order_by(func.count().desc())
+        .group_by(StockSummary.operateur)
+        .having(func.sum(StockSummary.count) > 0)
+        .order_by(func.sum(StockSummary.count).desc())
     )
     
     operateurs = []
@@ -213,9 +248,11 @@ async def get_stats_par_operateur(
 
 
 @router.get("/postes-par-bo")
+@stats_cache.cached(scope_of=get_user_bo_filter)
 async def get_postes_par_bo(
+    request: Request,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Répartition des postes électriques par BO.
@@ -0,0 +1,359 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, insert, any_, bindparam, String, Integer
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from datetime import datetime, timedelta, timezone
+from pydantic import BaseModel
+from uuid import UUID
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.api.deps import get_current_user
+from app.schemas.user import CurrentUser
+from app.models.concentrateur import Concentrateur
+from app.models.action import HistoriqueAction
+from app.models.poste import PosteElectrique
+from app.models.sync_operation import SyncOperation
+from app.core.events import DomainEvent, emit_event
+from app.services.stock_summary import stock_key, StockDelta, apply_stock_delta
+from app.services.partitions import mois_attaches, debut_mois
+
+router = APIRouter()
+
+
+# ============================================
+# SCHEMAS
+# ============================================
+
+class SyncAction(BaseModel):
+    client_id: UUID
+    type_action: str  # 'pose' ou 'depose'
+    numero_serie: str
+    date_client: datetime
+    poste_id: Optional[int] = None
+    commentaire: Optional[str] = None
+    scan_qr: bool = True
+
+
+class SyncActionsRequest(BaseModel):
+    actions: List[SyncAction]
+
+
+class SyncResultat(BaseModel):
+    client_id: UUID
+    statut: str  # applique, conflit, erreur
+    rejoue: bool = False
+    numero_serie: Optional[str] = None
+    type_action: Optional[str] = None
+    detail: Optional[str] = None
+    id_action: Optional[int] = None
+    etat_serveur: Optional[str] = None
+    date_dernier_etat: Optional[datetime] = None
+
+
+class SyncActionsResponse(BaseModel):
+    resultats: List[SyncResultat]
+    appliques: int
+    conflits: int
+    erreurs: int
+
+
+# Nombre maximal d'actions par synchronisation
+SYNC_BATCH_MAX = 500
+
+
+class Rejet(Exception):
+    """Action non appliquée : statut 'conflit' (état divergent) ou 'erreur'."""
+    
+    def __init__(self, statut: str, detail: str):
+        self.statut = statut
+        self.detail = detail
+
+
+def _utc(date_client: datetime) -> datetime:
+    """Horodatage client en UTC naïf (comme datetime.utcnow()), jamais dans le futur."""
+    if date_client.tzinfo is not None:
+        date_client = date_client.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(date_client, datetime.utcnow())
+
+
+def _verifier_date(date_action: datetime, mois: Optional[set]) -> None:
+    """
+    Date hors de la fenêtre hors ligne (SYNC_MAX_AGE_DAYS), ou d'un mois sans
+    partition attachée (archivé ou détaché) : l'insertion échouerait pour tout le lot.
+    """
+    if date_action < datetime.utcnow() - timedelta(days=settings.SYNC_MAX_AGE_DAYS):
+        raise Rejet(
+            "erreur",
+            f"Action datée du {date_action:%d/%m/%Y} : au-delà de {settings.SYNC_MAX_AGE_DAYS} jours "
+            "hors ligne (vérifier l'horloge du terminal)"
+        )
+    if mois is not None and debut_mois(date_action.date()) not in mois:
+        raise Rejet("erreur", f"Historique de {date_action:%m/%Y} non modifiable (mois archivé ou sans partition)")
+
+
+# ============================================
+# APPLICATION D'UNE ACTION
+# ============================================
+
+def _appliquer(concentrateur: Optional[Concentrateur], action: SyncAction, date_action: datetime,
+               current_user: CurrentUser) -> dict:
+    """
+    Applique une pose ou une dépose à l'état en mémoire du concentrateur
+    (mêmes règles que /bo/pose et /bo/depose) et retourne la ligne historique.
+    Lève Rejet si l'action ne peut pas être appliquée.
+    """
+    is_admin = current_user.role == 'admin'
+    
+    if action.type_action not in ('pose', 'depose'):
+        raise Rejet("erreur", "Type d'action non synchronisable (pose ou depose)")
+    if concentrateur is None:
+        raise Rejet("erreur", "Concentrateur non trouvé")
+    if action.type_action == 'pose' or not is_admin:
+        if not current_user.base_affectee:
+            raise Rejet("erreur", "Aucune base opérationnelle affectée")
+        if concentrateur.affectation != current_user.base_affectee:
+            raise Rejet(
+                "erreur",
+                f"Ce concentrateur n'est pas affecté à votre BO ({current_user.base_affectee})"
+            )
+    
+    # Modifié sur le serveur après le scan hors ligne : le client doit se resynchroniser
+    if concentrateur.date_dernier_etat and concentrateur.date_dernier_etat > date_action:
+        raise Rejet(
+            "conflit",
+            f"Concentrateur modifié sur le serveur après l'action "
+            f"({concentrateur.date_dernier_etat.isoformat()})"
+        )
+    
+    ancien_etat = concentrateur.etat
+    if action.type_action == 'pose':
+        if ancien_etat != 'en_stock':
+            raise Rejet("conflit", f"Le concentrateur doit être en état 'en_stock' pour être posé (état actuel: {ancien_etat})")
+        concentrateur.etat = 'pose'
+        concentrateur.date_pose = date_action
+        if action.poste_id:
+            concentrateur.poste_id = action.poste_id
+        commentaire = f"Pose effectuée par {current_user.prenom} {current_user.nom}"
+    else:
+        if ancien_etat != 'pose':
+            raise Rejet("conflit", f"Le concentrateur doit être en état 'pose' pour être déposé (état actuel: {ancien_etat})")
+        concentrateur.etat = 'a_tester'
+        commentaire = f"Dépose effectuée par {current_user.prenom} {current_user.nom}" + (" (admin)" if is_admin else "")
+    concentrateur.date_dernier_etat = date_action
+    concentrateur.updated_at = datetime.utcnow()
+    
+    bo_affectation = concentrateur.affectation or current_user.base_affectee
+    return {
+        "type_action": action.type_action,
+        "date_action": date_action,
+        "ancien_etat": ancien_etat,
+        "nouvel_etat": concentrateur.etat,
+        "ancienne_affectation": bo_affectation,
+        "nouvelle_affectation": bo_affectation,
+        "commentaire": f"{commentaire} (hors ligne). {action.commentaire or ''}".strip(),
+        "scan_qr": action.scan_qr,
+        "user_id": current_user.id_utilisateur,
+        "concentrateur_id": action.numero_serie,
+        "poste_id": action.poste_id,
+    }
+
+
+# ============================================
+# ENDPOINT SYNCHRONISATION
+# ============================================
+
+@router.post("/actions", response_model=SyncActionsResponse)
+async def synchroniser_actions(
+    data: SyncActionsRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    Rejoue en une requête les poses/déposes scannées hors ligne par la PWA.
+    - Idempotent : chaque action porte un client_id (UUID) ; un identifiant déjà
+      reçu retourne le résultat enregistré (rejoue=true) sans réappliquer l'action
+    - Actions appliquées dans l'ordre de date_client, dans une seule transaction
+    - Conflit si le concentrateur a changé sur le serveur après date_client,
+      ou si son état ne permet plus l'action
+    - Résultat (applique / conflit / erreur) retourné pour chaque action
+    """
+    if not data.actions:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Aucune action à synchroniser"
+        )
+    
+    if len(data.actions) > SYNC_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Maximum {SYNC_BATCH_MAX} actions par synchronisation"
+        )
+    
+    actions = {}
+    for action in data.actions:
+        actions.setdefault(str(action.client_id), action)
+    
+    # Réserver les identifiants : un identifiant déjà présent (envoi précédent,
+    # ou requête concurrente dont on attend le commit) n'est pas réappliqué
+    result = await db.execute(
+        pg_insert(SyncOperation)
+        .values([
+            {
+                "client_id": client_id,
+                "user_id": current_user.id_utilisateur,
+                "type_action": action.type_action,
+                "concentrateur_id": action.numero_serie,
+                "date_client": _utc(action.date_client),
+                "date_reception": datetime.utcnow(),
+                "statut": "en_cours",
+            }
+            for client_id, action in actions.items()
+        ])
+        .on_conflict_do_nothing(index_elements=[SyncOperation.client_id])
+        .returning(SyncOperation.client_id)
+    )
+    nouveaux = set(result.scalars().all())
+    
+    resultats = {}
+    deja_recus = [client_id for client_id in actions if client_id not in nouveaux]
+    if deja_recus:
+        result = await db.execute(
+            select(SyncOperation).where(
+                SyncOperation.client_id == any_(bindparam("ids", deja_recus, type_=ARRAY(String)))
+            )
+        )
+        for operation in result.scalars():
+            if operation.user_id != current_user.id_utilisateur:
+                resultats[operation.client_id] = SyncResultat(
+                    client_id=operation.client_id,
+                    statut="erreur",
+                    rejoue=True,
+                    detail="Identifiant client déjà utilisé par un autre utilisateur"
+                )
+            else:
+                resultats[operation.client_id] = SyncResultat(
+                    client_id=operation.client_id,
+                    statut=operation.statut,
+                    rejoue=True,
+                    numero_serie=operation.concentrateur_id,
+                    type_action=operation.type_action,
+                    detail=operation.detail,
+                    id_action=operation.id_action
+                )
+    
+    # Concentrateurs concernés, verrouillés jusqu'au commit (une seule requête)
+    a_appliquer = sorted(
+        (client_id for client_id in actions if client_id in nouveaux),
+        key=lambda client_id: _utc(actions[client_id].date_client)
+    )
+    serials = list({actions[client_id].numero_serie for client_id in a_appliquer})
+    concentrateurs = {}
+    if serials:
+        result = await db.execute(
+            select(Concentrateur)
+            .where(Concentrateur.numero_serie == any_(bindparam("serials", serials, type_=ARRAY(String))))
+            .with_for_update()
+        )
+        concentrateurs = {concentrateur.numero_serie: concentrateur for concentrateur in result.scalars()}
+    
+    # Postes référencés : un identifiant inconnu ferait échouer tout le lot (clé
+    # étrangère) ; FOR KEY SHARE empêche leur suppression jusqu'au commit
+    poste_ids = list({
+        actions[client_id].poste_id for client_id in a_appliquer if actions[client_id].poste_id is not None
+    })
+    postes = set()
+    if poste_ids:
+        result = await db.execute(
+            select(PosteElectrique.id_poste)
+            .where(PosteElectrique.id_poste == any_(bindparam("postes", poste_ids, type_=ARRAY(Integer))))
+            .with_for_update(read=True, key_share=True)
+        )
+        postes = set(result.scalars().all())
+    
+    # Application dans l'ordre chronologique du terrain
+    mois = await mois_attaches(db) if a_appliquer else None
+    delta = StockDelta()
+    historique = []
+    appliques = []
+    for client_id in a_appliquer:
+        action = actions[client_id]
+        concentrateur = concentrateurs.get(action.numero_serie)
+        ancien_stock = stock_key(concentrateur) if concentrateur is not None else None
+        try:
+            _verifier_date(_utc(action.date_client), mois)
+            if action.poste_id is not None and action.poste_id not in postes:
+                raise Rejet("erreur", "Poste inconnu")
+            ligne = _appliquer(concentrateur, action, _utc(action.date_client), current_user)
+        except Rejet as rejet:
+            resultats[client_id] = SyncResultat(
+                client_id=client_id,
+                statut=rejet.statut,
+                numero_serie=action.numero_serie,
+                type_action=action.type_action,
+                detail=rejet.detail,
+                etat_serveur=concentrateur.etat if concentrateur is not None else None,
+                date_dernier_etat=concentrateur.date_dernier_etat if concentrateur is not None else None
+            )
+            continue
+        delta.move(ancien_stock, stock_key(concentrateur))
+        historique.append(ligne)
+        appliques.append(client_id)
+    
+    if historique:
+        result = await db.execute(
+            insert(HistoriqueAction).returning(HistoriqueAction.id_action, sort_by_parameter_order=True),
+            historique
+        )
+        for client_id, id_action in zip(appliques, result.scalars().all()):
+            concentrateur = concentrateurs[actions[client_id].numero_serie]
+            resultats[client_id] = SyncResultat(
+                client_id=client_id,
+                statut="applique",
+                numero_serie=actions[client_id].numero_serie,
+                type_action=actions[client_id].type_action,
+                id_action=id_action,
+                etat_serveur=concentrateur.etat,
+                date_dernier_etat=concentrateur.date_dernier_etat
+            )
+        await apply_stock_delta(db, delta)
+        emit_event(db, DomainEvent(
+            type="sync.actions",
+            data={
+                "poses": sum(1 for ligne in historique if ligne["type_action"] == 'pose'),
+                "deposes": sum(1 for ligne in historique if ligne["type_action"] == 'depose'),
+                "numeros_serie": list(dict.fromkeys(ligne["concentrateur_id"] for ligne in historique)),
+            },
+            bos=list(dict.fromkeys(
+                ligne["ancienne_affectation"] for ligne in historique if ligne["ancienne_affectation"]
+            ))
+        ))
+    
+    # Enregistrer le résultat de chaque nouvel identifiant (UPDATE groupé par clé primaire)
+    if a_appliquer:
+        await db.execute(
+            update(SyncOperation),
+            [
+                {
+                    "client_id": client_id,
+                    "statut": resultats[client_id].statut,
+                    "detail": resultats[client_id].detail,
+                    "id_action": resultats[client_id].id_action,
+                }
+                for client_id in a_appliquer
+            ]
+        )
+    
+    await db.commit()
+    
+    reponse = [
+        resultats[str(action.client_id)].model_copy(update={"client_id": action.client_id})
+        for action in data.actions
+    ]
+    return {
+        "resultats": reponse,
+        "appliques": sum(1 for resultat in reponse if resultat.statut == "applique" and not resultat.rejoue),
+        "conflits": sum(1 for resultat in reponse if resultat.statut == "conflit"),
+        "erreurs": sum(1 for resultat in reponse if resultat.statut == "erreur"),
+    }
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import List, Optional, Union
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
@@ -8,10 +8,14 @@ from pydantic import BaseModel
 from app.core.database import get_db
 from app.api.deps import get_current_user
 from app.models.user import Utilisateur
+from app.schemas.user import CurrentUser
 from app.models.commande import CommandeBo
 from app.models.carton import Carton
 from app.models.concentrateur import Concentrateur
 from app.models.action import HistoriqueAction
+from app.core.events import DomainEvent, emit_event
+from app.services.notifications import PendingNotification, notify
+from app.services.stock_summary import StockDelta, stock_key, apply_stock_delta
 
 router = APIRouter()
 
@@ -44,19 +48,41 @@ class ValidationTransfertRequest(BaseModel):
     numero_carton: str
 
 
+def commande_to_response(commande: CommandeBo, user: Optional[Union[Utilisateur, CurrentUser]]) -> CommandeResponse:
+    """`user` : demandeur joint (Utilisateur) ou utilisateur courant à la création."""
+    return CommandeResponse(
+        id_commande=commande.id_commande,
+        bo_demandeur=commande.bo_demandeur,
+        quantite=commande.quantite,
+        operateur_souhaite=commande.operateur_souhaite,
+        statut_commande=commande.statut_commande,
+        user_id=commande.user_id,
+        date_commande=commande.date_commande,
+        date_validation=commande.date_validation,
+        date_livraison=commande.date_livraison,
+        demandeur_nom=user.nom if user else None,
+        demandeur_prenom=user.prenom if user else None
+    )
+
+
 # Endpoints
 @router.get("", response_model=List[CommandeResponse])
 async def get_commandes(
     statut: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Liste des commandes/demandes de transfert.
     - Admin/Magasin: toutes les commandes
     - Autres: uniquement les commandes de leur BO
     """
-    query = select(CommandeBo).order_by(CommandeBo.date_commande.desc())
+    # Jointure sur le demandeur pour éviter une requête par commande
+    query = (
+        select(CommandeBo, Utilisateur)
+        .outerjoin(Utilisateur, Utilisateur.id_utilisateur == CommandeBo.user_id)
+        .order_by(CommandeBo.date_commande.desc())
+    )
     
     # Filtrer par statut si spécifié
     if statut:
@@ -67,38 +93,15 @@ async def get_commandes(
         query = query.where(CommandeBo.bo_demandeur == current_user.base_affectee)
     
     result = await db.execute(query)
-    commandes = result.scalars().all()
     
-    # Enrichir avec les infos utilisateur
-    response = []
-    for commande in commandes:
-        user_result = await db.execute(
-            select(Utilisateur).where(Utilisateur.id_utilisateur == commande.user_id)
-        )
-        user = user_result.scalar_one_or_none()
-        
-        response.append(CommandeResponse(
-            id_commande=commande.id_commande,
-            bo_demandeur=commande.bo_demandeur,
-            quantite=commande.quantite,
-            operateur_souhaite=commande.operateur_souhaite,
-            statut_commande=commande.statut_commande,
-            user_id=commande.user_id,
-            date_commande=commande.date_commande,
-            date_validation=commande.date_validation,
-            date_livraison=commande.date_livraison,
-            demandeur_nom=user.nom if user else None,
-            demandeur_prenom=user.prenom if user else None
-        ))
-    
-    return response
+    return [commande_to_response(commande, user) for commande, user in result]
 
 
 @router.post("", response_model=CommandeResponse)
 async def create_commande(
     data: CommandeCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Créer une nouvelle commande/demande de transfert.
@@ -118,29 +121,34 @@ async def create_commande(
     )
     
     db.add(commande)
+    await db.flush()
+    emit_event(db, DomainEvent(
+        type="commande.nouvelle",
+        data={
+            "commande_id": commande.id_commande,
+            "bo_demandeur": commande.bo_demandeur,
+            "quantite": commande.quantite,
+            "operateur_souhaite": commande.operateur_souhaite,
+        },
+        bos=[commande.bo_demandeur],
+        roles=["magasin"]
+    ))
+    notify(db, PendingNotification(
+        message=f"Nouvelle demande de {commande.bo_demandeur} : {commande.quantite} concentrateur(s)",
+        type_notification="commande",
+        roles=["magasin"]
+    ))
     await db.commit()
     await db.refresh(commande)
     
-    return CommandeResponse(
-        id_commande=commande.id_commande,
-        bo_demandeur=commande.bo_demandeur,
-        quantite=commande.quantite,
-        operateur_souhaite=commande.operateur_souhaite,
-        statut_commande=commande.statut_commande,
-        user_id=commande.user_id,
-        date_commande=commande.date_commande,
-        date_validation=commande.date_validation,
-        date_livraison=commande.date_livraison,
-        demandeur_nom=current_user.nom,
-        demandeur_prenom=current_user.prenom
-    )
+    return commande_to_response(commande, current_user)
 
 
 @router.get("/cartons/disponibles")
 async def get_cartons_disponibles(
     operateur: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Liste des cartons disponibles pour transfert (avec concentrateurs en stock au Magasin).
@@ -187,22 +195,26 @@ async def get_cartons_disponibles(
 async def get_commande(
     id_commande: int,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Détail d'une commande.
     """
     result = await db.execute(
-        select(CommandeBo).where(CommandeBo.id_commande == id_commande)
+        select(CommandeBo, Utilisateur)
+        .outerjoin(Utilisateur, Utilisateur.id_utilisateur == CommandeBo.user_id)
+        .where(CommandeBo.id_commande == id_commande)
     )
-    commande = result.scalar_one_or_none()
+    row = result.first()
     
-    if not commande:
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Commande non trouvée"
         )
     
+    commande, user = row
+    
     # Vérifier accès
     if current_user.role not in ['admin', 'magasin']:
         if commande.bo_demandeur != current_user.base_affectee:
@@ -211,24 +223,7 @@ async def get_commande(
                 detail="Accès non autorisé à cette commande"
             )
     
-    user_result = await db.execute(
-        select(Utilisateur).where(Utilisateur.id_utilisateur == commande.user_id)
-    )
-    user = user_result.scalar_one_or_none()
-    
-    return CommandeResponse(
-        id_commande=commande.id_commande,
-        bo_demandeur=commande.bo_demandeur,
-        quantite=commande.quantite,
-        operateur_souhaite=commande.operateur_souhaite,
-        statut_commande=commande.statut_commande,
-        user_id=commande.user_id,
-        date_commande=commande.date_commande,
-        date_validation=commande.date_validation,
-        date_livraison=commande.date_livraison,
-        demandeur_nom=user.nom if user else None,
-        demandeur_prenom=user.prenom if user else None
-    )
+    return commande_to_response(commande, user)
 
 
 @router.post("/{id_commande}/valider")
@@ -236,7 +231,7 @@ async def valider_transfert(
     id_commande: int,
     data: ValidationTransfertRequest,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Valider un transfert en associant un carton.
@@ -253,7 +248,9 @@ async def valider_transfert(
     
     # Récupérer la commande
     result = await db.execute(
-        select(CommandeBo).where(CommandeBo.id_commande == id_commande)
+        select(CommandeBo)
+        .where(CommandeBo.id_commande == id_commande)
+        .with_for_update()
     )
     commande = result.scalar_one_or_none()
     
@@ -288,6 +285,7 @@ async def valider_transfert(
             Concentrateur.etat == "en_stock",
             Concentrateur.affectation == "Magasin"
         )
+        .with_for_update()
     )
     concentrateurs = result.scalars().all()
     
@@ -299,8 +297,10 @@ async def valider_transfert(
     
     # Transférer les concentrateurs vers la BO
     transferred = []
+    delta = StockDelta()
     for conc in concentrateurs:
         ancien_affectation = conc.affectation
+        ancien_stock = stock_key(conc)
         
         # Mettre à jour le concentrateur
         conc.affectation = commande.bo_demandeur
@@ -320,12 +320,31 @@ async def valider_transfert(
             commentaire=f"Transfert vers {commande.bo_demandeur} - Commande #{id_commande}"
         )
         db.add(action)
+        delta.move(ancien_stock, stock_key(conc))
         transferred.append(conc.numero_serie)
     
+    await apply_stock_delta(db, delta)
+    
     # Mettre à jour la commande
     commande.statut_commande = "validee"
     commande.date_validation = datetime.utcnow()
     
+    emit_event(db, DomainEvent(
+        type="transfert.valide",
+        data={
+            "commande_id": id_commande,
+            "carton": data.numero_carton,
+            "bo_destination": commande.bo_demandeur,
+            "concentrateurs_transferes": len(transferred),
+        },
+        bos=[commande.bo_demandeur],
+        roles=["magasin"]
+    ))
+    notify(db, PendingNotification(
+        message=f"Commande #{id_commande} validée : {len(transferred)} concentrateur(s) expédié(s) (carton {data.numero_carton})",
+        type_notification="transfert_valide",
+        bos=[commande.bo_demandeur]
+    ))
     await db.commit()
     
     return {
@@ -342,7 +361,7 @@ async def valider_transfert(
 async def annuler_commande(
     id_commande: int,
     db: AsyncSession = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Annuler une commande.
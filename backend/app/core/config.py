@@ -1,16 +1,89 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 
 
 class Settings(BaseSettings):
     # Database (connexion directe via URI)
     DATABASE_URL: str
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 30000
+    # Mode pooler transactionnel (pgbouncer / Supavisor port 6543) :
+    # désactive le cache de requêtes préparées d'asyncpg
+    DB_TRANSACTION_POOLER: bool = False
     
     # JWT
     SECRET_KEY: str = "your-secret-key-min-32-chars-change-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
+    # Cache de l'utilisateur authentifié (get_current_user)
+    USER_CACHE_TTL_SECONDS: int = 60
+    USER_CACHE_MAX_SIZE: int = 1024
+    
+    # Cache des réponses du routeur /stats (memory ou redis)
+    STATS_CACHE_BACKEND: str = "memory"
+    STATS_CACHE_TTL_SECONDS: int = 15
+    STATS_CACHE_MAX_SIZE: int = 256
+    # redis://host:6379/0, ou fakeredis:// pour un Redis simulé en local
+    REDIS_URL: Optional[str] = None
+    
+    # Flux SSE /events : memory (un worker) ou postgres (LISTEN/NOTIFY, plusieurs workers)
+    EVENTS_BACKEND: str = "memory"
+    EVENTS_QUEUE_SIZE: int = 100
+    EVENTS_HEARTBEAT_SECONDS: int = 15
+    
+    # Notifications : insertions regroupées par lot
+    NOTIFICATION_BATCH_SIZE: int = 200
+    NOTIFICATION_FLUSH_INTERVAL_MS: int = 500
+    # Lot non écrit (base indisponible) : remis en tête de file, nouvel essai
+    # avec délai croissant ; au-delà de NOTIFICATION_MAX_PENDING, les plus anciennes sont abandonnées
+    NOTIFICATION_MAX_PENDING: int = 10000
+    NOTIFICATION_RETRY_MAX_SECONDS: int = 30
+    
+    # Génération des rapports en tâche de fond
+    REPORTS_DIR: str = "storage/rapports"
+    REPORT_WORKERS: int = 2
+    REPORT_POLL_INTERVAL_SECONDS: int = 10
+    # Le worker signale toutes les REPORT_HEARTBEAT_SECONDS le rapport qu'il génère ;
+    # "en_cours" sans signal depuis REPORT_STALE_MINUTES : worker arrêté, remis en attente
+    REPORT_HEARTBEAT_SECONDS: int = 30
+    REPORT_STALE_MINUTES: int = 5
+    REPORT_STALE_CHECK_SECONDS: int = 60
+    # Au-delà, un rapport interrompu passe en erreur
+    REPORT_MAX_ATTEMPTS: int = 3
+    REPORT_PDF_MAX_ROWS: int = 5000
+    # Format du rapport généré après les tests labo (vide : pas de rapport) ;
+    # les tests successifs sont regroupés dans le rapport encore en attente
+    REPORT_TEST_LABO_FORMAT: str = "pdf"
+    
+    # Agrégat des statistiques labo (labo_stats_jour), rafraîchi en tâche de fond
+    LABO_STATS_REFRESH_SECONDS: int = 60
+    # Délai entre la lecture de la séquence id_action et celle de l'horizon
+    # des transactions (voir app.services.labo_stats.refresh_labo_stats)
+    LABO_STATS_SETTLE_MS: int = 500
+    
+    # Synchronisation hors ligne : actions plus anciennes refusées (horloge du terminal erronée)
+    SYNC_MAX_AGE_DAYS: int = 30
+    
+    # Partitions mensuelles de historique_action créées à l'avance
+    HISTORIQUE_PARTITIONS_AVANCE: int = 3
+    HISTORIQUE_PARTITIONS_INTERVAL_HOURS: int = 6
+    
+    # Archives Parquet de historique_action (scripts/archive_historique_action.py) :
+    # les mois antérieurs à l'horizon quittent la base
+    ARCHIVE_DIR: str = "storage/archives"
+    ARCHIVE_HORIZON_MONTHS: int = 12
+    ARCHIVE_COMPRESSION: str = "zstd"
+    
+    # Nombre de hachages bcrypt simultanés (pool de threads)
+    PASSWORD_HASH_WORKERS: int = 4
+    
     # CORS
     FRONTEND_URL: str = "http://localhost:5173"
     
@@ -1,13 +1,67 @@
+import time
+from uuid import uuid4
+
+from sqlalchemy import exc
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from app.core.config import settings
 
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Pool de connexions qui mesure le temps d'attente à chaque checkout.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            wait_ms = (time.perf_counter() - start) * 1000
+            self.checkouts += 1
+            self.wait_total_ms += wait_ms
+            self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+
+
+def _connect_args() -> dict:
+    if settings.DB_TRANSACTION_POOLER:
+        # Derrière pgbouncer en mode transaction, une requête préparée peut être
+        # exécutée sur une autre connexion serveur : pas de cache, noms uniques.
+        # Le statement_timeout doit alors être défini sur le rôle PostgreSQL.
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return {
+        "server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)},
+    }
+
+
 engine = create_async_engine(
     settings.DATABASE_URL,
-    echo=True,
-    future=True
+    echo=settings.DB_ECHO,
+    future=True,
+    poolclass=TimedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    connect_args=_connect_args(),
 )
 
 AsyncSessionLocal = sessionmaker(
@@ -23,3 +77,24 @@ async def get_db():
             yield session
         finally:
             await session.close()
+
+
+def pool_metrics() -> dict:
+    """
+    Occupation du pool de connexions et temps d'attente au checkout.
+    """
+    pool = engine.pool
+    capacity = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+    checked_out = pool.checkedout()
+    return {
+        "size": pool.size(),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "checked_out": checked_out,
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "saturation": round(checked_out / capacity, 3) if capacity else 0,
+        "checkouts": pool.checkouts,
+        "wait_avg_ms": round(pool.wait_total_ms / pool.checkouts, 3) if pool.checkouts else 0,
+        "wait_max_ms": round(pool.wait_max_ms, 3),
+        "timeouts": pool.timeouts,
+    }
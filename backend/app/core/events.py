@@ -0,0 +1,200 @@
+import asyncio
+import json
+import logging
+import uuid
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Optional, List, Set
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "domain_events"
+
+
+@dataclass
+class DomainEvent:
+    """
+    Événement métier poussé aux clients SSE.
+    Visible par les admins, par les rôles listés dans `roles`
+    et par les utilisateurs dont la base_affectee est dans `bos`.
+    Si `user_ids` est renseigné, seuls ces utilisateurs le reçoivent.
+    """
+    type: str
+    data: dict
+    bos: List[str] = field(default_factory=list)
+    roles: List[str] = field(default_factory=list)
+    user_ids: List[int] = field(default_factory=list)
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    date: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+    
+    def visible_par(self, user_id: int, role: str, base_affectee: Optional[str]) -> bool:
+        if self.user_ids:
+            return user_id in self.user_ids
+        if role == "admin":
+            return True
+        return role in self.roles or (base_affectee is not None and base_affectee in self.bos)
+    
+    def to_sse(self) -> str:
+        payload = json.dumps({**self.data, "date": self.date}, default=str)
+        return f"id: {self.id}\nevent: {self.type}\ndata: {payload}\n\n"
+
+
+class Subscription:
+    """File d'attente d'un client SSE connecté."""
+    
+    def __init__(self, user_id: int, role: str, base_affectee: Optional[str], max_size: int):
+        self.user_id = user_id
+        self.role = role
+        self.base_affectee = base_affectee
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self.dropped = 0
+
+
+class EventBroadcaster:
+    """
+    Diffusion des événements aux abonnés du processus.
+    En mode postgres, les événements transitent par LISTEN/NOTIFY
+    pour atteindre les abonnés de tous les workers.
+    """
+    
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self.subscriptions: Set[Subscription] = set()
+        self.published = 0
+        self._connection = None
+        self._lock = asyncio.Lock()
+    
+    # -- Abonnements --
+    
+    def subscribe(self, user_id: int, role: str, base_affectee: Optional[str]) -> Subscription:
+        subscription = Subscription(user_id, role, base_affectee, self.queue_size)
+        self.subscriptions.add(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.subscriptions.discard(subscription)
+    
+    def _fan_out(self, domain_event: DomainEvent) -> None:
+        for subscription in self.subscriptions:
+            if not domain_event.visible_par(
+                subscription.user_id, subscription.role, subscription.base_affectee
+            ):
+                continue
+            try:
+                subscription.queue.put_nowait(domain_event)
+            except asyncio.QueueFull:
+                # Client trop lent : l'événement est perdu pour lui seul
+                subscription.dropped += 1
+    
+    # -- Publication --
+    
+    async def publish(self, domain_event: DomainEvent) -> None:
+        self.published += 1
+        if self._connection is not None:
+            try:
+                async with self._lock:
+                    await self._connection.execute(
+                        "SELECT pg_notify($1, $2)", NOTIFY_CHANNEL, json.dumps(asdict(domain_event), default=str)
+                    )
+                return
+            except Exception:
+                logger.exception("NOTIFY impossible, diffusion aux abonnés locaux uniquement")
+        self._fan_out(domain_event)
+    
+    def publish_soon(self, domain_events: List[DomainEvent]) -> None:
+        """
+        Publication depuis un contexte synchrone (événements SQLAlchemy).
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        for domain_event in domain_events:
+            loop.create_task(self.publish(domain_event))
+    
+    # -- LISTEN/NOTIFY --
+    
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        try:
+            self._fan_out(DomainEvent(**json.loads(payload)))
+        except (ValueError, TypeError):
+            logger.warning("Événement NOTIFY illisible ignoré")
+    
+    async def start(self) -> None:
+        if settings.EVENTS_BACKEND != "postgres":
+            return
+        import asyncpg
+        dsn = settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://")
+        self._connection = await asyncpg.connect(dsn)
+        await self._connection.add_listener(NOTIFY_CHANNEL, self._on_notify)
+    
+    async def stop(self) -> None:
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            await connection.close()
+    
+    def stats(self) -> dict:
+        return {
+            "backend": "postgres" if self._connection is not None else "memory",
+            "subscribers": len(self.subscriptions),
+            "published": self.published,
+            "dropped": sum(subscription.dropped for subscription in self.subscriptions),
+        }
+
+
+broadcaster = EventBroadcaster(queue_size=settings.EVENTS_QUEUE_SIZE)
+
+
+def etat_change_event(action) -> DomainEvent:
+    """
+    Changement d'état ou d'affectation d'un concentrateur, construit depuis
+    son action historique ; visible par les BO de départ et d'arrivée
+    (et par le magasin s'il est concerné).
+    """
+    bos = list(dict.fromkeys(
+        affectation for affectation in (action.ancienne_affectation, action.nouvelle_affectation)
+        if affectation
+    ))
+    return DomainEvent(
+        type="concentrateur.etat",
+        data={
+            "numero_serie": action.concentrateur_id,
+            "type_action": action.type_action,
+            "ancien_etat": action.ancien_etat,
+            "nouvel_etat": action.nouvel_etat,
+            "ancienne_affectation": action.ancienne_affectation,
+            "nouvelle_affectation": action.nouvelle_affectation,
+        },
+        bos=bos,
+        roles=["magasin"] if "Magasin" in bos else [],
+    )
+
+
+# ============================================
+# PUBLICATION APRÈS COMMIT
+# ============================================
+
+def emit_event(db: AsyncSession, domain_event: DomainEvent) -> None:
+    """
+    Met un événement en attente sur la session : il n'est publié
+    qu'après le commit (jamais pour une transaction annulée).
+    """
+    db.sync_session.info.setdefault("domain_events", []).append(domain_event)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session):
+    domain_events = session.info.pop("domain_events", None)
+    if domain_events:
+        broadcaster.publish_soon(domain_events)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop("domain_events", None)
@@ -0,0 +1,230 @@
+import asyncio
+import functools
+import hashlib
+import json
+from typing import Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import Table, event
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+
+# ============================================
+# BACKENDS
+# ============================================
+
+class MemoryCacheBackend:
+    """
+    Stockage en mémoire du processus (un cache par worker uvicorn).
+    """
+    name = "memory"
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self._cache = TTLCache(max_size=max_size, ttl_seconds=ttl_seconds)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: bytes) -> None:
+        self._cache.set(key, value)
+
+    async def invalidate(self) -> None:
+        self._cache.clear()
+
+    def size(self) -> Optional[int]:
+        return len(self._cache)
+
+
+class RedisCacheBackend:
+    """
+    Stockage Redis partagé entre workers.
+    L'invalidation incrémente un numéro de génération inclus dans les clés :
+    les anciennes entrées ne sont plus lues et expirent avec leur TTL.
+    """
+    name = "redis"
+
+    def __init__(self, client, ttl_seconds: float, prefix: str):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    async def _generation(self) -> int:
+        return int(await self.client.get(f"{self.prefix}:generation") or 0)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(f"{self.prefix}:{await self._generation()}:{key}")
+
+    async def set(self, key: str, value: bytes) -> None:
+        await self.client.set(
+            f"{self.prefix}:{await self._generation()}:{key}",
+            value,
+            ex=max(1, int(self.ttl_seconds))
+        )
+
+    async def invalidate(self) -> None:
+        await self.client.incr(f"{self.prefix}:generation")
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+def create_redis_client(url: str):
+    """
+    Client Redis asynchrone (dépendances optionnelles) :
+    - redis://...     : paquet redis
+    - fakeredis://    : paquet fakeredis, Redis simulé en mémoire pour le développement
+    """
+    if url.startswith("fakeredis://"):
+        try:
+            from fakeredis import aioredis as fakeredis_aioredis
+        except ImportError:
+            raise RuntimeError("REDIS_URL=fakeredis:// nécessite le paquet fakeredis")
+        return fakeredis_aioredis.FakeRedis()
+    try:
+        from redis import asyncio as redis_asyncio
+    except ImportError:
+        raise RuntimeError("STATS_CACHE_BACKEND=redis nécessite le paquet redis")
+    return redis_asyncio.from_url(url)
+
+
+# ============================================
+# CACHE DE RÉPONSES
+# ============================================
+
+class ResponseCache:
+    """
+    Cache de réponses JSON avec ETag / Cache-Control.
+    Clé = chemin + paramètres de requête + périmètre BO de l'appelant.
+    """
+
+    def __init__(self, backend, ttl_seconds: float):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(request: Request, scope: Optional[str]) -> str:
+        params = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+        return f"{request.url.path}?{params}|{scope or '*'}"
+
+    @staticmethod
+    def etag_for(body: bytes) -> str:
+        return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+    async def invalidate(self) -> None:
+        self.invalidations += 1
+        await self.backend.invalidate()
+
+    def invalidate_soon(self) -> None:
+        """
+        Invalidation depuis un contexte synchrone (événements SQLAlchemy).
+        Hors boucle asyncio (scripts), il n'y a pas de cache de réponses à invalider.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        loop.create_task(self.invalidate())
+
+    def build_response(self, request: Request, body: bytes, cache_status: str) -> Response:
+        etag = self.etag_for(body)
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"private, max-age={int(self.ttl_seconds)}",
+            "Vary": "Authorization",
+            "X-Cache": cache_status,
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "ttl_seconds": self.ttl_seconds,
+            "size": self.backend.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else None,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+        }
+
+    def cached(self, scope_of):
+        """
+        Décorateur d'endpoint. L'endpoint doit déclarer `request: Request`
+        et `current_user` ; scope_of(current_user) donne le périmètre BO.
+        """
+        def decorator(endpoint):
+            @functools.wraps(endpoint)
+            async def wrapper(*args, **kwargs):
+                request = kwargs["request"]
+                key = self.make_key(request, scope_of(kwargs["current_user"]))
+                body = await self.backend.get(key)
+                if body is not None:
+                    self.hits += 1
+                    return self.build_response(request, body, "HIT")
+                self.misses += 1
+                content = await endpoint(*args, **kwargs)
+                body = json.dumps(jsonable_encoder(content), separators=(",", ":")).encode()
+                await self.backend.set(key, body)
+                return self.build_response(request, body, "MISS")
+            return wrapper
+        return decorator
+
+
+def create_response_cache(ttl_seconds: float, max_size: int, prefix: str) -> ResponseCache:
+    """
+    Cache configuré selon STATS_CACHE_BACKEND (memory ou redis).
+    """
+    if settings.STATS_CACHE_BACKEND == "redis":
+        client = create_redis_client(settings.REDIS_URL or "redis://localhost:6379/0")
+        backend = RedisCacheBackend(client, ttl_seconds=ttl_seconds, prefix=prefix)
+    else:
+        backend = MemoryCacheBackend(max_size=max_size, ttl_seconds=ttl_seconds)
+    return ResponseCache(backend, ttl_seconds=ttl_seconds)
+
+
+# ============================================
+# INVALIDATION SUR ÉCRITURE
+# ============================================
+
+def invalidate_on_write(cache: ResponseCache, table: Table) -> None:
+    """
+    Invalide le cache après chaque commit ayant écrit dans la table
+    (objets ORM ajoutés/modifiés ou INSERT/UPDATE/DELETE groupés).
+    """
+    flag = f"response_cache_dirty:{table.name}"
+
+    @event.listens_for(Session, "after_flush")
+    def _track_flush(session, flush_context):
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            if getattr(obj, "__table__", None) is table:
+                session.info[flag] = True
+                return
+
+    @event.listens_for(Session, "do_orm_execute")
+    def _track_execute(orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            target = getattr(orm_execute_state.statement, "table", None)
+            if target is not None and target.name == table.name:
+                orm_execute_state.session.info[flag] = True
+
+    @event.listens_for(Session, "after_commit")
+    def _invalidate(session):
+        if session.info.pop(flag, False):
+            cache.invalidate_soon()
+
+    @event.listens_for(Session, "after_rollback")
+    def _reset(session):
+        session.info.pop(flag, None)
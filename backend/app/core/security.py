@@ -1,5 +1,7 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Optional
 
 from jose import JWTError, jwt
 from passlib.context import CryptContext
@@ -17,6 +19,50 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+# bcrypt bloque ~200 ms par appel : exécuté dans un pool de threads borné
+# pour ne pas geler la boucle asyncio (connexions en masse en début de service)
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash"
+)
+_password_semaphore = asyncio.Semaphore(settings.PASSWORD_HASH_WORKERS)
+
+password_pool_stats = {
+    "workers": settings.PASSWORD_HASH_WORKERS,
+    "in_flight": 0,
+    "waiting": 0,
+    "max_waiting": 0,
+    "completed": 0,
+}
+
+
+async def _run_password_task(func: Callable, *args):
+    password_pool_stats["waiting"] += 1
+    password_pool_stats["max_waiting"] = max(
+        password_pool_stats["max_waiting"], password_pool_stats["waiting"]
+    )
+    try:
+        await _password_semaphore.acquire()
+    finally:
+        password_pool_stats["waiting"] -= 1
+    password_pool_stats["in_flight"] += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_password_executor, func, *args)
+    finally:
+        password_pool_stats["in_flight"] -= 1
+        password_pool_stats["completed"] += 1
+        _password_semaphore.release()
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_password_task(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_password_task(get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
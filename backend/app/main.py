@@ -1,15 +1,43 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.config import settings
+from app.core.events import broadcaster
+from app.services.notifications import dispatcher
+from app.services.rapports import report_runner
+from app.services.labo_stats import labo_stats_refresher
+from app.services.partitions import partition_maintainer
 from app.api.v1 import api_router
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Écoute LISTEN/NOTIFY des événements (si EVENTS_BACKEND=postgres)
+    await broadcaster.start()
+    # Écriture par lots des notifications
+    dispatcher.start()
+    # Génération des rapports en tâche de fond
+    await report_runner.start()
+    # Agrégat des statistiques labo
+    labo_stats_refresher.start()
+    # Partitions mensuelles de historique_action
+    partition_maintainer.start()
+    yield
+    await partition_maintainer.stop()
+    await labo_stats_refresher.stop()
+    await report_runner.stop()
+    await dispatcher.stop()
+    await broadcaster.stop()
+
+
 app = FastAPI(
     title="EDF Corse - Gestion Concentrateurs CPL",
     description="API de gestion des concentrateurs CPL pour EDF Corse",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Configuration CORS - Accepte toutes les IPs réseau local
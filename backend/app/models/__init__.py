@@ -6,6 +6,9 @@ from app.models.commande import CommandeBo
 from app.models.action import HistoriqueAction
 from app.models.notification import Notification
 from app.models.rapport import Rapport
+from app.models.stock_summary import StockSummary
+from app.models.labo_stats import LaboStatsJour, RollupWatermark
+from app.models.sync_operation import SyncOperation
 
 __all__ = [
     "Utilisateur",
@@ -15,5 +18,9 @@ __all__ = [
     "CommandeBo",
     "HistoriqueAction",
     "Notification",
-    "Rapport"
+    "Rapport",
+    "StockSummary",
+    "LaboStatsJour",
+    "RollupWatermark",
+    "SyncOperation"
 ]
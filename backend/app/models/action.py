@@ -6,11 +6,13 @@ from app.core.database import Base
 
 
 class HistoriqueAction(Base):
+    # Table partitionnée par mois sur date_action (scripts/partition_historique_action.py) :
+    # clé primaire (id_action, date_action) en base, id_action reste unique (séquence)
     __tablename__ = "historique_action"
 
     id_action = Column(Integer, primary_key=True, index=True)
     type_action = Column(String(100), nullable=False, index=True)
-    date_action = Column(DateTime, default=datetime.utcnow, index=True)
+    date_action = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
     ancien_etat = Column(String(50), nullable=True)
     nouvel_etat = Column(String(50), nullable=True)
     ancienne_affectation = Column(String(100), nullable=True)
@@ -0,0 +1,48 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, Float, Index
+
+from app.core.database import Base
+
+
+class LaboStatsJour(Base):
+    """
+    Agrégat quotidien des tests labo (test_labo / mise_au_rebut)
+    par modèle, opérateur, BO d'origine, résultat et cause.
+    Alimenté de façon incrémentale par app.services.labo_stats.
+    """
+    __tablename__ = "labo_stats_jour"
+    
+    id_stat = Column(Integer, primary_key=True)
+    jour = Column(Date, nullable=False)
+    modele = Column(String(100), nullable=True)
+    operateur = Column(String(50), nullable=True)
+    bo_origine = Column(String(100), nullable=True)
+    resultat = Column(String(20), nullable=False)  # 'reparable' ou 'hs'
+    cause = Column(String(100), nullable=True)
+    nb_tests = Column(Integer, nullable=False, default=0)
+    # Délai dépose -> test : somme (heures) et nombre de tests où la dépose est connue
+    attente_heures = Column(Float, nullable=False, default=0)
+    nb_attente = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index(
+            "ux_labo_stats_jour_groupe",
+            "jour", "modele", "operateur", "bo_origine", "resultat", "cause",
+            unique=True,
+            postgresql_nulls_not_distinct=True
+        ),
+    )
+
+
+class RollupWatermark(Base):
+    """
+    Dernière ligne de historique_action prise en compte par un agrégat.
+    """
+    __tablename__ = "rollup_watermark"
+    
+    nom = Column(String(50), primary_key=True)
+    dernier_id_action = Column(Integer, nullable=False, default=0)
+    date_maj = Column(DateTime, nullable=True)
+    # Prochaine borne : ids attribués jusqu'à id_candidat, agrégés une fois
+    # terminées toutes les transactions d'identifiant < xid_horizon
+    id_candidat = Column(Integer, nullable=True)
+    xid_horizon = Column(BigInteger, nullable=True)
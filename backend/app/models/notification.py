@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -19,3 +19,13 @@ class Notification(Base):
 
     # Relations
     utilisateur = relationship("Utilisateur", back_populates="notifications")
+
+    __table_args__ = (
+        # Badge "non lues" : index partiel, ne contient que les notifications non lues
+        Index("ix_notification_non_lues", "user_id", postgresql_where=text("lu = false")),
+        # Liste paginée par curseur (date_envoi DESC NULLS LAST, id DESC)
+        Index(
+            "ix_notification_user_keyset",
+            "user_id", text("date_envoi DESC NULLS LAST"), text("id_notification DESC")
+        ),
+    )
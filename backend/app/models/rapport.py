@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON, Index, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -18,5 +18,22 @@ class Rapport(Base):
     format = Column(String(20), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # File de génération (app.services.rapports) : en_attente -> en_cours -> termine / erreur
+    statut = Column(String(20), nullable=False, default="en_attente", server_default="termine")
+    parametres = Column(JSON, nullable=True)
+    erreur = Column(Text, nullable=True)
+    tentatives = Column(Integer, nullable=False, default=0, server_default="0")
+    date_debut = Column(DateTime, nullable=True)
+    # Dernier signal du worker qui génère le rapport (reprise des rapports interrompus)
+    date_heartbeat = Column(DateTime, nullable=True)
+    date_fin = Column(DateTime, nullable=True)
+    nb_lignes = Column(Integer, nullable=True)
+
     # Relations
     utilisateur = relationship("Utilisateur", back_populates="rapports")
+
+    __table_args__ = (
+        # Prise de travail par les workers : seules les lignes en attente sont indexées
+        Index("ix_rapport_en_attente", "id_rapport", postgresql_where=text("statut = 'en_attente'")),
+        Index("ix_rapport_user", "user_id", text("id_rapport DESC")),
+    )
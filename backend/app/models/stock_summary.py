@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, Boolean, Index
+
+from app.core.database import Base
+
+
+class StockSummary(Base):
+    """
+    Nombre de concentrateurs par (affectation, operateur, etat, hs).
+    Maintenu dans la même transaction que chaque changement d'état
+    (app.services.stock_summary), lu par les endpoints de statistiques.
+    """
+    __tablename__ = "stock_summary"
+    
+    id_summary = Column(Integer, primary_key=True)
+    affectation = Column(String(100), nullable=True)
+    operateur = Column(String(50), nullable=True)
+    etat = Column(String(50), nullable=True)
+    hs = Column(Boolean, nullable=True)
+    count = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index(
+            "ux_stock_summary_groupe",
+            "affectation", "operateur", "etat", "hs",
+            unique=True,
+            postgresql_nulls_not_distinct=True
+        ),
+    )
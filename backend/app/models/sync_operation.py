@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
+from datetime import datetime
+
+from app.core.database import Base
+
+
+class SyncOperation(Base):
+    """
+    Action envoyée hors ligne par la PWA (POST /sync/actions), identifiée par
+    l'UUID généré côté client. Conserve le résultat : un renvoi du même
+    identifiant retourne ce résultat sans réappliquer l'action.
+    """
+    __tablename__ = "sync_operation"
+    
+    client_id = Column(String(36), primary_key=True)
+    user_id = Column(Integer, ForeignKey("utilisateur.id_utilisateur"), nullable=False)
+    type_action = Column(String(100), nullable=False)
+    concentrateur_id = Column(String(50), nullable=True)
+    date_client = Column(DateTime, nullable=False)
+    date_reception = Column(DateTime, default=datetime.utcnow, index=True)
+    statut = Column(String(20), nullable=False, default="en_cours")  # en_cours, applique, conflit, erreur
+    detail = Column(Text, nullable=True)
+    id_action = Column(Integer, nullable=True)
@@ -1,4 +1,4 @@
-from app.schemas.user import UserBase, UserCreate, UserResponse, UserLogin
+from app.schemas.user import UserBase, UserCreate, UserResponse, UserLogin, CurrentUser
 from app.schemas.token import Token, TokenData
 from app.schemas.concentrateur import ConcentrateurBase, ConcentrateurResponse, ConcentrateurCreate, ConcentrateurUpdate
 from app.schemas.poste import PosteElectriqueBase, PosteElectriqueResponse
@@ -6,7 +6,7 @@ from app.schemas.carton import CartonBase, CartonResponse
 from app.schemas.action import HistoriqueActionBase, HistoriqueActionCreate, HistoriqueActionResponse
 
 __all__ = [
-    "UserBase", "UserCreate", "UserResponse", "UserLogin",
+    "UserBase", "UserCreate", "UserResponse", "UserLogin", "CurrentUser",
     "Token", "TokenData",
     "ConcentrateurBase", "ConcentrateurResponse", "ConcentrateurCreate", "ConcentrateurUpdate",
     "PosteElectriqueBase", "PosteElectriqueResponse",
@@ -62,10 +62,11 @@ class HistoriqueActionResponse(BaseModel):
 
 class ConcentrateurListResponse(BaseModel):
     data: List[ConcentrateurResponse]
-    total: int
-    page: int
+    total: Optional[int] = None
+    page: Optional[int] = None
     limit: int
-    total_pages: int
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None
 
 
 class ConcentrateurDetailResponse(BaseModel):
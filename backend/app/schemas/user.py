@@ -34,3 +34,24 @@ class UserResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class CurrentUser(BaseModel):
+    """
+    Utilisateur authentifié, détaché de la session SQLAlchemy.
+    Mis en cache par get_current_user pour éviter un SELECT par requête.
+    """
+    id_utilisateur: int
+    email: str
+    nom: str
+    prenom: str
+    role: str
+    base_affectee: Optional[str] = None
+    telephone: Optional[str] = None
+    # NULL en base : compte considéré comme inactif (not actif)
+    actif: Optional[bool] = True
+    date_inscription: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+        frozen = True
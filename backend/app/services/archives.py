@@ -0,0 +1,309 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, delete, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.action import HistoriqueAction
+from app.services.partitions import debut_mois, mois_suivant
+
+logger = logging.getLogger(__name__)
+
+# Archives froides de historique_action :
+#   ARCHIVE_DIR/historique_action/mois=AAAA-MM/<horodatage>_<n>.parquet
+#   ARCHIVE_DIR/historique_action/index.json  (min/max des numéros de série par fichier)
+TABLE = HistoriqueAction.__table__
+COLONNES = tuple(column.name for column in TABLE.columns)
+SERIAL = COLONNES.index("concentrateur_id")
+
+# Lignes par row group : chaque fichier est trié par concentrateur_id, les
+# statistiques min/max des row groups limitent la lecture aux lignes utiles
+ARCHIVE_BATCH_SIZE = 10000
+
+# Lignes par fichier (au numéro de série suivant) : chaque fichier couvre un
+# intervalle étroit de numéros de série, une recherche n'en ouvre qu'un ou deux
+ARCHIVE_FILE_ROWS = 100000
+
+INDEX = "index.json"
+
+
+def archive_dir() -> str:
+    return os.path.join(settings.ARCHIVE_DIR, TABLE.name)
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("L'archivage Parquet de l'historique nécessite le paquet pyarrow")
+    return pyarrow, pyarrow.parquet
+
+
+def limite_archivage(horizon_mois: int) -> date:
+    """Premier jour du plus ancien mois conservé en base (horizon_mois >= 1, mois en cours inclus)."""
+    mois = debut_mois(datetime.utcnow().date())
+    for _ in range(horizon_mois - 1):
+        mois = (mois - timedelta(days=1)).replace(day=1)
+    return mois
+
+
+# ============================================
+# INDEX DES FICHIERS
+# ============================================
+
+_index_cache: Tuple[Optional[float], List[dict]] = (None, [])
+
+
+def lire_index() -> List[dict]:
+    """Entrées de l'index (relu seulement si le fichier a changé)."""
+    global _index_cache
+    path = os.path.join(archive_dir(), INDEX)
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return []
+    if _index_cache[0] != mtime:
+        with open(path, encoding="utf-8") as f:
+            _index_cache = (mtime, json.load(f)["fichiers"])
+    return _index_cache[1]
+
+
+def _ecrire_index(fichiers: List[dict]) -> None:
+    """Écriture atomique (fichier temporaire puis renommage)."""
+    path = os.path.join(archive_dir(), INDEX)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"fichiers": sorted(fichiers, key=lambda entree: entree["fichier"])}, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def fichiers_pour_serial(numero_serie: str) -> List[dict]:
+    return [
+        entree for entree in lire_index()
+        if entree["serial_min"] is not None
+        and entree["serial_min"] <= numero_serie <= entree["serial_max"]
+    ]
+
+
+def reconstruire_index() -> List[dict]:
+    """Recalcule l'index depuis les fichiers présents (statistiques Parquet)."""
+    _, pq = _pyarrow()
+    racine = archive_dir()
+    fichiers = []
+    for dossier, _, noms in os.walk(racine):
+        for nom in noms:
+            if not nom.endswith(".parquet"):
+                continue
+            path = os.path.join(dossier, nom)
+            table = pq.read_table(path, columns=["id_action", "date_action", "concentrateur_id"])
+            if table.num_rows == 0:
+                continue
+            serials = [serial for serial in table.column("concentrateur_id").to_pylist() if serial is not None]
+            ids = table.column("id_action").to_pylist()
+            dates = table.column("date_action").to_pylist()
+            fichiers.append(_entree(os.path.relpath(path, racine), table.num_rows, serials, ids, dates, path))
+    _ecrire_index(fichiers)
+    return fichiers
+
+
+def _entree(fichier: str, lignes: int, serials: list, ids: list, dates: list, path: str) -> dict:
+    return {
+        "fichier": fichier,
+        "mois": min(dates).strftime("%Y-%m"),
+        "lignes": lignes,
+        "serial_min": min(serials) if serials else None,
+        "serial_max": max(serials) if serials else None,
+        "id_min": min(ids),
+        "id_max": max(ids),
+        "date_min": min(dates).isoformat(),
+        "date_max": max(dates).isoformat(),
+        "taille_octets": os.path.getsize(path),
+    }
+
+
+# ============================================
+# ÉCRITURE
+# ============================================
+
+class ParquetArchiveWriter:
+    """
+    Fichier Parquet compressé (ARCHIVE_COMPRESSION) écrit par row groups dans
+    un fichier temporaire, renommé à la fermeture. Méthodes bloquantes.
+    """
+    
+    def __init__(self, path: str):
+        pa, pq = _pyarrow()
+        types = {"id_action": pa.int64(), "user_id": pa.int64(), "poste_id": pa.int64(),
+                 "scan_qr": pa.bool_(), "date_action": pa.timestamp("us"), "created_at": pa.timestamp("us")}
+        self._pa = pa
+        self._schema = pa.schema([(name, types.get(name, pa.string())) for name in COLONNES])
+        self.path = path
+        self._writer = pq.ParquetWriter(path + ".tmp", self._schema, compression=settings.ARCHIVE_COMPRESSION)
+        self.lignes = 0
+        self.dernier_serial = None
+        self._serials: list = []
+        self._ids: list = []
+        self._dates: list = []
+    
+    def write(self, rows: List[tuple]) -> None:
+        colonnes = list(zip(*rows))
+        self._writer.write_table(self._pa.Table.from_arrays(
+            [self._pa.array(valeurs, type=field.type) for valeurs, field in zip(colonnes, self._schema)],
+            schema=self._schema
+        ))
+        self.lignes += len(rows)
+        self.dernier_serial = rows[-1][SERIAL]
+        serials = [serial for serial in colonnes[SERIAL] if serial is not None]
+        ids = colonnes[COLONNES.index("id_action")]
+        dates = colonnes[COLONNES.index("date_action")]
+        self._serials += [min(serials), max(serials)] if serials else []
+        self._ids += [min(ids), max(ids)]
+        self._dates += [min(dates), max(dates)]
+    
+    def close(self) -> dict:
+        """Finalise le fichier et retourne son entrée d'index."""
+        self._writer.close()
+        os.replace(self.path + ".tmp", self.path)
+        return _entree(
+            os.path.relpath(self.path, archive_dir()),
+            self.lignes, self._serials, self._ids, self._dates, self.path
+        )
+    
+    def abort(self) -> None:
+        self._writer.close()
+        os.remove(self.path + ".tmp")
+
+
+async def plus_ancien_mois(db: AsyncSession, limite: date) -> Optional[date]:
+    """Mois de la plus ancienne action antérieure à limite (index sur date_action)."""
+    result = await db.execute(
+        select(func.min(HistoriqueAction.date_action)).where(HistoriqueAction.date_action < limite)
+    )
+    plus_ancienne = result.scalar()
+    return debut_mois(plus_ancienne.date()) if plus_ancienne else None
+
+
+def _coupure(rows: List[tuple], debut: int, precedent: Optional[str]) -> Optional[int]:
+    """Index du premier changement de numéro de série à partir de `debut` (None si aucun)."""
+    for i in range(max(debut, 0), len(rows)):
+        if rows[i][SERIAL] != (rows[i - 1][SERIAL] if i else precedent):
+            return i
+    return None
+
+
+async def archiver_mois(db: AsyncSession, mois: date, partition: Optional[str] = None) -> List[dict]:
+    """
+    Déplace les actions d'un mois vers des fichiers Parquet d'environ
+    ARCHIVE_FILE_ROWS lignes, découpés entre deux numéros de série.
+    `db` doit être une session neuve (aucune requête avant l'appel) : les lignes
+    supprimées sont exactement celles écrites dans les fichiers.
+    - table partitionnée (`partition` = partition du mois) : écritures sur ce mois
+      bloquées pendant l'export, puis TRUNCATE de la partition
+    - sinon : lecture et DELETE dans le même instantané (REPEATABLE READ)
+    Les fichiers sont supprimés si la transaction échoue ; l'index est mis à jour
+    après le commit (reconstruire_index() si le processus s'arrête entre les deux).
+    Retourne les entrées d'index (liste vide si le mois est vide).
+    """
+    await db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    if partition:
+        # Avant toute lecture : l'instantané est pris après le verrou
+        await db.execute(text(f"LOCK TABLE {partition} IN SHARE MODE"))
+    
+    periode = (HistoriqueAction.date_action >= mois, HistoriqueAction.date_action < mois_suivant(mois))
+    dossier = os.path.join(archive_dir(), f"mois={mois:%Y-%m}")
+    os.makedirs(dossier, exist_ok=True)
+    horodatage = f"{datetime.utcnow():%Y%m%d_%H%M%S}"
+    
+    entrees: List[dict] = []
+    writer = None
+    try:
+        result = await db.stream(
+            select(TABLE).where(*periode)
+            .order_by(HistoriqueAction.concentrateur_id, HistoriqueAction.date_action, HistoriqueAction.id_action)
+            .execution_options(yield_per=ARCHIVE_BATCH_SIZE)
+        )
+        async for lot in result.partitions(ARCHIVE_BATCH_SIZE):
+            rows = [tuple(row) for row in lot]
+            while rows:
+                if writer is None:
+                    path = os.path.join(dossier, f"{horodatage}_{len(entrees) + 1:03d}.parquet")
+                    writer = await asyncio.to_thread(ParquetArchiveWriter, path)
+                coupure = _coupure(rows, ARCHIVE_FILE_ROWS - writer.lignes, writer.dernier_serial)
+                if coupure is None:
+                    await asyncio.to_thread(writer.write, rows)
+                    break
+                if coupure:
+                    await asyncio.to_thread(writer.write, rows[:coupure])
+                entrees.append(await asyncio.to_thread(writer.close))
+                writer = None
+                rows = rows[coupure:]
+        if writer is not None:
+            entrees.append(await asyncio.to_thread(writer.close))
+            writer = None
+        
+        if not entrees:
+            await db.rollback()
+            return []
+        
+        if partition:
+            await db.execute(text(f"TRUNCATE {partition}"))
+        else:
+            await db.execute(delete(HistoriqueAction).where(*periode))
+        await db.commit()
+    except BaseException:
+        if writer is not None:
+            await asyncio.to_thread(writer.abort)
+        for entree in entrees:
+            os.remove(os.path.join(archive_dir(), entree["fichier"]))
+        raise
+    
+    await asyncio.to_thread(_ecrire_index, lire_index() + entrees)
+    logger.info(
+        "Archive %s : %d actions en %d fichier(s)",
+        f"{mois:%Y-%m}", sum(entree["lignes"] for entree in entrees), len(entrees)
+    )
+    return entrees
+
+
+# ============================================
+# LECTURE
+# ============================================
+
+def _lire_archives(fichiers: List[dict], numero_serie: str) -> List[dict]:
+    _, pq = _pyarrow()
+    actions = []
+    for entree in fichiers:
+        table = pq.read_table(
+            os.path.join(archive_dir(), entree["fichier"]),
+            filters=[("concentrateur_id", "=", numero_serie)]
+        )
+        actions += table.to_pylist()
+    return actions
+
+
+async def actions_archivees(
+    numero_serie: str,
+    user_id: Optional[int] = None,
+    type_action: Optional[str] = None
+) -> List[dict]:
+    """
+    Actions archivées d'un concentrateur (mêmes filtres que GET /actions),
+    triées par date puis identifiant décroissants. Seuls les fichiers dont
+    l'intervalle de numéros de série contient `numero_serie` sont ouverts.
+    """
+    fichiers = fichiers_pour_serial(numero_serie)
+    if not fichiers:
+        return []
+    actions = await asyncio.to_thread(_lire_archives, fichiers, numero_serie)
+    uniques = {}
+    for action in actions:
+        if (user_id and action["user_id"] != user_id) or (type_action and action["type_action"] != type_action):
+            continue
+        action["archive"] = True
+        uniques[action["id_action"]] = action
+    return sorted(uniques.values(), key=lambda action: (action["date_action"], action["id_action"]), reverse=True)
@@ -0,0 +1,317 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import select, update, delete, func, case, cast, true, text, literal_column, Date
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.action import HistoriqueAction
+from app.models.concentrateur import Concentrateur
+from app.models.labo_stats import LaboStatsJour, RollupWatermark
+
+logger = logging.getLogger(__name__)
+
+WATERMARK = "labo_stats_jour"
+
+GROUP_COLUMNS = ("jour", "modele", "operateur", "bo_origine", "resultat", "cause")
+
+
+# ============================================
+# ALIMENTATION INCRÉMENTALE
+# ============================================
+
+def select_tests(id_debut: int, id_fin: int):
+    """
+    Tests labo d'identifiant dans ]id_debut, id_fin], agrégés comme labo_stats_jour.
+    La BO d'origine et le délai viennent de la dernière dépose précédant le test.
+    """
+    depose = aliased(HistoriqueAction)
+    derniere_depose = (
+        select(depose.ancienne_affectation, depose.date_action)
+        .where(
+            depose.concentrateur_id == HistoriqueAction.concentrateur_id,
+            depose.type_action == literal_column("'depose'"),
+            depose.date_action <= HistoriqueAction.date_action
+        )
+        .order_by(depose.date_action.desc())
+        .limit(1)
+        .lateral("derniere_depose")
+    )
+    # Cause : commentaire saisi par le technicien, sans le préfixe "Test Labo: XX."
+    cause = func.nullif(func.left(func.lower(func.btrim(func.regexp_replace(
+        HistoriqueAction.commentaire, literal_column(r"'^Test Labo: \w+\.\s*'"), literal_column("''")
+    ))), 100), literal_column("''"))
+    
+    tests = (
+        select(
+            cast(HistoriqueAction.date_action, Date).label("jour"),
+            Concentrateur.modele,
+            Concentrateur.operateur,
+            derniere_depose.c.ancienne_affectation.label("bo_origine"),
+            case(
+                (HistoriqueAction.type_action == literal_column("'mise_au_rebut'"), literal_column("'hs'")),
+                else_=literal_column("'reparable'")
+            ).label("resultat"),
+            cause.label("cause"),
+            (func.extract("epoch", HistoriqueAction.date_action - derniere_depose.c.date_action) / 3600)
+            .label("attente_heures"),
+        )
+        .select_from(HistoriqueAction)
+        .join(Concentrateur, Concentrateur.numero_serie == HistoriqueAction.concentrateur_id)
+        .outerjoin(derniere_depose, true())
+        .where(
+            HistoriqueAction.id_action > id_debut,
+            HistoriqueAction.id_action <= id_fin,
+            HistoriqueAction.type_action.in_([
+                literal_column("'test_labo'"), literal_column("'mise_au_rebut'")
+            ])
+        )
+        .subquery()
+    )
+    groupe = [tests.c[column] for column in GROUP_COLUMNS]
+    return select(
+        *groupe,
+        func.count().label("nb_tests"),
+        func.coalesce(func.sum(tests.c.attente_heures), 0).label("attente_heures"),
+        func.count(tests.c.attente_heures).label("nb_attente"),
+    ).group_by(*groupe)
+
+
+async def _borne_sure(db: AsyncSession) -> Tuple[int, int]:
+    """
+    (dernier id_action attribué, horizon) : horizon = xmax de l'instantané lu
+    LABO_STATS_SETTLE_MS après la séquence. nextval précède de peu l'attribution
+    de l'identifiant de transaction : toute transaction ayant obtenu un id_action
+    <= la borne a alors un identifiant de transaction < horizon.
+    """
+    result = await db.execute(text(
+        "SELECT pg_sequence_last_value(pg_get_serial_sequence(:table, 'id_action'))"
+    ), {"table": HistoriqueAction.__tablename__})
+    id_attribue = result.scalar() or 0
+    await asyncio.sleep(settings.LABO_STATS_SETTLE_MS / 1000)
+    result = await db.execute(text("SELECT pg_snapshot_xmax(pg_current_snapshot())::text::bigint"))
+    return id_attribue, result.scalar()
+
+
+async def _horizon_termine(db: AsyncSession, horizon: int) -> bool:
+    """Vrai si aucune autre transaction d'identifiant < horizon n'est en cours."""
+    result = await db.execute(text("""
+        SELECT NOT EXISTS (
+            SELECT 1 FROM pg_snapshot_xip(pg_current_snapshot()) AS x(xid)
+            WHERE x.xid::text::bigint < :horizon
+              AND x.xid IS DISTINCT FROM pg_current_xact_id_if_assigned()
+        )
+    """), {"horizon": horizon})
+    return result.scalar()
+
+
+async def _agreger(db: AsyncSession, id_debut: int, id_fin: int) -> int:
+    stmt = pg_insert(LaboStatsJour).from_select(
+        [*GROUP_COLUMNS, "nb_tests", "attente_heures", "nb_attente"],
+        select_tests(id_debut, id_fin)
+    )
+    result = await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[getattr(LaboStatsJour, column) for column in GROUP_COLUMNS],
+            set_={
+                "nb_tests": LaboStatsJour.nb_tests + stmt.excluded.nb_tests,
+                "attente_heures": LaboStatsJour.attente_heures + stmt.excluded.attente_heures,
+                "nb_attente": LaboStatsJour.nb_attente + stmt.excluded.nb_attente,
+            }
+        )
+    )
+    return result.rowcount
+
+
+async def refresh_labo_stats(db: AsyncSession) -> Optional[int]:
+    """
+    Ajoute à labo_stats_jour les tests enregistrés depuis le dernier passage
+    (watermark sur historique_action.id_action). Ne commit pas.
+    Les identifiants sont attribués avant le commit, dans le désordre, et
+    date_action peut être une date client ancienne : le watermark n'avance
+    jusqu'à une borne (id_candidat) qu'une fois terminées toutes les
+    transactions qui ont pu obtenir un identifiant <= borne (xid_horizon).
+    Une borne non encore sûre est conservée pour le passage suivant.
+    Retourne le nombre de groupes mis à jour, None si un autre
+    rafraîchissement est en cours.
+    """
+    await db.execute(
+        pg_insert(RollupWatermark)
+        .values(nom=WATERMARK, dernier_id_action=0)
+        .on_conflict_do_nothing()
+    )
+    result = await db.execute(
+        select(RollupWatermark)
+        .where(RollupWatermark.nom == WATERMARK)
+        .with_for_update(skip_locked=True)
+    )
+    watermark = result.scalar_one_or_none()
+    if watermark is None:
+        return None
+    
+    groupes = 0
+    # Borne du passage précédent
+    if watermark.id_candidat is not None and await _horizon_termine(db, watermark.xid_horizon):
+        if watermark.id_candidat > watermark.dernier_id_action:
+            groupes += await _agreger(db, watermark.dernier_id_action, watermark.id_candidat)
+            watermark.dernier_id_action = watermark.id_candidat
+        watermark.id_candidat = watermark.xid_horizon = None
+    
+    # Nouvelle borne : agrégée tout de suite si déjà sûre, sinon au passage suivant
+    if watermark.id_candidat is None:
+        id_attribue, horizon = await _borne_sure(db)
+        if id_attribue > watermark.dernier_id_action:
+            if await _horizon_termine(db, horizon):
+                groupes += await _agreger(db, watermark.dernier_id_action, id_attribue)
+                watermark.dernier_id_action = id_attribue
+            else:
+                watermark.id_candidat = id_attribue
+                watermark.xid_horizon = horizon
+    
+    watermark.date_maj = datetime.utcnow()
+    await db.flush()
+    return groupes
+
+
+async def rebuild_labo_stats(db: AsyncSession) -> Optional[int]:
+    """
+    Reconstruit labo_stats_jour depuis tout l'historique. Ne commit pas.
+    """
+    await db.execute(
+        pg_insert(RollupWatermark)
+        .values(nom=WATERMARK, dernier_id_action=0)
+        .on_conflict_do_nothing()
+    )
+    # Attend la fin d'un éventuel rafraîchissement concurrent
+    await db.execute(
+        select(RollupWatermark.nom).where(RollupWatermark.nom == WATERMARK).with_for_update()
+    )
+    await db.execute(delete(LaboStatsJour))
+    await db.execute(
+        update(RollupWatermark)
+        .where(RollupWatermark.nom == WATERMARK)
+        .values(dernier_id_action=0)
+    )
+    return await refresh_labo_stats(db)
+
+
+class LaboStatsRefresher:
+    """
+    Rafraîchit labo_stats_jour toutes les `interval` secondes.
+    Plusieurs processus peuvent tourner : le verrou sur la ligne de watermark
+    (SKIP LOCKED) laisse un seul rafraîchissement s'exécuter à la fois.
+    """
+    
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.passages = 0
+        self.erreurs = 0
+        self.derniere_duree_ms: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    async def refresh(self) -> Optional[int]:
+        start = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            groupes = await refresh_labo_stats(db)
+            await db.commit()
+        self.passages += 1
+        self.derniere_duree_ms = round((time.perf_counter() - start) * 1000, 1)
+        return groupes
+    
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                self.erreurs += 1
+                logger.exception("Rafraîchissement de labo_stats_jour impossible")
+            await asyncio.sleep(self.interval)
+    
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    def stats(self) -> dict:
+        return {
+            "interval_seconds": self.interval,
+            "passages": self.passages,
+            "erreurs": self.erreurs,
+            "derniere_duree_ms": self.derniere_duree_ms,
+        }
+
+
+labo_stats_refresher = LaboStatsRefresher(interval=settings.LABO_STATS_REFRESH_SECONDS)
+
+
+# ============================================
+# LECTURE
+# ============================================
+
+def _indicateurs():
+    reparables = func.coalesce(func.sum(case(
+        (LaboStatsJour.resultat == literal_column("'reparable'"), LaboStatsJour.nb_tests), else_=0
+    )), 0)
+    return (
+        func.coalesce(func.sum(LaboStatsJour.nb_tests), 0).label("tests"),
+        reparables.label("reparables"),
+        func.sum(LaboStatsJour.attente_heures).label("attente_heures"),
+        func.sum(LaboStatsJour.nb_attente).label("nb_attente"),
+    )
+
+
+def _format(row) -> dict:
+    tests = int(row.tests or 0)
+    reparables = int(row.reparables or 0)
+    return {
+        "tests": tests,
+        "reparables": reparables,
+        "hs": tests - reparables,
+        "taux_reparation": round(reparables * 100 / tests, 1) if tests else None,
+        "attente_moyenne_heures": (
+            round(row.attente_heures / row.nb_attente, 1) if row.nb_attente else None
+        ),
+    }
+
+
+async def labo_totaux(db: AsyncSession, *conditions) -> dict:
+    result = await db.execute(select(*_indicateurs()).where(*conditions))
+    return _format(result.one())
+
+
+async def labo_stats_par(db: AsyncSession, column, *conditions, limit: Optional[int] = None) -> list:
+    """
+    Indicateurs groupés par une colonne de labo_stats_jour
+    (lit uniquement l'agrégat, jamais historique_action).
+    """
+    query = (
+        select(column, *_indicateurs())
+        .where(*conditions)
+        .group_by(column)
+        .order_by(func.sum(LaboStatsJour.nb_tests).desc() if limit else column)
+    )
+    if limit:
+        query = query.limit(limit)
+    result = await db.execute(query)
+    return [{column.key: row[0], **_format(row)} for row in result]
+
+
+async def labo_stats_watermark(db: AsyncSession) -> Optional[datetime]:
+    result = await db.execute(
+        select(RollupWatermark.date_maj).where(RollupWatermark.nom == WATERMARK)
+    )
+    return result.scalar_one_or_none()
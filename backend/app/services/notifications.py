@@ -0,0 +1,219 @@
+import asyncio
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import select, insert, event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.events import DomainEvent, broadcaster
+from app.models.notification import Notification
+from app.models.user import Utilisateur
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingNotification:
+    """
+    Notification en attente d'écriture. Destinataires : utilisateurs actifs
+    dont le rôle est dans `roles`, dont la base_affectee est dans `bos`,
+    ou listés dans `user_ids`.
+    """
+    message: str
+    type_notification: Optional[str] = None
+    priorite: str = "normale"
+    roles: List[str] = field(default_factory=list)
+    bos: List[str] = field(default_factory=list)
+    user_ids: List[int] = field(default_factory=list)
+    date_envoi: datetime = field(default_factory=datetime.utcnow)
+    
+    def destinataires(self, users: list) -> List[int]:
+        return [
+            user.id_utilisateur for user in users
+            if user.id_utilisateur in self.user_ids
+            or user.role in self.roles
+            or (user.base_affectee is not None and user.base_affectee in self.bos)
+        ]
+
+
+class NotificationDispatcher:
+    """
+    Tampon des notifications : les insertions sont regroupées et écrites
+    par lot (un seul INSERT multi-lignes) toutes les flush_interval secondes
+    ou dès que batch_size notifications sont en attente.
+    Un lot non écrit est remis en tête de file (au plus max_pending
+    notifications) et réessayé avec un délai croissant jusqu'à retry_max secondes.
+    """
+    
+    def __init__(self, batch_size: int, flush_interval: float, max_pending: int, retry_max: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.retry_max = retry_max
+        self.pending: List[PendingNotification] = []
+        self.flushed = 0
+        self.batches = 0
+        self.errors = 0
+        self.dropped = 0
+        self._failures = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+    
+    def enqueue(self, notifications: List[PendingNotification]) -> None:
+        self.pending.extend(notifications)
+        self._trim()
+        if len(self.pending) >= self.batch_size:
+            self._wakeup.set()
+    
+    def _trim(self) -> None:
+        excedent = len(self.pending) - self.max_pending
+        if excedent > 0:
+            self.pending = self.pending[excedent:]
+            self.dropped += excedent
+            logger.error("File de notifications pleine : %d notification(s) abandonnée(s)", excedent)
+    
+    def _requeue(self, batch: List[PendingNotification]) -> None:
+        self.pending = batch + self.pending
+        self._trim()
+    
+    async def flush(self) -> int:
+        """
+        Écrit les notifications en attente. Retourne le nombre de lignes insérées.
+        En cas d'échec (ou d'annulation avant le commit), le lot est remis en file.
+        """
+        if not self.pending:
+            return 0
+        batch, self.pending = self.pending, []
+        rows = []
+        written = False
+    
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    select(Utilisateur.id_utilisateur, Utilisateur.role, Utilisateur.base_affectee)
+                    .where(Utilisateur.actif == True)
+                )
+                users = result.all()
+    
+                rows = [
+                    {
+                        "user_id": user_id,
+                        "message": notification.message,
+                        "type_notification": notification.type_notification,
+                        "priorite": notification.priorite,
+                        "date_envoi": notification.date_envoi,
+                        "lu": False,
+                    }
+                    for notification in batch
+                    for user_id in notification.destinataires(users)
+                ]
+                if rows:
+                    await db.execute(insert(Notification), rows)
+                    await db.commit()
+                written = True
+        except asyncio.CancelledError:
+            if not written:
+                self._requeue(batch)
+            raise
+        except Exception:
+            if written:
+                logger.exception("Fermeture de session après écriture des notifications")
+            else:
+                self.errors += 1
+                self._failures += 1
+                self._requeue(batch)
+                logger.exception("Échec d'écriture de %d notification(s), remises en file", len(batch))
+                return 0
+    
+        self._failures = 0
+    
+        self.batches += 1
+        self.flushed += len(rows)
+    
+        # Prévenir les clients SSE des destinataires
+        for user_id, nouvelles in Counter(row["user_id"] for row in rows).items():
+            await broadcaster.publish(DomainEvent(
+                type="notification",
+                data={"nouvelles": nouvelles},
+                user_ids=[user_id]
+            ))
+        return len(rows)
+    
+    async def _run(self) -> None:
+        while True:
+            if self._failures:
+                # Base indisponible : délai croissant avant le nouvel essai
+                await asyncio.sleep(min(self.flush_interval * 2 ** self._failures, self.retry_max))
+            else:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+            await self.flush()
+    
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Vider la file avant l'arrêt (quelques essais si la base ne répond pas)
+        for essai in range(STOP_FLUSH_ATTEMPTS):
+            await self.flush()
+            if not self.pending:
+                return
+            await asyncio.sleep(essai + 1)
+        logger.error("Arrêt : %d notification(s) non écrite(s)", len(self.pending))
+    
+    def stats(self) -> dict:
+        return {
+            "pending": len(self.pending),
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "errors": self.errors,
+            "dropped": self.dropped,
+        }
+
+
+# Tentatives d'écriture de la file à l'arrêt du processus
+STOP_FLUSH_ATTEMPTS = 3
+
+dispatcher = NotificationDispatcher(
+    batch_size=settings.NOTIFICATION_BATCH_SIZE,
+    flush_interval=settings.NOTIFICATION_FLUSH_INTERVAL_MS / 1000,
+    max_pending=settings.NOTIFICATION_MAX_PENDING,
+    retry_max=settings.NOTIFICATION_RETRY_MAX_SECONDS
+)
+
+
+def notify(db: AsyncSession, notification: PendingNotification) -> None:
+    """
+    Met une notification en attente sur la session : elle n'est transmise
+    au dispatcher qu'après le commit (jamais pour une transaction annulée).
+    """
+    db.sync_session.info.setdefault("notifications", []).append(notification)
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_pending(session):
+    notifications = session.info.pop("notifications", None)
+    if notifications:
+        dispatcher.enqueue(notifications)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop("notifications", None)
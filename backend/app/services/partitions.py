@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import re
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Table partitionnée par mois sur date_action (scripts/partition_historique_action.py)
+PARENT = "historique_action"
+
+# Schéma de destination des partitions archivées
+ARCHIVE_SCHEMA = "archive"
+
+NOM_PARTITION = re.compile(rf"^{PARENT}_(\d{{4}})_(\d{{2}})$")
+
+
+def debut_mois(jour: date) -> date:
+    return jour.replace(day=1)
+
+
+def mois_suivant(mois: date) -> date:
+    return (mois.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def nom_partition(mois: date) -> str:
+    return f"{PARENT}_{mois:%Y_%m}"
+
+
+def mois_partition(nom: str) -> Optional[date]:
+    match = NOM_PARTITION.match(nom)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+async def est_partitionnee(db: AsyncSession) -> bool:
+    result = await db.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:parent)"),
+        {"parent": PARENT}
+    )
+    return result.scalar() == "p"
+
+
+async def lister_partitions(db: AsyncSession, parent: str = PARENT) -> List[dict]:
+    """
+    Partitions de historique_action : bornes, lignes estimées (pg_class.reltuples)
+    et taille disque (table + index + toast).
+    """
+    result = await db.execute(
+        text("""
+            SELECT c.relname AS nom,
+                   pg_get_expr(c.relpartbound, c.oid) AS bornes,
+                   c.reltuples::bigint AS lignes_estimees,
+                   pg_total_relation_size(c.oid) AS taille_octets
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(:parent)
+            ORDER BY c.relname
+        """),
+        {"parent": parent}
+    )
+    return [
+        {
+            "nom": row.nom,
+            "mois": mois_partition(row.nom),
+            "bornes": row.bornes,
+            "lignes_estimees": max(row.lignes_estimees, 0),
+            "taille_octets": row.taille_octets,
+        }
+        for row in result
+    ]
+
+
+async def mois_attaches(db: AsyncSession) -> Optional[Set[date]]:
+    """
+    Mois couverts par les partitions attachées (une ligne d'un autre mois
+    serait refusée à l'insertion), None si la table n'est pas partitionnée.
+    """
+    if not await est_partitionnee(db):
+        return None
+    return {partition["mois"] for partition in await lister_partitions(db) if partition["mois"]}
+
+
+async def creer_partitions(db: AsyncSession, debut: date, fin: date, parent: str = PARENT) -> List[str]:
+    """
+    Crée les partitions mensuelles manquantes de debut à fin (inclus).
+    `parent` : table cible si différente (conversion en cours). Ne commit pas.
+    """
+    existantes = {partition["nom"] for partition in await lister_partitions(db, parent)}
+    creees = []
+    mois = debut_mois(debut)
+    while mois <= fin:
+        nom = nom_partition(mois)
+        if nom not in existantes:
+            await db.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {nom} PARTITION OF {parent} "
+                f"FOR VALUES FROM ('{mois.isoformat()}') TO ('{mois_suivant(mois).isoformat()}')"
+            ))
+            creees.append(nom)
+        mois = mois_suivant(mois)
+    return creees
+
+
+async def detacher_partition(db: AsyncSession, nom: str, archiver: bool = False) -> str:
+    """
+    Détache une partition d'un mois révolu : ses lignes ne sont plus lues
+    par les requêtes sur historique_action mais restent dans une table
+    autonome (déplacée dans le schéma archive si archiver=True).
+    Retourne le nom qualifié de la table détachée. Ne commit pas.
+    """
+    if nom not in {partition["nom"] for partition in await lister_partitions(db)}:
+        raise ValueError(f"Partition {nom} introuvable")
+    mois = mois_partition(nom)
+    if mois is None or mois >= debut_mois(datetime.utcnow().date()):
+        raise ValueError("Seules les partitions des mois révolus peuvent être détachées")
+    
+    await db.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {nom}"))
+    if not archiver:
+        return nom
+    await db.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+    await db.execute(text(f"ALTER TABLE {nom} SET SCHEMA {ARCHIVE_SCHEMA}"))
+    return f"{ARCHIVE_SCHEMA}.{nom}"
+
+
+class PartitionMaintainer:
+    """
+    Crée à l'avance les partitions des HISTORIQUE_PARTITIONS_AVANCE prochains mois
+    (au démarrage puis toutes les `interval` secondes). Sans effet tant que
+    historique_action n'est pas partitionnée.
+    """
+    
+    def __init__(self, mois_avance: int, interval: float):
+        self.mois_avance = mois_avance
+        self.interval = interval
+        self.creees = 0
+        self.erreurs = 0
+        self._task: Optional[asyncio.Task] = None
+    
+    async def ensure(self) -> List[str]:
+        async with AsyncSessionLocal() as db:
+            if not await est_partitionnee(db):
+                return []
+            debut = debut_mois(datetime.utcnow().date())
+            fin = debut
+            for _ in range(self.mois_avance):
+                fin = mois_suivant(fin)
+            creees = await creer_partitions(db, debut, fin)
+            await db.commit()
+        if creees:
+            logger.info("Partitions créées : %s", ", ".join(creees))
+        self.creees += len(creees)
+        return creees
+    
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.ensure()
+            except Exception:
+                self.erreurs += 1
+                logger.exception("Création des partitions de %s impossible", PARENT)
+            await asyncio.sleep(self.interval)
+    
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    def stats(self) -> dict:
+        return {
+            "mois_avance": self.mois_avance,
+            "creees": self.creees,
+            "erreurs": self.erreurs,
+        }
+
+
+partition_maintainer = PartitionMaintainer(
+    mois_avance=settings.HISTORIQUE_PARTITIONS_AVANCE,
+    interval=settings.HISTORIQUE_PARTITIONS_INTERVAL_HOURS * 3600
+)
@@ -0,0 +1,595 @@
+import asyncio
+import csv
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select, update, func, or_, literal_column, any_, bindparam, String
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.action import HistoriqueAction
+from app.models.concentrateur import Concentrateur
+from app.models.rapport import Rapport
+from app.models.stock_summary import StockSummary
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "xlsx", "pdf")
+
+# Lignes lues (et écrites) par lot
+REPORT_BATCH_SIZE = 1000
+
+
+# ============================================
+# TYPES DE RAPPORTS
+# ============================================
+
+class ReportDefinition:
+    """
+    Un type de rapport : titre, colonnes et requête (tuples de colonnes).
+    build(rapport) reçoit la ligne rapport (période, paramètres).
+    """
+    
+    def __init__(self, titre: str, columns: Sequence[str], build: Callable):
+        self.titre = titre
+        self.columns = columns
+        self.build = build
+
+
+def _periode(query, column, rapport):
+    if rapport.periode_debut:
+        query = query.where(column >= rapport.periode_debut)
+    if rapport.periode_fin:
+        query = query.where(column < rapport.periode_fin)
+    return query
+
+
+def _build_stock(rapport):
+    params = rapport.parametres or {}
+    query = (
+        select(StockSummary.affectation, StockSummary.operateur, StockSummary.etat,
+               StockSummary.hs, StockSummary.count)
+        .where(StockSummary.count > 0)
+        .order_by(StockSummary.affectation, StockSummary.operateur, StockSummary.etat)
+    )
+    if params.get("bo"):
+        query = query.where(StockSummary.affectation == params["bo"])
+    return query
+
+
+def _build_inventaire(rapport):
+    params = rapport.parametres or {}
+    query = select(
+        Concentrateur.numero_serie, Concentrateur.modele, Concentrateur.operateur,
+        Concentrateur.etat, Concentrateur.affectation, Concentrateur.hs,
+        Concentrateur.numero_carton, Concentrateur.date_affectation, Concentrateur.date_dernier_etat
+    ).order_by(Concentrateur.affectation, Concentrateur.numero_serie)
+    if params.get("bo"):
+        query = query.where(Concentrateur.affectation == params["bo"])
+    if params.get("etat"):
+        query = query.where(Concentrateur.etat == params["etat"])
+    return query
+
+
+ACTION_COLUMNS = (
+    HistoriqueAction.date_action, HistoriqueAction.type_action, HistoriqueAction.concentrateur_id,
+    HistoriqueAction.ancien_etat, HistoriqueAction.nouvel_etat,
+    HistoriqueAction.ancienne_affectation, HistoriqueAction.nouvelle_affectation,
+    HistoriqueAction.user_id, HistoriqueAction.commentaire,
+)
+
+
+def _actions_bo(query, params):
+    """Actions dont la BO (parametres["bo"]) est l'origine ou la destination."""
+    if params.get("bo"):
+        query = query.where(or_(
+            HistoriqueAction.ancienne_affectation == params["bo"],
+            HistoriqueAction.nouvelle_affectation == params["bo"]
+        ))
+    return query
+
+
+def _build_actions(rapport):
+    params = rapport.parametres or {}
+    query = select(*ACTION_COLUMNS).order_by(HistoriqueAction.date_action, HistoriqueAction.id_action)
+    query = _periode(query, HistoriqueAction.date_action, rapport)
+    query = _actions_bo(query, params)
+    if params.get("type_action"):
+        query = query.where(HistoriqueAction.type_action == params["type_action"])
+    if params.get("numero_serie"):
+        query = query.where(HistoriqueAction.concentrateur_id == params["numero_serie"])
+    return query
+
+
+def _build_test_labo(rapport):
+    params = rapport.parametres or {}
+    query = (
+        select(*ACTION_COLUMNS)
+        .where(HistoriqueAction.type_action.in_(["test_labo", "mise_au_rebut"]))
+        .order_by(HistoriqueAction.date_action, HistoriqueAction.id_action)
+    )
+    query = _periode(query, HistoriqueAction.date_action, rapport)
+    query = _actions_bo(query, params)
+    if params.get("numero_serie"):
+        query = query.where(HistoriqueAction.concentrateur_id == params["numero_serie"])
+    if params.get("numeros_serie"):
+        # Lot de tests (POST /labo/tests/batch)
+        query = query.where(HistoriqueAction.concentrateur_id == any_(
+            bindparam("serials", params["numeros_serie"], type_=ARRAY(String))
+        ))
+    return query
+
+
+_ACTION_HEADERS = (
+    "date_action", "type_action", "numero_serie", "ancien_etat", "nouvel_etat",
+    "ancienne_affectation", "nouvelle_affectation", "user_id", "commentaire",
+)
+
+REPORT_TYPES: Dict[str, ReportDefinition] = {
+    "stock": ReportDefinition(
+        "Stock par affectation",
+        ("affectation", "operateur", "etat", "hs", "nombre"),
+        _build_stock
+    ),
+    "inventaire": ReportDefinition(
+        "Inventaire des concentrateurs",
+        ("numero_serie", "modele", "operateur", "etat", "affectation", "hs",
+         "numero_carton", "date_affectation", "date_dernier_etat"),
+        _build_inventaire
+    ),
+    "actions": ReportDefinition("Historique des actions", _ACTION_HEADERS, _build_actions),
+    "test_labo": ReportDefinition("Tests labo", _ACTION_HEADERS, _build_test_labo),
+}
+
+
+# ============================================
+# ÉCRITURE DES FICHIERS
+# ============================================
+
+def _cell(value):
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return value
+
+
+class CsvReportWriter:
+    def __init__(self, path: str, titre: str, columns: Sequence[str]):
+        self._file = open(path, "w", newline="", encoding="utf-8-sig")
+        self._writer = csv.writer(self._file, delimiter=";")
+        self._writer.writerow(columns)
+    
+    def write(self, rows: List[tuple]) -> None:
+        self._writer.writerows([[_cell(v) for v in row] for row in rows])
+    
+    def close(self) -> None:
+        self._file.close()
+
+
+class XlsxReportWriter:
+    def __init__(self, path: str, titre: str, columns: Sequence[str]):
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            raise RuntimeError("Le format xlsx nécessite le paquet openpyxl")
+        self._path = path
+        # write_only : les lignes sont écrites au fil de l'eau, pas gardées en mémoire
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet(titre[:31])
+        self._sheet.append(list(columns))
+    
+    def write(self, rows: List[tuple]) -> None:
+        for row in rows:
+            self._sheet.append([_cell(v) for v in row])
+    
+    def close(self) -> None:
+        self._workbook.save(self._path)
+
+
+class PdfReportWriter:
+    """
+    PDF paysage A4. Limité à REPORT_PDF_MAX_ROWS lignes (au-delà, utiliser csv/xlsx).
+    """
+    
+    def __init__(self, path: str, titre: str, columns: Sequence[str]):
+        try:
+            from reportlab.lib.pagesizes import A4, landscape  # noqa: F401
+        except ImportError:
+            raise RuntimeError("Le format pdf nécessite le paquet reportlab")
+        self._path = path
+        self._titre = titre
+        self._rows = [list(columns)]
+        self._tronque = False
+    
+    def write(self, rows: List[tuple]) -> None:
+        place = settings.REPORT_PDF_MAX_ROWS + 1 - len(self._rows)
+        if len(rows) > place:
+            self._tronque = True
+        self._rows.extend([["" if v is None else str(_cell(v)) for v in row] for row in rows[:max(place, 0)]])
+    
+    def close(self) -> None:
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import A4, landscape
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    
+        styles = getSampleStyleSheet()
+        story = [
+            Paragraph(f"EDF Corse - {self._titre}", styles["Title"]),
+            Paragraph(f"Généré le {datetime.utcnow().strftime('%d/%m/%Y %H:%M')} UTC", styles["Normal"]),
+            Spacer(1, 12),
+        ]
+        table = Table(self._rows, repeatRows=1)
+        table.setStyle(TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#1e3a8a")),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+            ("FONTSIZE", (0, 0), (-1, -1), 7),
+            ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+        ]))
+        story.append(table)
+        if self._tronque:
+            story.append(Spacer(1, 12))
+            story.append(Paragraph(
+                f"Rapport tronqué à {settings.REPORT_PDF_MAX_ROWS} lignes : utiliser le format csv ou xlsx.",
+                styles["Italic"]
+            ))
+        SimpleDocTemplate(self._path, pagesize=landscape(A4)).build(story)
+
+
+WRITERS = {
+    "csv": CsvReportWriter,
+    "xlsx": XlsxReportWriter,
+    "pdf": PdfReportWriter,
+}
+
+
+def report_path(fichier: str) -> str:
+    return os.path.join(settings.REPORTS_DIR, fichier)
+
+
+async def render_report(db: AsyncSession, rapport: Rapport) -> Tuple[str, int]:
+    """
+    Génère le fichier d'un rapport. Les lignes sont lues par lots avec un curseur
+    côté serveur ; l'écriture (bloquante) est faite dans un thread.
+    Retourne (nom du fichier, nombre de lignes).
+    """
+    definition = REPORT_TYPES[rapport.type_rapport]
+    fichier = f"{rapport.type_rapport}_{rapport.id_rapport}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{rapport.format}"
+    path = report_path(fichier)
+    os.makedirs(settings.REPORTS_DIR, exist_ok=True)
+    
+    writer = await asyncio.to_thread(WRITERS[rapport.format], path, definition.titre, definition.columns)
+    nb_lignes = 0
+    try:
+        result = await db.stream(
+            definition.build(rapport).execution_options(yield_per=REPORT_BATCH_SIZE)
+        )
+        async for partition in result.partitions(REPORT_BATCH_SIZE):
+            rows = [tuple(row) for row in partition]
+            nb_lignes += len(rows)
+            await asyncio.to_thread(writer.write, rows)
+    finally:
+        await asyncio.to_thread(writer.close)
+    return fichier, nb_lignes
+
+
+# ============================================
+# FILE D'ATTENTE
+# ============================================
+
+def create_rapport(
+    db: AsyncSession,
+    user_id: int,
+    type_rapport: str,
+    format: str,
+    periode_debut: Optional[datetime] = None,
+    periode_fin: Optional[datetime] = None,
+    parametres: Optional[dict] = None
+) -> Rapport:
+    """
+    Ajoute un rapport à la file (statut en_attente). Ne commit pas ;
+    appeler report_runner.wake() après le commit pour un démarrage immédiat.
+    """
+    rapport = Rapport(
+        user_id=user_id,
+        type_rapport=type_rapport,
+        format=format,
+        periode_debut=periode_debut,
+        periode_fin=periode_fin,
+        parametres=parametres or {},
+        statut="en_attente",
+        tentatives=0,
+    )
+    db.add(rapport)
+    return rapport
+
+
+# Numéros de série au plus par rapport de tests labo regroupé
+TEST_LABO_MAX_SERIES = 500
+
+
+async def enqueue_test_labo(
+    db: AsyncSession,
+    user_id: int,
+    numeros_serie: List[str],
+    periode_debut: Optional[datetime] = None
+) -> Optional[Rapport]:
+    """
+    Rapport des tests labo de l'utilisateur : les numéros de série sont ajoutés
+    au rapport test_labo encore en attente (verrouillé, ignoré si un worker le
+    prend), sinon un rapport est créé. Une rafale de tests ne produit ainsi
+    qu'un fichier. None si REPORT_TEST_LABO_FORMAT est vide. Ne commit pas.
+    """
+    if not settings.REPORT_TEST_LABO_FORMAT:
+        return None
+    
+    result = await db.execute(
+        select(Rapport)
+        .where(
+            Rapport.statut == literal_column("'en_attente'"),
+            Rapport.user_id == user_id,
+            Rapport.type_rapport == "test_labo",
+            Rapport.format == settings.REPORT_TEST_LABO_FORMAT
+        )
+        .order_by(Rapport.id_rapport.desc())
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    rapport = result.scalar_one_or_none()
+    if rapport is not None:
+        params = dict(rapport.parametres or {})
+        existants = params.pop("numeros_serie", None) or (
+            [params.pop("numero_serie")] if params.get("numero_serie") else []
+        )
+        serials = list(dict.fromkeys(existants + numeros_serie))
+        # Rapport sans filtre de numéros (tous les tests) : jamais complété
+        if existants and len(serials) <= TEST_LABO_MAX_SERIES:
+            # Nouvel objet : la colonne JSON n'est pas suivie en modification
+            rapport.parametres = {**params, "numeros_serie": serials}
+            if rapport.periode_debut is not None:
+                rapport.periode_debut = min(rapport.periode_debut, periode_debut) if periode_debut else None
+            return rapport
+    
+    return create_rapport(
+        db,
+        user_id=user_id,
+        type_rapport="test_labo",
+        format=settings.REPORT_TEST_LABO_FORMAT,
+        periode_debut=periode_debut,
+        parametres={"numeros_serie": list(dict.fromkeys(numeros_serie))}
+    )
+
+
+class ReportRunner:
+    """
+    Workers asyncio qui consomment la file persistée dans la table rapport.
+    La prise de travail utilise FOR UPDATE SKIP LOCKED : plusieurs workers
+    (ou plusieurs processus uvicorn) ne traitent jamais le même rapport.
+    Pendant la génération, date_heartbeat est rafraîchie toutes les
+    heartbeat_interval secondes ; le numéro de tentative sert de jeton : un
+    rapport repris entre-temps n'est pas finalisé par l'ancienne génération.
+    """
+    
+    def __init__(self, workers: int, poll_interval: float, stale_interval: float, heartbeat_interval: float):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_interval = stale_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.termines = 0
+        self.erreurs = 0
+        self.en_cours = 0
+        self.repris = 0
+        self.abandonnes = 0
+        self.supplantes = 0
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+    
+    def wake(self) -> None:
+        self._wakeup.set()
+    
+    async def _claim(self) -> Optional[Tuple[int, int]]:
+        """(id_rapport, tentative) du prochain rapport en attente, passé en_cours."""
+        async with AsyncSessionLocal() as db:
+            prochain = (
+                select(Rapport.id_rapport)
+                # Littéral : permet l'usage de l'index partiel ix_rapport_en_attente
+                .where(Rapport.statut == literal_column("'en_attente'"))
+                .order_by(Rapport.id_rapport)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            now = datetime.utcnow()
+            result = await db.execute(
+                update(Rapport)
+                .where(Rapport.id_rapport == prochain)
+                .values(
+                    statut="en_cours",
+                    date_debut=now,
+                    date_heartbeat=now,
+                    tentatives=Rapport.tentatives + 1
+                )
+                .returning(Rapport.id_rapport, Rapport.tentatives)
+                .execution_options(synchronize_session=False)
+            )
+            claim = result.one_or_none()
+            await db.commit()
+            return tuple(claim) if claim else None
+    
+    @staticmethod
+    def _possede(id_rapport: int, tentative: int) -> tuple:
+        """Le rapport est toujours en cours de génération par cette tentative."""
+        return (
+            Rapport.id_rapport == id_rapport,
+            Rapport.statut == "en_cours",
+            Rapport.tentatives == tentative,
+        )
+    
+    async def _heartbeat(self, id_rapport: int, tentative: int) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                async with AsyncSessionLocal() as db:
+                    result = await db.execute(
+                        update(Rapport)
+                        .where(*self._possede(id_rapport, tentative))
+                        .values(date_heartbeat=datetime.utcnow())
+                        .execution_options(synchronize_session=False)
+                    )
+                    await db.commit()
+            except Exception:
+                logger.exception("Signal du rapport %s impossible", id_rapport)
+                continue
+            if result.rowcount == 0:
+                logger.warning("Rapport %s repris par un autre worker pendant sa génération", id_rapport)
+                return
+    
+    async def _process(self, id_rapport: int, tentative: int) -> None:
+        heartbeat = asyncio.create_task(self._heartbeat(id_rapport, tentative))
+        try:
+            async with AsyncSessionLocal() as db:
+                rapport = await db.get(Rapport, id_rapport)
+                fichier = None
+                try:
+                    if rapport.type_rapport not in REPORT_TYPES or rapport.format not in WRITERS:
+                        raise ValueError(f"Rapport {rapport.type_rapport}/{rapport.format} inconnu")
+                    fichier, nb_lignes = await render_report(db, rapport)
+                except Exception as e:
+                    await db.rollback()
+                    logger.exception("Échec du rapport %s", id_rapport)
+                    valeurs = {"statut": "erreur", "erreur": str(e)[:2000], "date_fin": datetime.utcnow()}
+                else:
+                    now = datetime.utcnow()
+                    valeurs = {
+                        "statut": "termine", "fichier": fichier, "nb_lignes": nb_lignes,
+                        "erreur": None, "date_generation": now, "date_fin": now,
+                    }
+                result = await db.execute(
+                    update(Rapport)
+                    .where(*self._possede(id_rapport, tentative))
+                    .values(**valeurs)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+        finally:
+            heartbeat.cancel()
+        
+        if result.rowcount == 0:
+            # Repris (ou abandonné) entre-temps : la génération en cours fait foi
+            self.supplantes += 1
+            logger.warning("Rapport %s (tentative %d) supplanté, résultat ignoré", id_rapport, tentative)
+            if fichier:
+                os.remove(report_path(fichier))
+        elif fichier:
+            self.termines += 1
+        else:
+            self.erreurs += 1
+    
+    async def requeue_stale(self) -> int:
+        """
+        Rapports en_cours sans signal de leur worker depuis REPORT_STALE_MINUTES
+        (worker arrêté pendant la génération, quel que soit le processus) :
+        remis en attente dans la limite de REPORT_MAX_ATTEMPTS tentatives, en
+        erreur au-delà. Retourne le nombre de rapports remis en attente.
+        """
+        now = datetime.utcnow()
+        interrompus = (
+            Rapport.statut == "en_cours",
+            func.coalesce(Rapport.date_heartbeat, Rapport.date_debut)
+            < now - timedelta(minutes=settings.REPORT_STALE_MINUTES),
+        )
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(Rapport)
+                .where(*interrompus, Rapport.tentatives < settings.REPORT_MAX_ATTEMPTS)
+                .values(statut="en_attente")
+                .execution_options(synchronize_session=False)
+            )
+            repris = result.rowcount
+            result = await db.execute(
+                update(Rapport)
+                .where(*interrompus, Rapport.tentatives >= settings.REPORT_MAX_ATTEMPTS)
+                .values(
+                    statut="erreur",
+                    erreur=f"Génération interrompue {settings.REPORT_MAX_ATTEMPTS} fois, rapport abandonné",
+                    date_fin=now
+                )
+                .execution_options(synchronize_session=False)
+            )
+            abandonnes = result.rowcount
+            await db.commit()
+        
+        self.repris += repris
+        self.abandonnes += abandonnes
+        if repris or abandonnes:
+            logger.warning("Rapports interrompus : %d remis en attente, %d en erreur", repris, abandonnes)
+        if repris:
+            self.wake()
+        return repris
+    
+    async def _requeue_loop(self) -> None:
+        while True:
+            try:
+                await self.requeue_stale()
+            except Exception:
+                logger.exception("Reprise des rapports interrompus impossible")
+            await asyncio.sleep(self.stale_interval)
+    
+    async def _worker(self) -> None:
+        while True:
+            try:
+                claim = await self._claim()
+            except Exception:
+                logger.exception("Lecture de la file des rapports impossible")
+                claim = None
+    
+            if claim is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+    
+            self.en_cours += 1
+            try:
+                await self._process(*claim)
+            except Exception:
+                logger.exception("Rapport %s non finalisé", claim[0])
+            finally:
+                self.en_cours -= 1
+    
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        # Reprise au démarrage puis toutes les stale_interval secondes
+        self._tasks = [asyncio.create_task(self._requeue_loop())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+    
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+    
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers if self._tasks else 0,
+            "en_cours": self.en_cours,
+            "termines": self.termines,
+            "erreurs": self.erreurs,
+            "repris": self.repris,
+            "abandonnes": self.abandonnes,
+            "supplantes": self.supplantes,
+        }
+
+
+report_runner = ReportRunner(
+    workers=settings.REPORT_WORKERS,
+    poll_interval=settings.REPORT_POLL_INTERVAL_SECONDS,
+    stale_interval=settings.REPORT_STALE_CHECK_SECONDS,
+    heartbeat_interval=settings.REPORT_HEARTBEAT_SECONDS
+)
@@ -0,0 +1,166 @@
+from collections import Counter
+from typing import Optional, Tuple
+
+from sqlalchemy import select, func, case, and_, delete, insert, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.concentrateur import Concentrateur
+from app.models.stock_summary import StockSummary
+
+StockKey = Tuple[Optional[str], Optional[str], Optional[str], Optional[bool]]
+
+GROUP_COLUMNS = ("affectation", "operateur", "etat", "hs")
+
+
+def stock_key(concentrateur) -> StockKey:
+    """
+    Groupe stock_summary d'un concentrateur (instance ORM ou ligne RETURNING).
+    """
+    return (
+        concentrateur.affectation,
+        concentrateur.operateur,
+        concentrateur.etat,
+        concentrateur.hs,
+    )
+
+
+class StockDelta:
+    """
+    Variations de stock_summary accumulées pendant une transaction,
+    appliquées en une seule requête par apply_stock_delta.
+    """
+    
+    def __init__(self):
+        self.counts: Counter = Counter()
+    
+    def add(self, key: StockKey, n: int = 1) -> None:
+        self.counts[key] += n
+    
+    def remove(self, key: StockKey, n: int = 1) -> None:
+        self.counts[key] -= n
+    
+    def move(self, old_key: StockKey, new_key: StockKey) -> None:
+        if old_key != new_key:
+            self.remove(old_key)
+            self.add(new_key)
+
+
+def _sort_key(key: StockKey):
+    # Ordre stable (NULL compris) pour verrouiller les lignes toujours dans le même ordre
+    return tuple((value is None, str(value)) for value in key)
+
+
+async def apply_stock_delta(db: AsyncSession, delta: StockDelta) -> None:
+    """
+    Applique les variations en un INSERT ... ON CONFLICT DO UPDATE.
+    Ne commit pas : doit être appelé dans la transaction du changement d'état.
+    """
+    rows = [
+        dict(zip(GROUP_COLUMNS, key), count=n)
+        for key, n in sorted(delta.counts.items(), key=lambda item: _sort_key(item[0]))
+        if n
+    ]
+    if not rows:
+        return
+    stmt = pg_insert(StockSummary).values(rows)
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[getattr(StockSummary, column) for column in GROUP_COLUMNS],
+            set_={"count": StockSummary.count + stmt.excluded.count}
+        )
+    )
+    delta.counts.clear()
+
+
+async def record_stock_change(db: AsyncSession, old_key: Optional[StockKey], new_key: Optional[StockKey]) -> None:
+    """
+    Raccourci pour un seul concentrateur (old_key None = création).
+    """
+    delta = StockDelta()
+    if old_key is None:
+        delta.add(new_key)
+    else:
+        delta.move(old_key, new_key)
+    await apply_stock_delta(db, delta)
+
+
+def summary_count(*conditions):
+    """
+    Somme de stock_summary.count, restreinte aux groupes vérifiant les conditions.
+    """
+    if not conditions:
+        return func.coalesce(func.sum(StockSummary.count), 0)
+    return func.coalesce(
+        func.sum(case((and_(*conditions), StockSummary.count), else_=0)), 0
+    )
+
+
+async def stock_counts_by(db: AsyncSession, column, *conditions) -> dict:
+    """
+    Comptage {valeur: nombre} des concentrateurs par colonne de stock_summary
+    (lit une ligne par groupe, jamais la table concentrateur).
+    """
+    query = (
+        select(column, summary_count())
+        .group_by(column)
+        .having(func.sum(StockSummary.count) > 0)
+    )
+    if conditions:
+        query = query.where(*conditions)
+    result = await db.execute(query)
+    return {row[0]: row[1] for row in result}
+
+
+def select_actual_stock():
+    """Comptage réel, groupé comme stock_summary."""
+    return select(
+        Concentrateur.affectation,
+        Concentrateur.operateur,
+        Concentrateur.etat,
+        Concentrateur.hs,
+        func.count().label("count"),
+    ).group_by(
+        Concentrateur.affectation,
+        Concentrateur.operateur,
+        Concentrateur.etat,
+        Concentrateur.hs,
+    )
+
+
+async def compute_stock_drift(db: AsyncSession) -> dict:
+    """
+    Écarts entre stock_summary et la table concentrateur.
+    Retourne {groupe: (valeur stock_summary, valeur réelle)}.
+    """
+    result = await db.execute(select_actual_stock())
+    actual = {tuple(row[:4]): row.count for row in result}
+    result = await db.execute(
+        select(StockSummary.affectation, StockSummary.operateur, StockSummary.etat,
+               StockSummary.hs, StockSummary.count)
+    )
+    summary = {tuple(row[:4]): row.count for row in result}
+    drift = {}
+    for key in set(actual) | set(summary):
+        expected = actual.get(key, 0)
+        stored = summary.get(key, 0)
+        if expected != stored:
+            drift[key] = (stored, expected)
+    return drift
+
+
+async def rebuild_stock_summary(db: AsyncSession) -> None:
+    """
+    Reconstruit stock_summary depuis concentrateur.
+    Verrouille stock_summary en écriture : les changements d'état concurrents
+    attendent la fin de la reconstruction. Ne commit pas.
+    """
+    await db.execute(text("LOCK TABLE stock_summary IN EXCLUSIVE MODE"))
+    await db.execute(delete(StockSummary))
+    actual = select_actual_stock().subquery()
+    await db.execute(
+        insert(StockSummary).from_select(
+            [*GROUP_COLUMNS, "count"],
+            select(actual.c.affectation, actual.c.operateur, actual.c.etat, actual.c.hs, actual.c.count)
+        )
+    )
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Archivage des actions antérieures à l'horizon (ARCHIVE_HORIZON_MONTHS) en fichiers
+Parquet compressés sous ARCHIVE_DIR, par mois et par intervalle de numéros de
+série (ARCHIVE_FILE_ROWS lignes par fichier environ).
+Les lignes archivées sont supprimées de historique_action (TRUNCATE de la
+partition du mois si la table est partitionnée) ; GET /actions?concentrateur_id=
+les relit via l'index min/max des numéros de série.
+
+Usage: python -m scripts.archive_historique_action [--horizon 12] [--dry-run] [--reindex]
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, '.')
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+from app.core.config import settings
+from app.models.action import HistoriqueAction
+from app.services.archives import archive_dir, limite_archivage, plus_ancien_mois, archiver_mois, reconstruire_index
+from app.services.partitions import est_partitionnee, lister_partitions, nom_partition, mois_suivant
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Archivage Parquet de historique_action")
+    parser.add_argument("--horizon", type=int, default=settings.ARCHIVE_HORIZON_MONTHS,
+                        help="Mois conservés en base (mois en cours inclus)")
+    parser.add_argument("--dry-run", action="store_true", help="Lister les mois à archiver sans rien modifier")
+    parser.add_argument("--reindex", action="store_true", help="Reconstruire index.json depuis les fichiers")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(" ARCHIVAGE DE HISTORIQUE_ACTION")
+    print("=" * 60)
+
+    if args.reindex:
+        fichiers = reconstruire_index()
+        print(f"\n [OK] Index reconstruit : {len(fichiers)} fichier(s) dans {archive_dir()}")
+        return
+
+    if args.horizon < 1:
+        print("\n [!] L'horizon doit conserver au moins le mois en cours")
+        sys.exit(1)
+
+    limite = limite_archivage(args.horizon)
+    print(f"\n Actions antérieures au {limite.isoformat()} → {archive_dir()}")
+
+    engine = create_async_engine(settings.DATABASE_URL, echo=False)
+
+    async with AsyncSession(engine) as db:
+        partitions = set()
+        if await est_partitionnee(db):
+            partitions = {partition["nom"] for partition in await lister_partitions(db)}
+        mois = await plus_ancien_mois(db, limite)
+        await db.commit()
+
+    debut = time.perf_counter()
+    total = 0
+    while mois is not None and mois < limite:
+        partition = nom_partition(mois) if nom_partition(mois) in partitions else None
+        if args.dry_run:
+            async with AsyncSession(engine) as db:
+                result = await db.execute(
+                    select(func.count()).select_from(HistoriqueAction).where(
+                        HistoriqueAction.date_action >= mois,
+                        HistoriqueAction.date_action < mois_suivant(mois)
+                    )
+                )
+                print(f"  {mois:%Y-%m} : {result.scalar()} action(s)")
+            mois = mois_suivant(mois)
+            continue
+
+        async with AsyncSession(engine) as db:
+            entrees = await archiver_mois(db, mois, partition)
+        if entrees:
+            lignes = sum(entree["lignes"] for entree in entrees)
+            taille = sum(entree["taille_octets"] for entree in entrees)
+            total += lignes
+            print(f"  [OK] {mois:%Y-%m} : {lignes} action(s) → {len(entrees)} fichier(s) "
+                  f"({taille / 1024:.0f} Ko)")
+
+        async with AsyncSession(engine) as db:
+            suivant = await plus_ancien_mois(db, limite)
+            await db.commit()
+        if suivant is not None and suivant <= mois:
+            print(f"\n [!] Actions de {suivant:%Y-%m} toujours présentes après archivage, arrêt")
+            break
+        mois = suivant
+
+    await engine.dispose()
+    duree = time.perf_counter() - debut
+    if not args.dry_run:
+        print(f"\n [OK] {total} action(s) archivée(s) en {duree:.2f}s ({total / max(duree, 1e-6):,.0f} lignes/s)")
+    print()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark de connexion en masse (début de service).
+Envoie des POST /api/v1/auth/login concurrents à un serveur uvicorn lancé,
+et mesure en parallèle la latence de GET /health (endpoint sans rapport)
+pour vérifier que bcrypt ne bloque plus la boucle asyncio.
+
+Usage:
+    uvicorn app.main:app --port 8000 &
+    python -m scripts.bench_login --email agent@edf.fr --password secret \\
+        [--url http://localhost:8000] [--concurrency 50] [--logins 500]
+"""
+
+import sys
+import asyncio
+import argparse
+import statistics
+import time
+from urllib.parse import urlencode, urlparse
+
+
+async def http_request(host: str, port: int, method: str, path: str, body: bytes = b"",
+                       content_type: str = "application/x-www-form-urlencoded") -> int:
+    """Requête HTTP/1.1 minimale (sans dépendance externe). Retourne le code HTTP."""
+    reader, writer = await asyncio.open_connection(host, port)
+    headers = [
+        f"{method} {path} HTTP/1.1",
+        f"Host: {host}:{port}",
+        "Connection: close",
+        f"Content-Length: {len(body)}",
+    ]
+    if body:
+        headers.append(f"Content-Type: {content_type}")
+    writer.write(("\r\n".join(headers) + "\r\n\r\n").encode() + body)
+    await writer.drain()
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    return int(status_line.split()[1])
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark connexions concurrentes")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=500)
+    args = parser.parse_args()
+
+    url = urlparse(args.url)
+    host, port = url.hostname, url.port or 80
+    body = urlencode({"username": args.email, "password": args.password}).encode()
+
+    file_attente = asyncio.Queue()
+    for _ in range(args.logins):
+        file_attente.put_nowait(None)
+    echecs = 0
+
+    async def worker():
+        nonlocal echecs
+        while not file_attente.empty():
+            file_attente.get_nowait()
+            if await http_request(host, port, "POST", "/api/v1/auth/login", body) != 200:
+                echecs += 1
+
+    latences_health = []
+    en_cours = True
+
+    async def sonde_health():
+        while en_cours:
+            debut = time.perf_counter()
+            await http_request(host, port, "GET", "/health")
+            latences_health.append((time.perf_counter() - debut) * 1000)
+            await asyncio.sleep(0.01)
+
+    print("=" * 60)
+    print(f" BENCHMARK LOGIN ({args.logins} connexions, {args.concurrency} en parallèle)")
+    print("=" * 60)
+
+    sonde = asyncio.create_task(sonde_health())
+    debut = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+    duree = time.perf_counter() - debut
+    en_cours = False
+    await sonde
+
+    print(f"\n Connexions/s      : {args.logins / duree:.1f}")
+    print(f" Échecs            : {echecs}")
+    if len(latences_health) >= 2:
+        p99 = statistics.quantiles(latences_health, n=100)[98]
+        print(f" /health p50 (ms)  : {statistics.median(latences_health):.1f}")
+        print(f" /health p99 (ms)  : {p99:.1f}")
+    print()
+    if echecs:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
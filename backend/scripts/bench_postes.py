@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark de non-régression pour GET /postes/.
+Insère 5 000 postes et 50 000 concentrateurs dans une transaction annulée,
+puis vérifie que le nombre de requêtes SQL reste constant quel que soit
+le nombre de postes renvoyés.
+
+Usage: python -m scripts.bench_postes [--postes 5000] [--concentrateurs 50000]
+"""
+
+import sys
+import asyncio
+import argparse
+import time
+import uuid
+
+sys.path.insert(0, '.')
+
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy import event, insert, select
+
+from app.core.config import settings
+from app.models.poste import PosteElectrique
+from app.models.concentrateur import Concentrateur
+from app.api.v1.postes import get_postes
+
+ETATS = ['en_stock', 'pose', 'a_tester', 'hs']
+
+
+async def seed(db: AsyncSession, nb_postes: int, nb_concentrateurs: int) -> str:
+    """Insère les données de test et retourne la BO utilisée pour le filtre."""
+    suffixe = uuid.uuid4().hex[:8].upper()
+    bo = f"BENCH-{suffixe}"
+    await db.execute(
+        insert(PosteElectrique),
+        [
+            {"code_poste": f"BENCH-{suffixe}-{i:06d}", "bo_affectee": bo}
+            for i in range(nb_postes)
+        ]
+    )
+    result = await db.execute(
+        select(PosteElectrique.id_poste).where(PosteElectrique.bo_affectee == bo)
+    )
+    ids = result.scalars().all()
+    await db.execute(
+        insert(Concentrateur),
+        [
+            {
+                "numero_serie": f"BENCH-{suffixe}-{i:07d}",
+                "operateur": "Enedis",
+                "etat": ETATS[i % len(ETATS)],
+                "affectation": bo,
+                "poste_id": ids[i % len(ids)],
+            }
+            for i in range(nb_concentrateurs)
+        ]
+    )
+    return bo
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark GET /postes/")
+    parser.add_argument("--postes", type=int, default=5000)
+    parser.add_argument("--concentrateurs", type=int, default=50000)
+    args = parser.parse_args()
+
+    engine = create_async_engine(settings.DATABASE_URL, echo=False)
+    compteur = {"requetes": 0}
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def compter(conn, cursor, statement, parameters, context, executemany):
+        compteur["requetes"] += 1
+
+    print("=" * 60)
+    print(" BENCHMARK GET /postes/")
+    print("=" * 60)
+
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        db = AsyncSession(bind=conn, expire_on_commit=False)
+        try:
+            print(f"\n Insertion de {args.postes} postes / {args.concentrateurs} concentrateurs...")
+            bo = await seed(db, args.postes, args.concentrateurs)
+
+            mesures = []
+            for nb in (1, args.postes):
+                if nb == 1:
+                    # Un seul poste : filtrer sur une BO qui n'en contient qu'un
+                    await db.execute(
+                        insert(PosteElectrique),
+                        [{"code_poste": f"{bo}-SEUL", "bo_affectee": f"{bo}-SEUL"}]
+                    )
+                    filtre = f"{bo}-SEUL"
+                else:
+                    filtre = bo
+
+                compteur["requetes"] = 0
+                debut = time.perf_counter()
+                postes = await get_postes(
+                    bo_affectee=filtre, with_coords_only=False, db=db, current_user=None
+                )
+                duree = (time.perf_counter() - debut) * 1000
+                mesures.append((len(postes), compteur["requetes"], duree))
+        finally:
+            await db.close()
+            await trans.rollback()
+
+    await engine.dispose()
+
+    print(f"\n {'Postes':>8} | {'Requêtes':>8} | {'Durée (ms)':>10}")
+    print(f" {'-' * 8}-+-{'-' * 8}-+-{'-' * 10}")
+    for nb, requetes, duree in mesures:
+        print(f" {nb:>8} | {requetes:>8} | {duree:>10.1f}")
+
+    if len({requetes for _, requetes, _ in mesures}) != 1:
+        print("\n [ERREUR] Le nombre de requêtes dépend du nombre de postes (N+1)")
+        sys.exit(1)
+    print("\n [OK] Nombre de requêtes constant")
+    print()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la réception carton (POST /magasin/reception).
+Compare l'ancien chemin (un SELECT + un INSERT ORM par numéro de série)
+au chemin groupé (receptionner_concentrateurs) pour 10, 100 et 1000 unités.
+
+Chaque mesure est faite dans une transaction annulée : la base n'est pas modifiée.
+
+Usage: python -m scripts.bench_reception [--repeat 5]
+"""
+
+import sys
+import asyncio
+import argparse
+import statistics
+import time
+import uuid
+from datetime import datetime
+from typing import List
+
+sys.path.insert(0, '.')
+
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy import select, text
+
+from app.core.config import settings
+from app.models.carton import Carton
+from app.models.concentrateur import Concentrateur
+from app.models.action import HistoriqueAction
+from app.api.v1.magasin import ConcentrateurCreate, receptionner_concentrateurs
+
+TAILLES = [10, 100, 1000]
+
+
+def generer_carton(taille: int) -> tuple:
+    """Génère un numéro de carton et des numéros de série uniques."""
+    suffixe = uuid.uuid4().hex[:8].upper()
+    numero_carton = f"BENCH-{suffixe}"
+    concentrateurs = [
+        ConcentrateurCreate(
+            numero_serie=f"BENCH-{suffixe}-{i:05d}",
+            modele="BENCH",
+            operateur="Enedis",
+            numero_carton=numero_carton
+        )
+        for i in range(taille)
+    ]
+    return numero_carton, concentrateurs
+
+
+async def reception_legacy(
+    db: AsyncSession,
+    numero_carton: str,
+    concentrateurs: List[ConcentrateurCreate],
+    user_id: int
+) -> None:
+    """Reproduction de l'ancienne boucle par numéro de série."""
+    created = []
+    for conc_data in concentrateurs:
+        result = await db.execute(
+            select(Concentrateur).where(Concentrateur.numero_serie == conc_data.numero_serie)
+        )
+        if result.scalar_one_or_none():
+            continue
+        db.add(Concentrateur(
+            numero_serie=conc_data.numero_serie,
+            modele=conc_data.modele,
+            operateur=conc_data.operateur,
+            etat='en_stock',
+            affectation='Magasin',
+            numero_carton=numero_carton,
+            date_affectation=datetime.utcnow(),
+            date_dernier_etat=datetime.utcnow(),
+        ))
+        created.append(conc_data.numero_serie)
+    await db.flush()
+    for numero_serie in created:
+        db.add(HistoriqueAction(
+            type_action='reception_magasin',
+            ancien_etat='en_livraison',
+            nouvel_etat='en_stock',
+            nouvelle_affectation='Magasin',
+            commentaire=f"Réception carton {numero_carton}",
+            scan_qr=True,
+            user_id=user_id,
+            concentrateur_id=numero_serie,
+            carton_id=numero_carton,
+        ))
+    await db.flush()
+
+
+async def reception_bulk(
+    db: AsyncSession,
+    numero_carton: str,
+    concentrateurs: List[ConcentrateurCreate],
+    user_id: int
+) -> None:
+    await receptionner_concentrateurs(db, numero_carton, concentrateurs, user_id)
+
+
+async def mesurer(engine, fonction, taille: int, user_id: int) -> float:
+    """Mesure une réception dans une transaction annulée. Retourne des ms."""
+    numero_carton, concentrateurs = generer_carton(taille)
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        db = AsyncSession(bind=conn, expire_on_commit=False)
+        try:
+            db.add(Carton(numero_carton=numero_carton, operateur="Enedis", statut="recu"))
+            await db.flush()
+            debut = time.perf_counter()
+            await fonction(db, numero_carton, concentrateurs, user_id)
+            duree = (time.perf_counter() - debut) * 1000
+        finally:
+            await db.close()
+            await trans.rollback()
+    return duree
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark réception carton")
+    parser.add_argument("--repeat", type=int, default=5, help="Mesures par taille")
+    args = parser.parse_args()
+
+    engine = create_async_engine(settings.DATABASE_URL, echo=False)
+
+    async with engine.connect() as conn:
+        result = await conn.execute(text("SELECT id_utilisateur FROM utilisateur LIMIT 1"))
+        user_id = result.scalar()
+    if user_id is None:
+        print(" [ERREUR] Aucun utilisateur en base (FK historique_action.user_id)")
+        await engine.dispose()
+        sys.exit(1)
+
+    print("=" * 60)
+    print(" BENCHMARK RECEPTION CARTON (médiane, ms)")
+    print("=" * 60)
+    print(f" {'Unités':>8} | {'Avant':>10} | {'Après':>10} | {'Gain':>6}")
+    print(f" {'-' * 8}-+-{'-' * 10}-+-{'-' * 10}-+-{'-' * 6}")
+
+    for taille in TAILLES:
+        avant = [await mesurer(engine, reception_legacy, taille, user_id) for _ in range(args.repeat)]
+        apres = [await mesurer(engine, reception_bulk, taille, user_id) for _ in range(args.repeat)]
+        m_avant = statistics.median(avant)
+        m_apres = statistics.median(apres)
+        gain = m_avant / m_apres if m_apres else 0
+        print(f" {taille:>8} | {m_avant:>10.1f} | {m_apres:>10.1f} | {gain:>5.1f}x")
+
+    await engine.dispose()
+    print()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la recherche de concentrateurs (paramètre search).
+Compare l'ancien chemin (4 ILIKE '%terme%' sans index) à la recherche
+pg_trgm / préfixe de app.api.search sur une table de 1 000 000 lignes.
+
+La table de test est créée dans un schéma séparé (bench_search) puis supprimée :
+les données de production ne sont pas touchées.
+
+Usage: python -m scripts.bench_search [--rows 1000000] [--queries 200]
+"""
+
+import sys
+import asyncio
+import argparse
+import random
+import statistics
+import time
+
+sys.path.insert(0, '.')
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy import select, or_, text
+
+from app.core.config import settings
+from app.models.concentrateur import Concentrateur
+from app.api.search import search_condition, search_rank, resolve_search_mode
+
+SCHEMA = "bench_search"
+
+INDEXES = [
+    "CREATE INDEX ON concentrateur USING gin (numero_serie gin_trgm_ops)",
+    "CREATE INDEX ON concentrateur USING gin (modele gin_trgm_ops)",
+    "CREATE INDEX ON concentrateur USING gin (numero_carton gin_trgm_ops)",
+    "CREATE INDEX ON concentrateur USING gin (operateur gin_trgm_ops)",
+    "CREATE INDEX ON concentrateur (UPPER(numero_serie) text_pattern_ops)",
+    "CREATE INDEX ON concentrateur (UPPER(numero_carton) text_pattern_ops)",
+]
+
+
+def legacy_condition(search: str):
+    """Reproduction de l'ancien filtre search."""
+    search_pattern = f"%{search}%"
+    return or_(
+        Concentrateur.numero_serie.ilike(search_pattern),
+        Concentrateur.modele.ilike(search_pattern),
+        Concentrateur.numero_carton.ilike(search_pattern),
+        Concentrateur.operateur.ilike(search_pattern)
+    )
+
+
+def generer_termes(rows: int, nb: int) -> list:
+    """Mélange de termes proches de l'usage réel de la barre de recherche."""
+    termes = []
+    for _ in range(nb):
+        n = random.randint(1, rows)
+        serie = f"CPL{n:09d}"
+        termes.append(random.choice([
+            serie,                  # scan complet
+            serie[:8],              # début de saisie
+            serie[5:11],            # fragment
+            f"CART{n // 100:07d}",  # carton
+        ]))
+    return termes
+
+
+def percentiles(mesures: list) -> tuple:
+    q = statistics.quantiles(mesures, n=100)
+    return statistics.median(mesures), q[94]
+
+
+async def mesurer(conn, termes: list, build) -> list:
+    mesures = []
+    for terme in termes:
+        query = build(terme)
+        debut = time.perf_counter()
+        result = await conn.execute(query)
+        result.fetchall()
+        mesures.append((time.perf_counter() - debut) * 1000)
+    return mesures
+
+
+def build_legacy(terme: str):
+    return (
+        select(Concentrateur.numero_serie)
+        .where(legacy_condition(terme))
+        .order_by(Concentrateur.date_dernier_etat.desc())
+        .limit(50)
+    )
+
+
+def build_trigram(terme: str):
+    query = select(Concentrateur.numero_serie).where(search_condition(terme))
+    if resolve_search_mode(terme) == "fuzzy":
+        query = query.order_by(search_rank(terme).desc())
+    return query.order_by(Concentrateur.date_dernier_etat.desc()).limit(50)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark recherche concentrateurs")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    engine = create_async_engine(settings.DATABASE_URL, echo=False)
+
+    print("=" * 60)
+    print(f" BENCHMARK RECHERCHE ({args.rows} lignes, {args.queries} requêtes)")
+    print("=" * 60)
+
+    async with engine.connect() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.execute(text(f"SET search_path TO {SCHEMA}, public"))
+        await conn.execute(text(
+            "CREATE UNLOGGED TABLE concentrateur (LIKE public.concentrateur INCLUDING DEFAULTS)"
+        ))
+
+        print("\n Insertion des lignes de test...")
+        await conn.execute(text("""
+            INSERT INTO concentrateur
+                (numero_serie, modele, operateur, etat, affectation, numero_carton, date_dernier_etat)
+            SELECT 'CPL' || lpad(g::text, 9, '0'),
+                   (ARRAY['G3-PLC', 'PRIME', 'LINKY-C'])[1 + g % 3],
+                   (ARRAY['Enedis', 'EDF', 'Orange'])[1 + g % 3],
+                   'en_stock', 'Magasin',
+                   'CART' || lpad((g / 100)::text, 7, '0'),
+                   now() - g * interval '1 minute'
+            FROM generate_series(1, :rows) g
+        """), {"rows": args.rows})
+        await conn.execute(text("ALTER TABLE concentrateur ADD PRIMARY KEY (numero_serie)"))
+        await conn.execute(text("ANALYZE concentrateur"))
+        await conn.commit()
+
+        termes = generer_termes(args.rows, args.queries)
+
+        print(" Mesure de l'ancien chemin (ILIKE sans index)...")
+        avant = await mesurer(conn, termes, build_legacy)
+
+        print(" Création des index pg_trgm / text_pattern_ops...")
+        for index in INDEXES:
+            await conn.execute(text(index))
+        await conn.execute(text("ANALYZE concentrateur"))
+        await conn.commit()
+
+        print(" Mesure du nouveau chemin...")
+        apres = await mesurer(conn, termes, build_trigram)
+
+        await conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+        await conn.commit()
+
+    await engine.dispose()
+
+    p50_avant, p95_avant = percentiles(avant)
+    p50_apres, p95_apres = percentiles(apres)
+    print(f"\n {'Chemin':<10} | {'p50 (ms)':>10} | {'p95 (ms)':>10}")
+    print(f" {'-' * 10}-+-{'-' * 10}-+-{'-' * 10}")
+    print(f" {'ILIKE':<10} | {p50_avant:>10.1f} | {p95_avant:>10.1f}")
+    print(f" {'pg_trgm':<10} | {p50_apres:>10.1f} | {p95_apres:>10.1f}")
+    print()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
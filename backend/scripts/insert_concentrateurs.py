@@ -1,122 +1,408 @@
 #!/usr/bin/env python3
 """
-Script d'insertion des concentrateurs depuis le fichier SQL.
-Lit le fichier 04_insert_concentrateurs.sql et exécute les INSERT par batch.
+Chargement en masse des concentrateurs (CSV, NDJSON ou fichier SQL d'INSERT).
 
-Usage: python -m scripts.insert_concentrateurs
+Les lignes sont envoyées par COPY (asyncpg copy_records_to_table) dans une
+table temporaire, validées en quelques requêtes ensemblistes (champs requis,
+longueurs, cartons et postes existants), puis fusionnées dans concentrateur
+par un seul INSERT ... SELECT ... ON CONFLICT. stock_summary et le nombre de
+concentrateurs des cartons sont mis à jour dans la même transaction.
+
+Colonnes reconnues : numero_serie, modele, date_fabrication, operateur, etat,
+affectation, hs, numero_carton, poste_id, commentaire, date_creation.
+
+Usage: python -m scripts.insert_concentrateurs [FICHIER] [--format csv|ndjson|sql]
+       [--update] [--dry-run]
 """
 
 import sys
 import asyncio
+import argparse
+import csv
+import json
 import re
-from typing import List
+import time
+from collections import Counter
+from datetime import date, datetime
+from typing import Iterator
 
 sys.path.insert(0, '.')
 
-from sqlalchemy.ext.asyncio import create_async_engine
-from sqlalchemy import text
+import asyncpg
 
 from app.core.config import settings
+from app.models.concentrateur import Concentrateur
+
+STAGING = "staging_concentrateur"
+
+# Colonne -> type PostgreSQL dans la table temporaire
+COLONNES = {
+    "numero_serie": "text",
+    "modele": "text",
+    "date_fabrication": "date",
+    "operateur": "text",
+    "etat": "text",
+    "affectation": "text",
+    "hs": "boolean",
+    "numero_carton": "text",
+    "poste_id": "integer",
+    "commentaire": "text",
+    "date_creation": "timestamp",
+}
+
+# Colonnes mises à jour pour un numéro déjà connu (--update) ; l'état,
+# l'affectation et le carton ne changent que par les actions métier
+COLONNES_MAJ = ("modele", "date_fabrication", "commentaire")
+
+# Valeurs SQL sans équivalent dans un fichier CSV/NDJSON : valeur par défaut
+VALEURS_DEFAUT = {"NULL", "NOW()", "CURRENT_TIMESTAMP", "DEFAULT"}
+
+
+# ============================================
+# LECTURE DES FICHIERS
+# ============================================
+
+def lire_csv(chemin: str) -> Iterator[dict]:
+    with open(chemin, newline='', encoding='utf-8-sig') as f:
+        entete = f.readline()
+        f.seek(0)
+        # Séparateur ; (export Excel / /magasin/export) ou ,
+        delimiteur = max(";,\t", key=entete.count)
+        yield from csv.DictReader(f, delimiter=delimiteur)
+
+
+def lire_ndjson(chemin: str) -> Iterator[dict]:
+    with open(chemin, encoding='utf-8') as f:
+        for ligne in f:
+            if ligne.strip():
+                yield json.loads(ligne)
+
+
+INSERT_SQL = re.compile(
+    r"INSERT\s+INTO\s+concentrateur\s*\(([^)]*)\)\s*VALUES(.*?);\s*$",
+    re.IGNORECASE | re.DOTALL | re.MULTILINE
+)
+JETON_SQL = re.compile(
+    r"\s*(?:(?P<ouvrante>\()|(?P<fermante>\))|(?P<virgule>,)"
+    r"|'(?P<chaine>(?:[^']|'')*)'"
+    r"|(?P<mot>NULL|NOW\(\)|CURRENT_TIMESTAMP|DEFAULT|TRUE|FALSE)"
+    r"|(?P<nombre>[-+]?\d+(?:\.\d+)?))",
+    re.IGNORECASE
+)
+
+
+def lire_sql(chemin: str) -> Iterator[dict]:
+    """
+    Valeurs des INSERT INTO concentrateur (...) VALUES (...), (...); d'un fichier SQL.
+    """
+    with open(chemin, encoding='utf-8') as f:
+        contenu = f.read()
+    for insert in INSERT_SQL.finditer(contenu):
+        colonnes = [colonne.strip().strip('"') for colonne in insert.group(1).split(',')]
+        valeurs = insert.group(2)
+        position = 0
+        tuple_courant = None
+        while position < len(valeurs.rstrip()):
+            jeton = JETON_SQL.match(valeurs, position)
+            if jeton is None:
+                raise ValueError(f"Valeur SQL non reconnue : {valeurs[position:position + 40]!r}")
+            position = jeton.end()
+            if jeton.group("ouvrante"):
+                tuple_courant = []
+            elif jeton.group("fermante"):
+                yield dict(zip(colonnes, tuple_courant))
+                tuple_courant = None
+            elif jeton.group("chaine") is not None:
+                tuple_courant.append(jeton.group("chaine").replace("''", "'"))
+            elif jeton.group("mot"):
+                mot = jeton.group("mot").upper()
+                tuple_courant.append(None if mot in VALEURS_DEFAUT else mot.lower())
+            elif jeton.group("nombre"):
+                tuple_courant.append(jeton.group("nombre"))
+
+
+LECTEURS = {"csv": lire_csv, "ndjson": lire_ndjson, "sql": lire_sql}
+
+
+# ============================================
+# CONVERSION
+# ============================================
+
+def _texte(valeur):
+    if valeur is None:
+        return None
+    valeur = str(valeur).strip()
+    return valeur or None
+
+
+def _booleen(valeur):
+    if isinstance(valeur, bool) or valeur is None:
+        return valeur
+    valeur = str(valeur).strip().lower()
+    if not valeur:
+        return None
+    if valeur in ("true", "t", "1", "oui", "o", "yes", "y"):
+        return True
+    if valeur in ("false", "f", "0", "non", "n", "no"):
+        return False
+    raise ValueError(f"booléen invalide : {valeur}")
+
+
+def _date(valeur):
+    valeur = _texte(valeur)
+    return date.fromisoformat(valeur[:10]) if valeur else None
+
+
+def _horodatage(valeur):
+    valeur = _texte(valeur)
+    if not valeur or valeur.upper() in VALEURS_DEFAUT:
+        return None
+    return datetime.fromisoformat(valeur.replace("Z", "")).replace(tzinfo=None)
+
+
+def _entier(valeur):
+    valeur = _texte(valeur)
+    return int(valeur) if valeur else None
+
+
+CONVERSIONS = {
+    "text": _texte,
+    "date": _date,
+    "boolean": _booleen,
+    "integer": _entier,
+    "timestamp": _horodatage,
+}
+
+
+class Lignes:
+    """
+    Itérateur des enregistrements à copier : (ligne, valeurs converties...).
+    Les lignes illisibles sont écartées et comptées.
+    """
 
+    def __init__(self, enregistrements: Iterator[dict]):
+        self.enregistrements = enregistrements
+        self.lues = 0
+        self.rejets: Counter = Counter()
+        self.exemples: dict = {}
 
-async def execute_sql_batch(engine, statements: List[str]) -> int:
-    """Exécute un batch de statements SQL."""
-    executed = 0
-    async with engine.connect() as conn:
-        for stmt in statements:
+    def __iter__(self):
+        for enregistrement in self.enregistrements:
+            self.lues += 1
             try:
-                await conn.execute(text(stmt))
-                executed += 1
-            except Exception as e:
-                # Ignorer les erreurs de doublon ou de FK manquante
-                error_str = str(e).lower()
-                if 'duplicate' not in error_str and 'unique' not in error_str:
-                    print(f"  [WARN] {str(e)[:80]}...")
-        await conn.commit()
-    return executed
+                yield (self.lues, *(
+                    CONVERSIONS[type_pg](enregistrement.get(colonne))
+                    for colonne, type_pg in COLONNES.items()
+                ))
+            except (ValueError, TypeError, AttributeError) as e:
+                self.rejets["ligne illisible"] += 1
+                self.exemples.setdefault("ligne illisible", f"ligne {self.lues} : {e}")
+
+
+# ============================================
+# VALIDATION ET FUSION
+# ============================================
+
+def condition_champs_invalides() -> str:
+    """
+    CASE donnant l'erreur d'une ligne en staging : champ requis absent
+    ou valeur plus longue que la colonne de concentrateur.
+    """
+    branches = [
+        "WHEN numero_serie IS NULL THEN 'numero_serie manquant'",
+        "WHEN operateur IS NULL THEN 'operateur manquant'",
+    ]
+    for colonne, type_pg in COLONNES.items():
+        longueur = getattr(Concentrateur.__table__.c[colonne].type, "length", None)
+        if type_pg == "text" and longueur:
+            branches.append(f"WHEN length({colonne}) > {longueur} THEN '{colonne} trop long'")
+    return "CASE " + " ".join(branches) + " END"
+
+
+async def valider(conn) -> None:
+    await conn.execute(f"UPDATE {STAGING} SET erreur = {condition_champs_invalides()}")
+    # Références inconnues : une différence ensembliste par table cible
+    await conn.execute(f"""
+        UPDATE {STAGING} s SET erreur = 'carton inconnu'
+        FROM (
+            SELECT numero_carton FROM {STAGING} WHERE numero_carton IS NOT NULL
+            EXCEPT
+            SELECT numero_carton FROM carton
+        ) inconnus
+        WHERE s.numero_carton = inconnus.numero_carton AND s.erreur IS NULL
+    """)
+    await conn.execute(f"""
+        UPDATE {STAGING} s SET erreur = 'poste inconnu'
+        FROM (
+            SELECT poste_id FROM {STAGING} WHERE poste_id IS NOT NULL
+            EXCEPT
+            SELECT id_poste FROM poste_electrique
+        ) inconnus
+        WHERE s.poste_id = inconnus.poste_id AND s.erreur IS NULL
+    """)
+
+
+async def fusionner(conn, update: bool):
+    """
+    Fusion dans concentrateur (dernière occurrence d'un numéro conservée),
+    puis stock_summary et carton.nombre_concentrateurs pour les lignes créées.
+    Retourne (créés, mis à jour).
+    """
+    colonnes = ", ".join(COLONNES)
+    if update:
+        conflit = "DO UPDATE SET " + ", ".join(
+            f"{colonne} = COALESCE(EXCLUDED.{colonne}, concentrateur.{colonne})"
+            for colonne in COLONNES_MAJ
+        ) + ", updated_at = EXCLUDED.updated_at"
+    else:
+        conflit = "DO NOTHING"
+
+    return await conn.fetchrow(f"""
+        WITH source AS (
+            SELECT DISTINCT ON (numero_serie) {colonnes}
+            FROM {STAGING}
+            WHERE erreur IS NULL
+            ORDER BY numero_serie, ligne DESC
+        ),
+        fusion AS (
+            INSERT INTO concentrateur (
+                {colonnes}, created_at, updated_at
+            )
+            SELECT
+                numero_serie, modele, date_fabrication, operateur,
+                COALESCE(etat, 'en_livraison'), affectation, COALESCE(hs, false),
+                numero_carton, poste_id, commentaire,
+                COALESCE(date_creation, now() AT TIME ZONE 'utc'),
+                now() AT TIME ZONE 'utc', now() AT TIME ZONE 'utc'
+            FROM source
+            ON CONFLICT (numero_serie) {conflit}
+            RETURNING (xmax = 0) AS cree, affectation, operateur, etat, hs, numero_carton
+        ),
+        stock AS (
+            INSERT INTO stock_summary (affectation, operateur, etat, hs, count)
+            SELECT affectation, operateur, etat, hs, count(*)
+            FROM fusion WHERE cree
+            GROUP BY affectation, operateur, etat, hs
+            ON CONFLICT (affectation, operateur, etat, hs)
+            DO UPDATE SET count = stock_summary.count + EXCLUDED.count
+        ),
+        cartons AS (
+            UPDATE carton SET nombre_concentrateurs = COALESCE(carton.nombre_concentrateurs, 0) + ajouts.nombre
+            FROM (
+                SELECT numero_carton, count(*) AS nombre
+                FROM fusion WHERE cree AND numero_carton IS NOT NULL
+                GROUP BY numero_carton
+            ) ajouts
+            WHERE carton.numero_carton = ajouts.numero_carton
+        )
+        SELECT count(*) FILTER (WHERE cree) AS crees, count(*) FILTER (WHERE NOT cree) AS mis_a_jour
+        FROM fusion
+    """)
+
+
+class DryRun(Exception):
+    """Levée en fin de chargement avec --dry-run pour annuler la transaction."""
+
+    def __init__(self, duree_copie, doublons, resultat):
+        self.bilan = {"duree_copie": duree_copie, "doublons": doublons, "resultat": resultat}
+
+
+async def charger(conn, lignes: Lignes, update: bool, dry_run: bool) -> dict:
+    debut = time.perf_counter()
+    async with conn.transaction():
+        await conn.execute(f"""
+            CREATE TEMP TABLE {STAGING} (
+                ligne bigint,
+                {", ".join(f"{colonne} {type_pg}" for colonne, type_pg in COLONNES.items())},
+                erreur text
+            ) ON COMMIT DROP
+        """)
+        await conn.copy_records_to_table(
+            STAGING, records=lignes, columns=["ligne", *COLONNES]
+        )
+        await conn.execute(f"ANALYZE {STAGING}")
+        duree_copie = time.perf_counter() - debut
+
+        await valider(conn)
+        for row in await conn.fetch(f"""
+            SELECT erreur, count(*) AS nombre, min(ligne) AS premiere_ligne
+            FROM {STAGING} WHERE erreur IS NOT NULL
+            GROUP BY erreur
+        """):
+            lignes.rejets[row["erreur"]] += row["nombre"]
+            lignes.exemples.setdefault(row["erreur"], f"ligne {row['premiere_ligne']}")
+        doublons = await conn.fetchval(
+            f"SELECT count(*) - count(DISTINCT numero_serie) FROM {STAGING} WHERE erreur IS NULL"
+        )
+
+        resultat = await fusionner(conn, update)
+
+        if dry_run:
+            # Annule la transaction (fusion comprise)
+            raise DryRun(duree_copie, doublons, resultat)
+
+    return {"duree_copie": duree_copie, "doublons": doublons, "resultat": resultat}
 
 
 async def main():
+    parser = argparse.ArgumentParser(description="Chargement en masse des concentrateurs")
+    parser.add_argument("fichier", nargs="?", default="../../sql/04_insert_concentrateurs.sql",
+                        help="Fichier .csv, .ndjson/.jsonl ou .sql")
+    parser.add_argument("--format", choices=sorted(LECTEURS), help="Format (déduit de l'extension par défaut)")
+    parser.add_argument("--update", action="store_true",
+                        help="Mettre à jour modele, date_fabrication et commentaire des numéros existants")
+    parser.add_argument("--dry-run", action="store_true", help="Tout valider puis annuler la transaction")
+    args = parser.parse_args()
+
+    format = args.format or {"jsonl": "ndjson"}.get(
+        args.fichier.rsplit(".", 1)[-1].lower(), args.fichier.rsplit(".", 1)[-1].lower()
+    )
+    if format not in LECTEURS:
+        print(f" [ERREUR] Format non reconnu : {format} (utiliser --format)")
+        sys.exit(1)
+
     print("=" * 60)
-    print(" INSERTION DES CONCENTRATEURS DEPUIS SQL")
+    print(" CHARGEMENT DES CONCENTRATEURS")
     print("=" * 60)
-    
-    # Chemin vers le fichier SQL
-    sql_path = '../../sql/04_insert_concentrateurs.sql'
-    
-    print(f"\n Lecture du fichier SQL: {sql_path}")
-    
-    # Lire le fichier SQL
-    try:
-        with open(sql_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except FileNotFoundError:
-        print(f" [ERREUR] Fichier SQL non trouvé: {sql_path}")
-        sys.exit(1)
-    
-    # Extraire tous les INSERT statements
-    # Pattern pour matcher les INSERT INTO concentrateur ... ;
-    pattern = r"INSERT INTO concentrateur[^;]+;"
-    statements = re.findall(pattern, content, re.IGNORECASE | re.DOTALL)
-    
-    print(f" {len(statements)} INSERT statements trouvés")
-    
-    if len(statements) == 0:
-        print(" [ERREUR] Aucun INSERT trouvé dans le fichier")
-        sys.exit(1)
-    
-    # Créer l'engine
-    engine = create_async_engine(settings.DATABASE_URL, echo=False)
-    
-    # Vérifier la connexion
-    print("\n Vérification de la connexion...")
+    print(f"\n Fichier : {args.fichier} ({format})")
+
+    lignes = Lignes(LECTEURS[format](args.fichier))
+    dsn = settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://")
+
+    debut = time.perf_counter()
     try:
-        async with engine.connect() as conn:
-            await conn.execute(text("SELECT 1"))
-        print(" [OK] Connexion établie")
+        conn = await asyncpg.connect(dsn)
     except Exception as e:
         print(f" [ERREUR] Connexion échouée: {e}")
-        await engine.dispose()
         sys.exit(1)
-    
-    # Compter les concentrateurs avant
-    async with engine.connect() as conn:
-        result = await conn.execute(text("SELECT COUNT(*) FROM concentrateur"))
-        count_before = result.scalar()
-    print(f" Concentrateurs avant insertion: {count_before}")
-    
-    # Exécuter par batch de 50
-    batch_size = 50
-    total_executed = 0
-    errors = 0
-    
-    print(f"\n Insertion par batch de {batch_size}...")
-    
-    for i in range(0, len(statements), batch_size):
-        batch = statements[i:i + batch_size]
-        executed = await execute_sql_batch(engine, batch)
-        total_executed += executed
-        errors += len(batch) - executed
-        
-        progress = min(i + batch_size, len(statements))
-        pct = int(progress / len(statements) * 100)
-        print(f"  [{pct:3d}%] {progress}/{len(statements)} traités")
-    
-    # Vérification finale
-    async with engine.connect() as conn:
-        result = await conn.execute(text("SELECT COUNT(*) FROM concentrateur"))
-        count_after = result.scalar()
-    
-    await engine.dispose()
-    
-    print("\n" + "=" * 60)
-    print(" INSERTION TERMINEE")
-    print("=" * 60)
-    print(f"\n Concentrateurs avant: {count_before}")
-    print(f" Concentrateurs après: {count_after}")
-    print(f" Nouveaux insérés: {count_after - count_before}")
-    if errors > 0:
-        print(f" Erreurs/doublons ignorés: {errors}")
+    try:
+        bilan = await charger(conn, lignes, args.update, args.dry_run)
+    except DryRun as dry_run:
+        bilan = dry_run.bilan
+    except FileNotFoundError:
+        print(f" [ERREUR] Fichier non trouvé: {args.fichier}")
+        sys.exit(1)
+    finally:
+        await conn.close()
+    duree = time.perf_counter() - debut
+
+    resultat = bilan["resultat"]
+    print(f"\n Lignes lues      : {lignes.lues}")
+    print(f" COPY             : {bilan['duree_copie']:.2f}s "
+          f"({lignes.lues / max(bilan['duree_copie'], 1e-6):,.0f} lignes/s)")
+    print(f" Créés            : {resultat['crees']}")
+    if args.update:
+        print(f" Mis à jour       : {resultat['mis_a_jour']}")
+    else:
+        ignores = lignes.lues - sum(lignes.rejets.values()) - bilan["doublons"] - resultat["crees"]
+        print(f" Déjà existants   : {ignores}")
+    if bilan["doublons"]:
+        print(f" Doublons fichier : {bilan['doublons']} (dernière occurrence conservée)")
+    for erreur, nombre in lignes.rejets.most_common():
+        print(f" Rejetés          : {nombre} - {erreur} (ex. {lignes.exemples[erreur]})")
+    print(f"\n Total            : {duree:.2f}s ({lignes.lues / max(duree, 1e-6):,.0f} lignes/s)")
+    if args.dry_run:
+        print("\n --dry-run : transaction annulée, base non modifiée")
     print()
 
 
@@ -0,0 +1,13 @@
+-- Index pour la pagination par curseur (GET /concentrateurs et GET /actions)
+-- Exécuter ce script dans PostgreSQL
+-- CONCURRENTLY : ne bloque pas les écritures (ne pas exécuter dans une transaction)
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_concentrateur_keyset
+    ON concentrateur (date_dernier_etat DESC NULLS LAST, numero_serie DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_historique_action_keyset
+    ON historique_action (date_action DESC NULLS LAST, id_action DESC);
+
+-- Statistiques à jour pour l'estimation du total (pg_class.reltuples)
+ANALYZE concentrateur;
+ANALYZE historique_action;
@@ -0,0 +1,27 @@
+-- Index de recherche des concentrateurs (paramètre search de GET /concentrateurs)
+-- Exécuter ce script dans PostgreSQL
+-- CONCURRENTLY : ne bloque pas les écritures (ne pas exécuter dans une transaction)
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Recherche approchée / sous-chaîne (ILIKE '%terme%', opérateur %, similarity)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_concentrateur_numero_serie_trgm
+    ON concentrateur USING gin (numero_serie gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_concentrateur_modele_trgm
+    ON concentrateur USING gin (modele gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_concentrateur_numero_carton_trgm
+    ON concentrateur USING gin (numero_carton gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_concentrateur_operateur_trgm
+    ON concentrateur USING gin (operateur gin_trgm_ops);
+
+-- Recherche par préfixe (UPPER(colonne) LIKE 'TERME%')
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_concentrateur_numero_serie_prefix
+    ON concentrateur (UPPER(numero_serie) text_pattern_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_concentrateur_numero_carton_prefix
+    ON concentrateur (UPPER(numero_carton) text_pattern_ops);
+
+ANALYZE concentrateur;
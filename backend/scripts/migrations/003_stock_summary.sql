@@ -0,0 +1,31 @@
+-- Table de compteurs stock_summary (statistiques de stock sans parcourir concentrateur)
+-- Exécuter ce script dans PostgreSQL (15+ pour NULLS NOT DISTINCT)
+-- Tenue à jour par les endpoints qui modifient un concentrateur (app/services/stock_summary.py).
+-- En cas d'écart : python -m scripts.reconcile_stock_summary
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS stock_summary (
+    id_summary SERIAL PRIMARY KEY,
+    affectation VARCHAR(100),
+    operateur VARCHAR(50),
+    etat VARCHAR(50),
+    hs BOOLEAN,
+    count INTEGER NOT NULL DEFAULT 0
+);
+
+-- Un seul compteur par groupe, NULL compris (cible de ON CONFLICT)
+CREATE UNIQUE INDEX IF NOT EXISTS ux_stock_summary_groupe
+    ON stock_summary (affectation, operateur, etat, hs) NULLS NOT DISTINCT;
+
+-- Remplissage initial, écritures sur concentrateur bloquées le temps de la copie
+LOCK TABLE concentrateur IN SHARE MODE;
+
+DELETE FROM stock_summary;
+
+INSERT INTO stock_summary (affectation, operateur, etat, hs, count)
+SELECT affectation, operateur, etat, hs, count(*)
+FROM concentrateur
+GROUP BY affectation, operateur, etat, hs;
+
+COMMIT;
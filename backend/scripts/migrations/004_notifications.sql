@@ -0,0 +1,15 @@
+-- Index des notifications (GET /notifications et badge non lues)
+-- Exécuter ce script dans PostgreSQL
+-- CONCURRENTLY : ne bloque pas les écritures (ne pas exécuter dans une transaction)
+
+-- Index partiel : ne contient que les notifications non lues,
+-- le comptage du badge ne parcourt jamais les notifications déjà lues
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_notification_non_lues
+    ON notification (user_id)
+    WHERE lu = false;
+
+-- Liste paginée par curseur
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_notification_user_keyset
+    ON notification (user_id, date_envoi DESC NULLS LAST, id_notification DESC);
+
+ANALYZE notification;
@@ -0,0 +1,23 @@
+-- File de génération des rapports (app/services/rapports.py)
+-- Exécuter ce script dans PostgreSQL
+
+BEGIN;
+
+-- Les rapports existants sont considérés comme déjà générés
+ALTER TABLE rapport ADD COLUMN IF NOT EXISTS statut VARCHAR(20) NOT NULL DEFAULT 'termine';
+ALTER TABLE rapport ADD COLUMN IF NOT EXISTS parametres JSON;
+ALTER TABLE rapport ADD COLUMN IF NOT EXISTS erreur TEXT;
+ALTER TABLE rapport ADD COLUMN IF NOT EXISTS tentatives INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE rapport ADD COLUMN IF NOT EXISTS date_debut TIMESTAMP;
+ALTER TABLE rapport ADD COLUMN IF NOT EXISTS date_fin TIMESTAMP;
+ALTER TABLE rapport ADD COLUMN IF NOT EXISTS nb_lignes INTEGER;
+
+-- Prise de travail : SELECT ... WHERE statut = 'en_attente' FOR UPDATE SKIP LOCKED
+CREATE INDEX IF NOT EXISTS ix_rapport_en_attente
+    ON rapport (id_rapport)
+    WHERE statut = 'en_attente';
+
+CREATE INDEX IF NOT EXISTS ix_rapport_user
+    ON rapport (user_id, id_rapport DESC);
+
+COMMIT;
@@ -0,0 +1,18 @@
+-- Index de la file d'attente labo (GET /labo/queue)
+-- Exécuter ce script dans PostgreSQL
+-- CONCURRENTLY : ne bloque pas les écritures (ne pas exécuter dans une transaction)
+
+-- Index partiel : seuls les concentrateurs au Labo, dans l'ordre de la file
+-- (date_dernier_etat, numero_serie) ; etat inclus pour filtrer sans lire la table
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_concentrateur_labo_queue
+    ON concentrateur (date_dernier_etat ASC NULLS LAST, numero_serie ASC)
+    INCLUDE (etat)
+    WHERE affectation = 'Labo';
+
+-- Dernière dépose d'un concentrateur (jointure LATERAL ... LIMIT 1)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_historique_action_depose
+    ON historique_action (concentrateur_id, date_action DESC)
+    WHERE type_action = 'depose';
+
+ANALYZE concentrateur;
+ANALYZE historique_action;
@@ -0,0 +1,33 @@
+-- Agrégat quotidien des tests labo (GET /labo/stats)
+-- Exécuter ce script dans PostgreSQL (15+ pour NULLS NOT DISTINCT)
+-- Alimenté en tâche de fond depuis historique_action (app/services/labo_stats.py) ;
+-- remplissage initial au premier passage, ou : python -m scripts.refresh_labo_stats --rebuild
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS labo_stats_jour (
+    id_stat SERIAL PRIMARY KEY,
+    jour DATE NOT NULL,
+    modele VARCHAR(100),
+    operateur VARCHAR(50),
+    bo_origine VARCHAR(100),
+    resultat VARCHAR(20) NOT NULL,
+    cause VARCHAR(100),
+    nb_tests INTEGER NOT NULL DEFAULT 0,
+    attente_heures DOUBLE PRECISION NOT NULL DEFAULT 0,
+    nb_attente INTEGER NOT NULL DEFAULT 0
+);
+
+-- Un seul agrégat par groupe, NULL compris (cible de ON CONFLICT) ;
+-- sert aussi aux lectures par période (jour en tête)
+CREATE UNIQUE INDEX IF NOT EXISTS ux_labo_stats_jour_groupe
+    ON labo_stats_jour (jour, modele, operateur, bo_origine, resultat, cause) NULLS NOT DISTINCT;
+
+-- Dernière action historique prise en compte par chaque agrégat
+CREATE TABLE IF NOT EXISTS rollup_watermark (
+    nom VARCHAR(50) PRIMARY KEY,
+    dernier_id_action INTEGER NOT NULL DEFAULT 0,
+    date_maj TIMESTAMP
+);
+
+COMMIT;
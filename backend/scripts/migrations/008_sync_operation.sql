@@ -0,0 +1,23 @@
+-- Clés d'idempotence de la synchronisation hors ligne (POST /sync/actions)
+-- Exécuter ce script dans PostgreSQL
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS sync_operation (
+    client_id VARCHAR(36) PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES utilisateur(id_utilisateur),
+    type_action VARCHAR(100) NOT NULL,
+    concentrateur_id VARCHAR(50),
+    date_client TIMESTAMP NOT NULL,
+    date_reception TIMESTAMP DEFAULT now(),
+    statut VARCHAR(20) NOT NULL DEFAULT 'en_cours',
+    detail TEXT,
+    id_action INTEGER
+);
+
+-- Purge des anciennes clés, par exemple :
+-- DELETE FROM sync_operation WHERE date_reception < now() - interval '90 days';
+CREATE INDEX IF NOT EXISTS ix_sync_operation_date_reception
+    ON sync_operation (date_reception);
+
+COMMIT;
@@ -0,0 +1,19 @@
+-- Synchronisation incrémentale du stock BO (GET /bo/concentrateurs/changes)
+-- Exécuter ce script dans PostgreSQL
+-- CONCURRENTLY : ne bloque pas les écritures (ne pas exécuter dans une transaction)
+
+-- Les lignes sans updated_at ne seraient jamais renvoyées après le premier instantané
+UPDATE concentrateur
+SET updated_at = COALESCE(date_dernier_etat, date_affectation, created_at, now() AT TIME ZONE 'utc')
+WHERE updated_at IS NULL;
+
+-- Concentrateurs d'une BO modifiés après un watermark (updated_at, numero_serie)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_concentrateur_affectation_updated_at
+    ON concentrateur (affectation, updated_at, numero_serie);
+
+-- Sorties d'une BO depuis un watermark (tombstones)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_historique_action_sortie_bo
+    ON historique_action (ancienne_affectation, date_action);
+
+ANALYZE concentrateur;
+ANALYZE historique_action;
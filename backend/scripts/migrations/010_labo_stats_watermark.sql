@@ -0,0 +1,11 @@
+-- Watermark de labo_stats_jour sûr vis-à-vis des transactions en cours
+-- Exécuter ce script dans PostgreSQL (15+ : pg_current_snapshot)
+
+BEGIN;
+
+-- Borne en attente : ids attribués jusqu'à id_candidat, agrégés une fois
+-- terminées toutes les transactions d'identifiant < xid_horizon
+ALTER TABLE rollup_watermark ADD COLUMN IF NOT EXISTS id_candidat INTEGER;
+ALTER TABLE rollup_watermark ADD COLUMN IF NOT EXISTS xid_horizon BIGINT;
+
+COMMIT;
@@ -0,0 +1,10 @@
+-- Signal de vie des rapports en cours de génération (app/services/rapports.py)
+-- Exécuter ce script dans PostgreSQL
+
+BEGIN;
+
+-- Mis à jour périodiquement par le worker : un rapport en_cours sans signal
+-- récent est repris, même si sa génération a commencé il y a longtemps
+ALTER TABLE rapport ADD COLUMN IF NOT EXISTS date_heartbeat TIMESTAMP;
+
+COMMIT;
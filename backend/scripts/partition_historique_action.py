@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Conversion en ligne de historique_action en table partitionnée par mois (date_action).
+
+1. Création de la table partitionnée (mêmes colonnes, clés étrangères et index)
+   et des partitions mensuelles, du mois le plus ancien à HISTORIQUE_PARTITIONS_AVANCE
+   mois dans le futur.
+2. Copie par lots de --batch lignes (ordre id_action), une transaction par lot :
+   l'application continue d'écrire pendant la copie. Reprise possible après arrêt.
+3. Rattrapage sans verrou des lignes absentes de la nouvelle table : une
+   transaction validée après la copie de son lot a pu insérer un id_action
+   inférieur à la borne déjà copiée.
+4. Bascule dans une transaction : écritures bloquées (lecture possible),
+   copie des lignes encore absentes, comparaison des nombres de lignes des
+   deux tables (annulation si différents), échange des noms de tables et d'index.
+
+L'ancienne table est conservée sous le nom historique_action_avant_partition :
+la supprimer une fois la conversion vérifiée.
+
+Usage: python -m scripts.partition_historique_action [--batch 50000]
+"""
+
+import sys
+import re
+import time
+import asyncio
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, '.')
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+from app.core.config import settings
+from app.services.partitions import PARENT, est_partitionnee, creer_partitions, mois_suivant, debut_mois
+
+NOUVELLE = f"{PARENT}_partitionnee"
+ANCIENNE = f"{PARENT}_avant_partition"
+SUFFIXE_INDEX = "_p"
+
+DEFINITION_INDEX = re.compile(r"^CREATE (UNIQUE )?INDEX (\S+) ON (\S+) (.*)$")
+
+
+async def colonnes(db: AsyncSession) -> list:
+    result = await db.execute(text("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = :table
+        ORDER BY ordinal_position
+    """), {"table": PARENT})
+    return [row[0] for row in result]
+
+
+async def index_a_recreer(db: AsyncSession) -> list:
+    """Index de historique_action (hors clé primaire) : [(nom, définition)]."""
+    result = await db.execute(text("""
+        SELECT i.indexname, i.indexdef
+        FROM pg_indexes i
+        WHERE i.schemaname = current_schema() AND i.tablename = :table
+          AND i.indexname NOT IN (
+              SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:table) AND contype = 'p'
+          )
+    """), {"table": PARENT})
+    return [(row.indexname, row.indexdef) for row in result]
+
+
+async def creer_table(db: AsyncSession, date_min: datetime, date_max: datetime) -> None:
+    await db.execute(text(f"""
+        CREATE TABLE {NOUVELLE} (
+            LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE
+        ) PARTITION BY RANGE (date_action)
+    """))
+    await db.execute(text(f"ALTER TABLE {NOUVELLE} ALTER COLUMN date_action SET NOT NULL"))
+    # La clé de partition fait partie de toute contrainte d'unicité
+    await db.execute(text(f"ALTER TABLE {NOUVELLE} ADD PRIMARY KEY (id_action, date_action)"))
+
+    # Clés étrangères : même nom (unique par table)
+    result = await db.execute(text("""
+        SELECT conname, pg_get_constraintdef(oid) AS definition
+        FROM pg_constraint WHERE conrelid = to_regclass(:table) AND contype = 'f'
+    """), {"table": PARENT})
+    for row in result.all():
+        await db.execute(text(f"ALTER TABLE {NOUVELLE} ADD CONSTRAINT {row.conname} {row.definition}"))
+
+    # Index créés sur la table parente : propagés à chaque partition
+    for nom, definition in await index_a_recreer(db):
+        match = DEFINITION_INDEX.match(definition)
+        if match is None or match.group(1):
+            print(f"  [WARN] Index non repris (unique sans date_action) : {nom}")
+            continue
+        await db.execute(text(f"CREATE INDEX {nom}{SUFFIXE_INDEX} ON {NOUVELLE} {match.group(4)}"))
+
+    fin = debut_mois(date_max.date())
+    for _ in range(settings.HISTORIQUE_PARTITIONS_AVANCE):
+        fin = mois_suivant(fin)
+    creees = await creer_partitions(db, date_min.date(), fin, parent=NOUVELLE)
+    print(f" {len(creees)} partitions créées ({creees[0]} → {creees[-1]})")
+
+
+def _selection(liste_colonnes: list) -> str:
+    """Colonnes de l'ancienne table (alias a) ; date_action NULL remplacée."""
+    return ", ".join(
+        "COALESCE(a.date_action, a.created_at, now() AT TIME ZONE 'utc')" if colonne == "date_action"
+        else f"a.{colonne}"
+        for colonne in liste_colonnes
+    )
+
+
+async def copier(db: AsyncSession, liste_colonnes: list, id_debut: int, id_fin: int) -> int:
+    """Copie les lignes d'identifiant dans ]id_debut, id_fin]."""
+    result = await db.execute(text(f"""
+        INSERT INTO {NOUVELLE} ({", ".join(liste_colonnes)})
+        SELECT {_selection(liste_colonnes)} FROM {PARENT} a
+        WHERE a.id_action > :id_debut AND a.id_action <= :id_fin
+    """), {"id_debut": id_debut, "id_fin": id_fin})
+    return result.rowcount
+
+
+async def rattraper(db: AsyncSession, liste_colonnes: list) -> int:
+    """
+    Copie les lignes absentes de la nouvelle table (anti-jointure sur id_action),
+    quel que soit leur identifiant : une transaction en cours pendant la copie
+    d'un lot peut valider ensuite un id_action inférieur à la borne copiée.
+    """
+    result = await db.execute(text(f"""
+        INSERT INTO {NOUVELLE} ({", ".join(liste_colonnes)})
+        SELECT {_selection(liste_colonnes)} FROM {PARENT} a
+        WHERE NOT EXISTS (SELECT 1 FROM {NOUVELLE} n WHERE n.id_action = a.id_action)
+    """))
+    return result.rowcount
+
+
+async def basculer(db: AsyncSession, liste_colonnes: list) -> int:
+    """
+    Lignes encore absentes et échange des noms, écritures bloquées le temps de
+    la transaction (le verrou attend la fin des transactions d'écriture en cours).
+    Lève RuntimeError si les deux tables n'ont pas le même nombre de lignes.
+    """
+    await db.execute(text(f"LOCK TABLE {PARENT} IN EXCLUSIVE MODE"))
+    copiees = await rattraper(db, liste_colonnes)
+
+    result = await db.execute(text(f"SELECT (SELECT count(*) FROM {PARENT}), (SELECT count(*) FROM {NOUVELLE})"))
+    lignes_ancienne, lignes_nouvelle = result.one()
+    if lignes_ancienne != lignes_nouvelle:
+        raise RuntimeError(
+            f"{PARENT} : {lignes_ancienne} lignes, {NOUVELLE} : {lignes_nouvelle} lignes "
+            f"(lignes supprimées pendant la copie ?), bascule annulée"
+        )
+
+    result = await db.execute(text("SELECT pg_get_serial_sequence(:table, 'id_action')"), {"table": PARENT})
+    sequence = result.scalar()
+    index = await index_a_recreer(db)
+
+    await db.execute(text(f"ALTER TABLE {PARENT} RENAME TO {ANCIENNE}"))
+    await db.execute(text(f"ALTER TABLE {NOUVELLE} RENAME TO {PARENT}"))
+    await db.execute(text(f"ALTER INDEX {PARENT}_pkey RENAME TO {ANCIENNE}_pkey"))
+    await db.execute(text(f"ALTER INDEX {NOUVELLE}_pkey RENAME TO {PARENT}_pkey"))
+    for nom, definition in index:
+        await db.execute(text(f"ALTER INDEX {nom} RENAME TO {nom}_avant_partition"))
+        match = DEFINITION_INDEX.match(definition)
+        if match is not None and not match.group(1):
+            await db.execute(text(f"ALTER INDEX {nom}{SUFFIXE_INDEX} RENAME TO {nom}"))
+    if sequence:
+        await db.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {PARENT}.id_action"))
+    return copiees
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Partitionnement mensuel de historique_action")
+    parser.add_argument("--batch", type=int, default=50000, help="Lignes copiées par transaction")
+    args = parser.parse_args()
+
+    engine = create_async_engine(settings.DATABASE_URL, echo=False)
+
+    print("=" * 60)
+    print(" PARTITIONNEMENT DE HISTORIQUE_ACTION")
+    print("=" * 60)
+
+    async with AsyncSession(engine) as db:
+        if await est_partitionnee(db):
+            print("\n [OK] historique_action est déjà partitionnée")
+            await engine.dispose()
+            return
+
+        liste_colonnes = await colonnes(db)
+        result = await db.execute(text(f"""
+            SELECT min(COALESCE(date_action, created_at)), max(date_action), COALESCE(max(id_action), 0)
+            FROM {PARENT}
+        """))
+        date_min, date_max, id_max = result.one()
+        maintenant = datetime.utcnow()
+        date_min = min(date_min or maintenant, maintenant)
+        date_max = max(date_max or maintenant, maintenant)
+
+        result = await db.execute(text("SELECT to_regclass(:table)"), {"table": NOUVELLE})
+        if result.scalar() is None:
+            print(f"\n Création de {NOUVELLE}...")
+            await creer_table(db, date_min, date_max)
+            await db.commit()
+            id_copie = 0
+        else:
+            result = await db.execute(text(f"SELECT COALESCE(max(id_action), 0) FROM {NOUVELLE}"))
+            id_copie = result.scalar()
+            print(f"\n Reprise de la copie après id_action {id_copie}")
+            await db.commit()
+
+        # Copie par lots, sans bloquer les écritures
+        print(f"\n Copie jusqu'à id_action {id_max} par lots de {args.batch}...")
+        debut = time.perf_counter()
+        total = 0
+        while id_copie < id_max:
+            id_fin = min(id_copie + args.batch, id_max)
+            total += await copier(db, liste_colonnes, id_copie, id_fin)
+            await db.commit()
+            id_copie = id_fin
+            duree = time.perf_counter() - debut
+            print(f"  [{int(id_copie / id_max * 100):3d}%] {total} lignes ({total / max(duree, 1e-6):,.0f} lignes/s)")
+
+        # Sans verrou : réduit le nombre de lignes à copier pendant la bascule
+        rattrapees = await rattraper(db, liste_colonnes)
+        await db.commit()
+        print(f"\n {rattrapees} lignes validées après la copie de leur lot rattrapées")
+
+        print("\n Bascule (écritures bloquées pendant la transaction)...")
+        debut_bascule = time.perf_counter()
+        try:
+            copiees = await basculer(db, liste_colonnes)
+        except RuntimeError as e:
+            await db.rollback()
+            await engine.dispose()
+            print(f"\n [!] {e}")
+            sys.exit(1)
+        await db.commit()
+        print(f" [OK] {copiees} dernières lignes copiées, bascule en {time.perf_counter() - debut_bascule:.2f}s")
+
+        await db.execute(text(f"ANALYZE {PARENT}"))
+        await db.commit()
+
+    await engine.dispose()
+    print(f"\n Ancienne table conservée : {ANCIENNE} (DROP TABLE {ANCIENNE}; après vérification)")
+    print()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Réconciliation de la table stock_summary avec la table concentrateur.
+Affiche les groupes en écart puis reconstruit stock_summary
+(sauf avec --dry-run). Code retour 1 si un écart a été trouvé.
+
+Usage: python -m scripts.reconcile_stock_summary [--dry-run]
+"""
+
+import sys
+import asyncio
+import argparse
+
+sys.path.insert(0, '.')
+
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+from app.core.config import settings
+from app.services.stock_summary import compute_stock_drift, rebuild_stock_summary
+from app.api.v1.stats import stats_cache
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Réconciliation de stock_summary")
+    parser.add_argument("--dry-run", action="store_true", help="Afficher les écarts sans reconstruire")
+    args = parser.parse_args()
+
+    engine = create_async_engine(settings.DATABASE_URL, echo=False)
+
+    print("=" * 60)
+    print(" RÉCONCILIATION STOCK_SUMMARY")
+    print("=" * 60)
+
+    async with AsyncSession(engine) as db:
+        drift = await compute_stock_drift(db)
+
+        if not drift:
+            print("\n [OK] Aucun écart")
+        else:
+            print(f"\n {len(drift)} groupe(s) en écart :")
+            print(f" {'Affectation':<15} | {'Opérateur':<12} | {'État':<12} | {'HS':<5} | {'Stocké':>7} | {'Réel':>7}")
+            for (affectation, operateur, etat, hs), (stored, expected) in sorted(drift.items(), key=str):
+                print(f" {str(affectation):<15} | {str(operateur):<12} | {str(etat):<12} | {str(hs):<5} | {stored:>7} | {expected:>7}")
+
+            if args.dry_run:
+                print("\n --dry-run : stock_summary non modifiée")
+            else:
+                await rebuild_stock_summary(db)
+                await db.commit()
+                # Cache partagé (STATS_CACHE_BACKEND=redis) ; en mémoire, expiration au TTL
+                await stats_cache.invalidate()
+                print("\n [OK] stock_summary reconstruite")
+
+    await engine.dispose()
+    print()
+    if drift:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Rafraîchissement de l'agrégat labo_stats_jour depuis historique_action.
+Sans option : ajoute les tests enregistrés depuis le dernier passage.
+Avec --rebuild : vide l'agrégat et le recalcule sur tout l'historique.
+
+Usage: python -m scripts.refresh_labo_stats [--rebuild]
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, '.')
+
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+from app.core.config import settings
+from app.services.labo_stats import refresh_labo_stats, rebuild_labo_stats
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Rafraîchissement de labo_stats_jour")
+    parser.add_argument("--rebuild", action="store_true", help="Recalculer tout l'historique")
+    args = parser.parse_args()
+
+    engine = create_async_engine(settings.DATABASE_URL, echo=False)
+
+    print("=" * 60)
+    print(" STATISTIQUES LABO (labo_stats_jour)")
+    print("=" * 60)
+
+    start = time.perf_counter()
+    async with AsyncSession(engine) as db:
+        if args.rebuild:
+            groupes = await rebuild_labo_stats(db)
+        else:
+            groupes = await refresh_labo_stats(db)
+        await db.commit()
+
+    await engine.dispose()
+    if groupes is None:
+        print("\n [!] Rafraîchissement déjà en cours dans un autre processus")
+        sys.exit(1)
+    print(f"\n [OK] {groupes} groupe(s) mis à jour en {time.perf_counter() - start:.2f}s")
+    print()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())